@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+古籍文献知识图谱API异步查询工具
+
+与 query_api.py 的各查询函数一一对应的 asyncio 版本，用于 SKILL.md 中的
+「多次查询策略」：把人名、事件、关键短语拆成多个短关键词分别检索 Book/Find。
+find_many 在并发上限（信号量）内同时发出请求，按完成顺序逐个产出结果，
+几十个关键词的检索耗时约等于几次串行调用。
+
+请求仍经由 cnkgraph_client.py 的共享连接池发出（在线程池中执行），
+错误同样以 {"error": ...} 返回，与 query_api.py 保持一致。
+
+使用示例：
+    # 命令行：并发检索多个关键词，每个关键词取前 2 页
+    python cnkgraph/scripts/async_query_api.py 崔浩 暴扬国恶 "国史 刊石" --pages 2
+
+    # 合并各关键词命中的重叠片段，每段只输出一次并注明命中的关键词
+    python cnkgraph/scripts/async_query_api.py 崔浩 暴扬国恶 "国史 刊石" --pages 2 --merge
+
+    # Python
+    import asyncio
+    from async_query_api import AsyncCnkgraph
+
+    async def sweep():
+        async with AsyncCnkgraph(concurrency=8) as api:
+            async for item in api.find_many(["崔浩", "暴扬国恶"], pages=2):
+                print(item.keyword, item.page_no, item.result)
+
+    asyncio.run(sweep())
+"""
+
+import sys
+import time
+import argparse
+import asyncio
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import query_api
+from cnkgraph_client import ensure_pool_size
+from passage_merge import PassageMerger
+from passages import iter_passages
+
+# 默认并发上限
+DEFAULT_CONCURRENCY = 8
+
+
+class FindResult(NamedTuple):
+    """find_many 中单个关键词、单页的检索结果"""
+    keyword: str
+    page_no: int
+    result: Dict[str, Any]
+    elapsed: float
+
+
+class AsyncCnkgraph:
+    """异步查询客户端：所有请求共享同一个并发信号量"""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        # 连接池至少容纳并发数，否则多出的连接用完即被丢弃，无法复用
+        ensure_pool_size(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix="cnkgraph")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncCnkgraph":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _call(self, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> Dict[str, Any]:
+        """在并发上限内于线程池中执行一个同步查询函数"""
+        if self._semaphore is None:
+            # 信号量需在事件循环内创建
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            # run_in_executor 不传递上下文，显式复制以沿用追踪与输出重定向
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, partial(context.run, func, *args, **kwargs))
+
+    async def search_poetry(self, keyword: Optional[str] = None, author: Optional[str] = None,
+                            dynasty: Optional[str] = None, title: Optional[str] = None,
+                            limit: int = 10) -> Dict[str, Any]:
+        return await self._call(query_api.search_poetry, keyword=keyword, author=author,
+                                dynasty=dynasty, title=title, limit=limit)
+
+    async def search_books(self, keyword: str, limit: int = 10, page_no: int = 0,
+                           book_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call(query_api.search_books, keyword, limit, page_no, book_id)
+
+    async def find_book_passages(self, keyword: str, page_no: int = 0,
+                                 book_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        return await self._call(query_api.find_book_passages, keyword, page_no, book_ids)
+
+    async def search_people(self, name: str) -> Dict[str, Any]:
+        return await self._call(query_api.search_people, name)
+
+    async def search_event(self, keyword: str) -> Dict[str, Any]:
+        return await self._call(query_api.search_event, keyword)
+
+    async def find_many(self, keywords: Iterable[str], pages: int = 1,
+                        book_ids: Optional[List[str]] = None) -> AsyncIterator[FindResult]:
+        """并发检索多个关键词的原文片段（每个关键词取前 pages 页），按完成顺序产出"""
+        start = time.monotonic()
+
+        async def one(keyword: str, page_no: int) -> FindResult:
+            result = await self.find_book_passages(keyword, page_no, book_ids)
+            return FindResult(keyword, page_no, result, time.monotonic() - start)
+
+        # 去重并保持顺序，同一关键词不重复请求
+        unique = list(dict.fromkeys(k.strip() for k in keywords if k and k.strip()))
+        tasks = [asyncio.ensure_future(one(keyword, page_no))
+                 for keyword in unique for page_no in range(max(1, pages))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 调用方提前退出时取消尚未开始的请求
+            for task in tasks:
+                task.cancel()
+
+
+async def _sweep(keywords: List[str], pages: int, concurrency: int):
+    async with AsyncCnkgraph(concurrency=concurrency) as api:
+        async for item in api.find_many(keywords, pages=pages):
+            print("\n" + "="*60)
+            print(f"【{item.keyword}】第 {item.page_no} 页（{item.elapsed:.2f} 秒）")
+            print("="*60)
+            if "error" in item.result:
+                print(f"❌ 查询失败: {item.result['error']}")
+            else:
+                print(json.dumps(item.result, ensure_ascii=False, indent=2))
+
+
+async def _sweep_merged(keywords: List[str], pages: int, concurrency: int):
+    merger = PassageMerger()
+    async with AsyncCnkgraph(concurrency=concurrency) as api:
+        async for item in api.find_many(keywords, pages=pages):
+            if "error" in item.result:
+                print(f"❌ 【{item.keyword}】第 {item.page_no} 页查询失败: {item.result['error']}")
+                continue
+            merger.add_all(item.keyword, iter_passages(item.result))
+
+    for i, span in enumerate(merger.spans(), 1):
+        print("\n" + "="*60)
+        print(f"【{i}】《{span.book or '未知'}》{span.volume or ''}  命中：{'、'.join(span.keywords)}")
+        print("="*60)
+        print(span.text)
+    stats = merger.stats()
+    print(f"\n{stats['passages']} 条片段合并为 {stats['spans']} 段（{stats['chars_in']} 字 → {stats['chars_out']} 字）")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="并发检索多个关键词的古籍原文片段（Book/Find）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例：
+  %(prog)s 崔浩 暴扬国恶 "国史 刊石"
+  %(prog)s 崔浩 国史 --pages 3 --concurrency 4
+  %(prog)s 崔浩 暴扬国恶 "国史 刊石" --merge
+        """
+    )
+    parser.add_argument('keywords', nargs='+', help='关键词（每个关键词单独检索）')
+    parser.add_argument('--pages', type=int, default=1, help='每个关键词检索的页数，默认 1')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'并发请求上限，默认 {DEFAULT_CONCURRENCY}')
+    parser.add_argument('--merge', action='store_true',
+                        help='合并各关键词命中的重叠片段（同书同卷、上下文重叠者拼为一段）')
+    args = parser.parse_args()
+
+    print(f"\n正在并发检索 {len(args.keywords)} 个关键词...")
+    start = time.monotonic()
+    try:
+        sweep = _sweep_merged if args.merge else _sweep
+        asyncio.run(sweep(args.keywords, args.pages, args.concurrency))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f"\n检索完成（耗时 {time.monotonic() - start:.2f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+古籍文献知识图谱API共享HTTP客户端
+
+所有 cnkgraph 请求（query_api.py 的各查询函数与 HistoryExpert.query_api_*）
+都通过同一个 CnkgraphClient 发出。客户端持有一个带 keep-alive 连接池的
+requests.Session，多次查询复用已建立的 TCP+TLS 连接，不再每次重新握手。
+
+使用示例：
+    from cnkgraph_client import get_client, configure_client
+
+    # 可选：调整连接池（需在首次请求前调用）
+    configure_client(pool_maxsize=16)
+
+    data = get_client().request_json("POST", f"{BASE_URL}/Book/Find", json={"Key": "崔浩", "PageNo": 0})
+
+成功的 JSON 响应会写入 response_cache.py 的本地缓存（共享客户端默认开启），
+相同请求再次出现时直接返回缓存结果；同时进行中的相同请求经 singleflight.py
+合并为一次 HTTP 请求。实际发出的请求受 rate_limit.py 的令牌桶限速，
+429/5xx 与连接错误按退避策略重试。请求方式不确定的端点（如 Event/Search）
+用 request_negotiated 发出，探测到的方式由 endpoint_methods.py 记住并持久化。
+每次调用的缓存查找、建连、首字节、下载与 JSON 解析分阶段计时（见 scripts/tracing.py）。
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from endpoint_methods import NEGOTIATION_STATUSES, EndpointMethods, default_endpoint_methods
+from http_timing import instrument_adapter
+from rate_limit import (MAX_RETRY_AFTER, RequestMetrics, RetryPolicy, TokenBucket,
+                        default_bucket, parse_retry_after)
+from replay import Cassette, CassetteAdapter, default_cassette
+from response_cache import ResponseCache, default_cache, endpoint_of, make_key
+from singleflight import SingleFlight
+from tracing import count, record, span
+
+# API基础URL（可用环境变量 CNKGRAPH_BASE_URL 指向本地替身，见 standin_server.py）
+BASE_URL = os.environ.get("CNKGRAPH_BASE_URL") or "https://open.cnkgraph.com/api"
+
+# 超时设置（秒）
+TIMEOUT = 30
+
+# 连接池默认配置：缓存的主机连接池数量、每个主机的最大连接数
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+
+JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+
+
+class CnkgraphClient:
+    """带连接池的 cnkgraph HTTP 客户端（可在多线程间共享）"""
+
+    def __init__(self,
+                 timeout: float = TIMEOUT,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_block: bool = False,
+                 headers: Optional[Dict[str, str]] = None,
+                 cache: Optional[ResponseCache] = None,
+                 limiter: Optional[TokenBucket] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 cassette: Optional[Cassette] = None,
+                 endpoints: Optional[EndpointMethods] = None):
+        """
+        pool_connections: 缓存的主机连接池数量
+        pool_maxsize:     每个主机保持的最大连接数
+        pool_block:       为 True 时严格限制每个主机的并发连接数（超出时排队等待）
+        headers:          附加到每个请求的默认请求头（如 Accept-Language）
+        cache:            响应缓存，None 表示不缓存
+        limiter:          令牌桶限速器，None 表示不限速
+        retry:            重试策略，None 表示不重试
+        cassette:         录制/回放文件（见 replay.py），None 表示直接访问网络
+        endpoints:        端点请求方式记录（见 endpoint_methods.py），None 时只在本客户端内记忆
+        """
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = limiter
+        self.retry = retry or RetryPolicy(max_retries=0)
+        self.cassette = cassette
+        self.endpoints = endpoints if endpoints is not None else EndpointMethods(None)
+        self.request_metrics = RequestMetrics()
+        self.flight = SingleFlight()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._pool_lock = threading.Lock()
+        self.session = requests.Session()
+        self._mount_adapter()
+        if headers:
+            self.session.headers.update(headers)
+
+    def _mount_adapter(self):
+        pool = dict(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block)
+        adapter = CassetteAdapter(self.cassette, **pool) if self.cassette is not None else HTTPAdapter(**pool)
+        instrument_adapter(adapter)
+        # 整体替换适配器表而非原地 mount：其他线程的 get_adapter 可能正在遍历旧表
+        adapters = OrderedDict(self.session.adapters)
+        adapters["https://"] = adapter
+        adapters["http://"] = adapter
+        self.session.adapters = adapters
+
+    def grow_pool(self, pool_maxsize: int):
+        """把每个主机的最大连接数扩大到 pool_maxsize（只增不减）
+
+        在原会话上换装更大的适配器，请求头、缓存与限速等设置不变；旧适配器不关闭，
+        正在其上进行的请求照常完成，其连接随旧适配器一起回收。
+        """
+        with self._pool_lock:
+            if self.pool_maxsize >= pool_maxsize:
+                return
+            self.pool_maxsize = pool_maxsize
+            self._mount_adapter()
+
+    def request(self, method: str, url: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        """发出请求并返回 Response；未指定 timeout 时使用客户端默认值
+
+        每次发送前向限速器取令牌；429/5xx 与连接错误按重试策略退避后重发，
+        重试用尽时返回最后一次的 Response（或抛出最后一次的连接错误）。
+
+        deadline 为本次调用（含限速等待、重试与退避）的总时间预算（秒）：每次尝试的
+        timeout 不超过剩余时间，剩余时间不够再退避一次时不再重试，直接返回最后一次的
+        Response 或抛出错误；预算在发出请求前已用完时抛出 requests.exceptions.Timeout。
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        timeout = kwargs["timeout"]
+        end_time = None if deadline is None else time.monotonic() + deadline
+        metrics = self.request_metrics
+        endpoint = endpoint_of(url)
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                waited = self.limiter.acquire(_remaining(end_time))
+                if waited is None:
+                    metrics.record(failures=1)
+                    raise requests.exceptions.Timeout(f"限速等待超出时间预算（{deadline} 秒）: {url}")
+                if waited:
+                    metrics.record(throttle_wait=waited)
+                    record("http.throttle", waited, endpoint=endpoint)
+            if end_time is not None:
+                remaining = _remaining(end_time)
+                if remaining <= 0:
+                    metrics.record(failures=1)
+                    raise requests.exceptions.Timeout(f"超出时间预算（{deadline} 秒）: {url}")
+                kwargs["timeout"] = _cap_timeout(timeout, remaining)
+            metrics.record(requests=1)
+            try:
+                with span("http.request", method=method, endpoint=endpoint, attempt=attempt) as current:
+                    response = self.session.request(method, url, **kwargs)
+                    if current is not None:
+                        current.set(status=response.status_code)
+                if current is not None:
+                    # elapsed 为发出请求到收到响应头（新建连接时含建连），其余为读取响应体
+                    ttfb = response.elapsed.total_seconds()
+                    record("http.ttfb", ttfb, endpoint=endpoint)
+                    record("http.download", current.duration - ttfb, endpoint=endpoint)
+                count("http_requests", endpoint=endpoint, status=response.status_code)
+            except requests.exceptions.ConnectionError:
+                delay = self.retry.delay(attempt)
+                if attempt >= self.retry.max_retries or delay >= _remaining(end_time):
+                    metrics.record(failures=1)
+                    raise
+            else:
+                status = response.status_code
+                metrics.record_status(status)
+                if status not in self.retry.statuses:
+                    if self.limiter is not None and response.ok:
+                        self.limiter.reward()
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if status == 429 and self.limiter is not None:
+                    # 所有线程一起降速；Retry-After 期间整个桶暂停
+                    self.limiter.penalize()
+                    if retry_after:
+                        self.limiter.pause(min(retry_after, MAX_RETRY_AFTER))
+                delay = self.retry.delay(attempt, retry_after)
+                if (attempt >= self.retry.max_retries or (retry_after or 0) > MAX_RETRY_AFTER
+                        or delay >= _remaining(end_time)):
+                    metrics.record(failures=1)
+                    return response
+                response.close()
+            metrics.record(retries=1, backoff_wait=delay)
+            record("http.backoff", delay, endpoint=endpoint)
+            time.sleep(delay)
+            attempt += 1
+
+    def request_json(self, method: str, url: str, **kwargs) -> Any:
+        """发出请求并解析 JSON；HTTP 错误抛出 requests.exceptions.HTTPError
+
+        启用缓存且端点可缓存时，先查缓存，未命中再请求并写回。
+        与进行中的相同请求（同一缓存键）共享一次 HTTP 请求及其结果。
+        """
+        endpoint = endpoint_of(url)
+        with span("api.call", method=method, endpoint=endpoint) as call:
+            key = self._cache_key(method, url, kwargs)
+            cacheable = self.cache is not None and bool(self.cache.ttl_for(url))
+            if cacheable:
+                with span("cache.lookup", endpoint=endpoint):
+                    hit, value = self.cache.get(key)
+                count("cache", cache="cnkgraph", endpoint=endpoint, result="hit" if hit else "miss")
+                if call is not None:
+                    call.set(cached=hit)
+                if hit:
+                    return value
+
+            def fetch() -> Any:
+                response = self.request(method, url, **kwargs)
+                response.raise_for_status()
+                with span("http.decode", endpoint=endpoint):
+                    value = response.json()
+                if cacheable:
+                    self.cache.put(key, url, value)
+                return value
+
+            return self.flight.do(key, fetch)
+
+    def _cache_key(self, method: str, url: str, kwargs: Dict[str, Any]) -> str:
+        headers = kwargs.get("headers") or {}
+        accept_language = headers.get("Accept-Language") or self.session.headers.get("Accept-Language")
+        body = kwargs.get("json", kwargs.get("data"))
+        return make_key(method, url, kwargs.get("params"), body, accept_language)
+
+    def get(self, url: str, **kwargs) -> Any:
+        return self.request_json("GET", url, **kwargs)
+
+    def post_json(self, url: str, body: Any, **kwargs) -> Any:
+        """以 JSON 请求体 POST（body 可以是对象或字符串）"""
+        headers = dict(JSON_HEADERS)
+        headers.update(kwargs.pop("headers", None) or {})
+        return self.request_json("POST", url, json=body, headers=headers, **kwargs)
+
+    def request_negotiated(self, url: str, forms: List[Tuple[str, Dict[str, Any]]]) -> Any:
+        """按端点已知的请求方式请求 JSON；未知时依次尝试 forms 中的 (方式, request_json 参数)
+
+        某个方式成功后记入 self.endpoints，之后直接使用；返回 405/415 时视为方式不对，
+        换下一个候选（已知方式失效时同样重新探测）。其他 HTTP 错误直接抛出。
+        """
+        known = self.endpoints.get(url)
+        ordered = forms
+        if known is not None:
+            # 稳定排序：已知方式排到最前，其余保持原有顺序作为后备
+            ordered = sorted(forms, key=lambda form: form[0].upper() != known)
+        for i, (method, kwargs) in enumerate(ordered):
+            try:
+                value = self.request_json(method, url, **kwargs)
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in NEGOTIATION_STATUSES or i == len(ordered) - 1:
+                    raise
+                if method.upper() == known:
+                    self.endpoints.forget(url)
+                continue
+            if i == 0 and ordered[0] is not forms[0]:
+                self.endpoints.record_hit()
+            self.endpoints.learn(url, method)
+            return value
+
+    def metrics(self) -> Dict[str, Any]:
+        """汇总请求、限速、合并与缓存指标"""
+        info: Dict[str, Any] = {"http": self.request_metrics.snapshot(),
+                                "singleflight": self.flight.stats()}
+        if self.limiter is not None:
+            info["rate"] = {"current": round(self.limiter.rate, 3), "max": self.limiter.max_rate}
+        if self.cache is not None:
+            info["cache"] = self.cache.stats()
+        info["endpoints"] = self.endpoints.stats()
+        return info
+
+    def close(self):
+        self.session.close()
+
+
+def _remaining(end_time: Optional[float]) -> float:
+    """距 end_time 的剩余秒数；无预算时为无穷大"""
+    return float("inf") if end_time is None else end_time - time.monotonic()
+
+
+def _cap_timeout(timeout: Any, remaining: float) -> Any:
+    """把 requests 的 timeout（秒数或 (连接, 读取) 元组）限制在剩余时间内"""
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+_client: Optional[CnkgraphClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> CnkgraphClient:
+    """返回进程内共享的客户端（首次调用时创建）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CnkgraphClient(**_shared_defaults({}))
+        return _client
+
+
+def _shared_defaults(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """为未指定的参数补上共享客户端默认启用的缓存、限速、重试、录制/回放与端点记录"""
+    factories = {"cache": default_cache, "limiter": default_bucket, "retry": RetryPolicy,
+                 "cassette": default_cassette, "endpoints": default_endpoint_methods}
+    for name, factory in factories.items():
+        if name not in kwargs:
+            kwargs[name] = factory()
+    return kwargs
+
+
+def configure_client(**kwargs) -> CnkgraphClient:
+    """按给定参数重建共享客户端（参数同 CnkgraphClient）
+
+    未指定的 cache、limiter、retry、cassette、endpoints 沿用原客户端的实例，限速状态与已探测的端点不会因重建而重置。
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            for name in ("cache", "limiter", "retry", "cassette", "endpoints"):
+                kwargs.setdefault(name, getattr(_client, name))
+            _client.close()
+        else:
+            _shared_defaults(kwargs)
+        _client = CnkgraphClient(**kwargs)
+        return _client
+
+
+def ensure_pool_size(pool_maxsize: int) -> CnkgraphClient:
+    """保证共享客户端每个主机至少能保持 pool_maxsize 个连接（只增不减）
+
+    在现有客户端上扩大连接池，不重建客户端，其他线程可以继续使用。
+    """
+    client = get_client()
+    client.grow_pool(pool_maxsize)
+    return client
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+cnkgraph 端点请求方式的探测与记忆
+
+部分端点的请求方式不确定：Event/Search 不在 Swagger 中，以往每次先 GET，
+遇到 405 再改用 POST，每个事件查询至少两次往返（且 405 不进缓存，POST 的
+缓存命中也要先白白 GET 一次）。EndpointMethods 记住每个端点可用的请求方式：
+
+- 运行时学习：CnkgraphClient.request_negotiated 按候选顺序尝试，某个方式成功
+  后记下；之后同一端点直接使用它，只有它返回 405/415 时才重新探测
+- Swagger：load_swagger 读取 /swagger/v1/swagger.json，登记只有一种请求方式的端点
+- 持久化：学到的结果写入 ~/.cache/history-agent-skills/cnkgraph-endpoints.json
+  （CNKGRAPH_ENDPOINTS_PATH 可改路径），新进程无需重新探测；CNKGRAPH_CACHE=0
+  时与响应缓存一同关闭持久化，只在进程内记忆
+- 记录按 scheme://主机/端点 区分：指向本地替身（CNKGRAPH_BASE_URL）的运行不会
+  改动线上 API 的记录
+
+使用示例：
+    from cnkgraph_client import get_client
+
+    client = get_client()
+    data = client.request_negotiated(f"{BASE_URL}/Event/Search", [
+        ("GET", {"params": {"keyword": "安史之乱"}}),
+        ("POST", {"json": "安史之乱", "headers": JSON_HEADERS}),
+    ])
+    print(client.endpoints.snapshot())   # {"https://open.cnkgraph.com/Event/Search": "POST"}
+
+命令行：python cnkgraph/scripts/query_api.py endpoints [--discover] [--clear]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from response_cache import DEFAULT_CACHE_PATH, endpoint_of
+
+DEFAULT_ENDPOINTS_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "cnkgraph-endpoints.json")
+
+SWAGGER_PATH = "/swagger/v1/swagger.json"
+
+# 这些状态码说明请求方式或请求体格式不对，应换下一个候选
+NEGOTIATION_STATUSES = (405, 415)
+
+_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH")
+
+
+def endpoint_key(url: str) -> str:
+    """记录键：scheme://主机/端点，如 https://open.cnkgraph.com/api/Book/Find → https://open.cnkgraph.com/Book/Find"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/{endpoint_of(url)}"
+
+
+class EndpointMethods:
+    """线程安全的 scheme://主机/端点 -> 请求方式 表"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_ENDPOINTS_PATH):
+        """path 为 None 时只在进程内记忆"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._methods: Dict[str, str] = {}
+        self.learned = 0
+        self.saved_round_trips = 0
+        if path:
+            self._load(path)
+
+    def _load(self, path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️  端点记录不可用，将重新探测: {e}", file=sys.stderr)
+            return
+        if isinstance(data, dict):
+            # 不含主机的旧记录无法判断属于哪个服务，丢弃后重新探测
+            self._methods = {k: v for k, v in data.items()
+                             if "://" in k and isinstance(v, str) and v in _METHODS}
+
+    def _save(self):
+        """原子地写回记录文件；调用方持有锁"""
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".endpoints-", dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._methods, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            tmp_path = None
+        except OSError as e:
+            print(f"⚠️  写入端点记录出错: {e}", file=sys.stderr)
+        finally:
+            # 写入或替换失败时不留下临时文件
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def get(self, url: str) -> Optional[str]:
+        """URL 所属端点已知可用的请求方式"""
+        with self._lock:
+            return self._methods.get(endpoint_key(url))
+
+    def learn(self, url: str, method: str):
+        """记下端点可用的请求方式（与已有记录相同时不写盘）"""
+        endpoint, method = endpoint_key(url), method.upper()
+        with self._lock:
+            if self._methods.get(endpoint) == method:
+                return
+            self._methods[endpoint] = method
+            self.learned += 1
+            self._save()
+
+    def forget(self, url: str):
+        """端点的记录已失效（如 API 改了请求方式）"""
+        with self._lock:
+            if self._methods.pop(endpoint_key(url), None) is not None:
+                self._save()
+
+    def record_hit(self):
+        """按已知方式直接请求，省下一次探测往返"""
+        with self._lock:
+            self.saved_round_trips += 1
+
+    def update_from_swagger(self, spec: Dict[str, Any], base_url: str) -> int:
+        """登记 Swagger 中只声明了一种请求方式的端点（属于 base_url 所在的服务），返回登记数"""
+        found: Dict[str, str] = {}
+        for path, operations in (spec.get("paths") or {}).items():
+            if not isinstance(operations, dict):
+                continue
+            methods = [m.upper() for m in operations if m.upper() in _METHODS]
+            if len(methods) == 1:
+                found[endpoint_key(urljoin(base_url, path))] = methods[0]
+        with self._lock:
+            self._methods.update(found)
+            if found:
+                self._save()
+        return len(found)
+
+    def clear(self):
+        with self._lock:
+            self._methods.clear()
+            if self.path and os.path.exists(self.path):
+                try:
+                    os.unlink(self.path)
+                except OSError as e:
+                    print(f"⚠️  删除端点记录出错: {e}", file=sys.stderr)
+
+    def snapshot(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(sorted(self._methods.items()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"path": self.path, "endpoints": len(self._methods),
+                    "learned": self.learned, "saved_round_trips": self.saved_round_trips}
+
+
+def swagger_url(base_url: str) -> str:
+    """由 API 基础 URL（.../api）推出 Swagger 文档地址"""
+    parts = urlsplit(base_url)
+    path = parts.path.rstrip("/")
+    if path.endswith("/api"):
+        path = path[:-len("/api")]
+    return urlunsplit((parts.scheme, parts.netloc, path + SWAGGER_PATH, "", ""))
+
+
+def load_swagger(client, base_url: str) -> int:
+    """下载 Swagger 文档并登记其中的端点，返回登记数；HTTP 错误抛出 requests 异常"""
+    response = client.request("GET", swagger_url(base_url))
+    response.raise_for_status()
+    return client.endpoints.update_from_swagger(response.json(), base_url)
+
+
+def default_endpoint_methods() -> EndpointMethods:
+    """按环境变量创建默认记录；CNKGRAPH_CACHE=0 时只在进程内记忆"""
+    if os.environ.get("CNKGRAPH_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return EndpointMethods(None)
+    return EndpointMethods(os.environ.get("CNKGRAPH_ENDPOINTS_PATH") or DEFAULT_ENDPOINTS_PATH)
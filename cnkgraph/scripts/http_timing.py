@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+HTTP 建连计时
+
+requests 的 Response.elapsed 只给出发出请求到收到响应头的总时间，新建连接时
+其中混有 DNS、TCP 与 TLS 握手。instrument_adapter 让适配器的连接池改用带
+计时的连接类，每次新建连接记录两个阶段（见 scripts/tracing.py）：
+
+    http.connect   建立连接的全部时间（HTTPS 含 TLS 握手）
+    http.tcp       其中的 DNS 解析与 TCP 握手
+
+复用 keep-alive 连接的请求不产生这两个阶段，两者的次数之比即连接复用情况。
+
+使用示例：
+    from http_timing import instrument_adapter
+
+    adapter = HTTPAdapter(pool_maxsize=10)
+    instrument_adapter(adapter)
+"""
+
+import os
+import sys
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 追踪模块位于仓库根目录的 scripts/ 下
+_SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts")
+if _SHARED_DIR not in sys.path:
+    sys.path.insert(0, _SHARED_DIR)
+
+from tracing import span
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        with span("http.tcp", host=self.host):
+            return super()._new_conn()
+
+    def connect(self):
+        with span("http.connect", host=self.host, scheme="http"):
+            super().connect()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        with span("http.tcp", host=self.host):
+            return super()._new_conn()
+
+    def connect(self):
+        with span("http.connect", host=self.host, scheme="https"):
+            super().connect()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+def instrument_adapter(adapter: HTTPAdapter) -> HTTPAdapter:
+    """让适配器此后新建的连接池使用带计时的连接（经代理的请求不计时）"""
+    adapter.poolmanager.pool_classes_by_scheme = {
+        "http": TimedHTTPConnectionPool,
+        "https": TimedHTTPSConnectionPool,
+    }
+    return adapter
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+人物与作品的本地知识库（SQLite）
+
+人物资料（/api/People/{id}）与某位作者的全部作品（/api/Writing/Find）几乎不变，
+却在每次提问时重新请求。KnowledgeStore 把它们存进带索引的本地 SQLite：
+
+- 人物：按姓名（简繁归一化后）与朝代建索引；人物资料中形如
+  [{"Name": ...}, ...] 的字段（亲属、师友等）拆为 relations 表中的关系边（两端均存简体姓名）
+- 作品：按作者（简繁归一化后）、朝代与题目建索引，同一作品只存一份
+- 作者同步状态：sync_author 翻完某位作者的全部页后记为「完整」，
+  此后按作者（可加朝代）查询作品直接由本地回答，不再访问 API
+
+填充方式：
+- 随查询增量写入：query_api.search_people / search_poetry 与 HistoryExpert 的
+  人物、诗词查询经 person_through_store / poetry_through_store 读写本库，
+  人物命中时不再请求 API
+- 批量预取：python cnkgraph/scripts/knowledge_store.py sync --author 李白 --person 苏轼
+
+人物资料超过 PERSON_MAX_AGE、作者同步超过 AUTHOR_MAX_AGE 后视为过期，下次重新请求。
+库文件默认位于 ~/.cache/history-agent-skills/cnkgraph-graph.sqlite3，
+可用 CNKGRAPH_STORE_PATH 指定；CNKGRAPH_STORE=0（或 CNKGRAPH_CACHE=0）关闭。
+
+使用示例：
+    from knowledge_store import get_store
+
+    store = get_store()
+    store.works(author="李白", dynasty="唐", limit=20)   # 本地查询，毫秒级
+    store.people(dynasty="宋")
+    store.relations("苏轼")
+
+命令行：
+    python cnkgraph/scripts/knowledge_store.py sync --author 李白 --author 杜甫 --person 苏轼
+    python cnkgraph/scripts/knowledge_store.py works --author 李白 --dynasty 唐
+    python cnkgraph/scripts/knowledge_store.py people --dynasty 宋
+    python cnkgraph/scripts/knowledge_store.py stats
+"""
+
+import sys
+import os
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pagination import DEFAULT_MAX_PAGES, extract_items
+from response_cache import DAY, DEFAULT_CACHE_PATH
+from tracing import count, span
+from zh_variants import fold
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "cnkgraph-graph.sqlite3")
+
+# 人物资料与作者作品的有效期（秒），与响应缓存中人物的 TTL 一致
+PERSON_MAX_AGE = 30 * DAY
+AUTHOR_MAX_AGE = 30 * DAY
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    name    TEXT PRIMARY KEY,
+    folded  TEXT NOT NULL,
+    dynasty TEXT,
+    data    TEXT NOT NULL,
+    fetched REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS people_folded ON people (folded);
+CREATE INDEX IF NOT EXISTS people_dynasty ON people (dynasty);
+
+CREATE TABLE IF NOT EXISTS relations (
+    source   TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    target   TEXT NOT NULL,
+    PRIMARY KEY (source, relation, target)
+);
+CREATE INDEX IF NOT EXISTS relations_target ON relations (target);
+
+CREATE TABLE IF NOT EXISTS works (
+    id      INTEGER PRIMARY KEY,
+    title   TEXT,
+    author  TEXT,
+    folded  TEXT,
+    dynasty TEXT,
+    content TEXT,
+    data    TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    UNIQUE (folded, title, content)
+);
+CREATE INDEX IF NOT EXISTS works_author ON works (folded, dynasty);
+CREATE INDEX IF NOT EXISTS works_dynasty ON works (dynasty);
+CREATE INDEX IF NOT EXISTS works_title ON works (title);
+
+CREATE TABLE IF NOT EXISTS authors (
+    folded    TEXT PRIMARY KEY,
+    page_size INTEGER NOT NULL,
+    works     INTEGER NOT NULL,
+    synced    REAL NOT NULL
+);
+"""
+
+
+def _field(item: Dict[str, Any], name: str) -> Any:
+    """按大小写两种写法取字段（Name / name）"""
+    value = item.get(name)
+    if value in (None, ""):
+        value = item.get(name[:1].lower() + name[1:])
+    return value if value not in (None, "") else None
+
+
+def _text(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) else (None if value is None else str(value))
+
+
+def person_relations(data: Dict[str, Any]) -> Iterable[tuple]:
+    """人物资料中的关系边：值为 [{"Name": ...}, ...] 或 {"Name": ...} 的字段，产出 (关系, 对方姓名)"""
+    for key, value in data.items():
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            if isinstance(item, dict):
+                name = _text(_field(item, "Name"))
+                if name:
+                    yield key, name
+
+
+class KnowledgeStore:
+    """线程安全的人物/作品本地库"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH,
+                 person_max_age: float = PERSON_MAX_AGE,
+                 author_max_age: float = AUTHOR_MAX_AGE):
+        self.path = path
+        self.person_max_age = person_max_age
+        self.author_max_age = author_max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        # WAL 模式：多个会话进程可同时读写
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # ---- 人物 ----
+
+    def get_person(self, name: str) -> Optional[Dict[str, Any]]:
+        """按姓名（简繁均可）取未过期的人物资料，没有时返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM people WHERE folded = ? AND fetched > ? ORDER BY fetched DESC LIMIT 1",
+                (fold(name), time.time() - self.person_max_age)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put_person(self, data: Dict[str, Any], name: Optional[str] = None):
+        """写入一条人物资料（以资料中的 Name 为准，缺失时用查询名），并更新其关系边"""
+        name = _text(_field(data, "Name")) or name
+        if not name:
+            return
+        value = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                db.execute("INSERT OR REPLACE INTO people (name, folded, dynasty, data, fetched) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           (name, fold(name), _text(_field(data, "Dynasty")), value, time.time()))
+                db.execute("DELETE FROM relations WHERE source = ?", (fold(name),))
+                db.executemany("INSERT OR IGNORE INTO relations (source, relation, target) VALUES (?, ?, ?)",
+                               [(fold(name), relation, fold(target)) for relation, target in person_relations(data)])
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+
+    def people(self, dynasty: Optional[str] = None, name: Optional[str] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按朝代和/或姓名前缀列出人物资料"""
+        clauses, params = [], []
+        if dynasty:
+            clauses.append("dynasty = ?")
+            params.append(dynasty)
+        if name:
+            # 前缀查询可用 folded 索引：[前缀, 前缀 + U+FFFF)
+            prefix = fold(name)
+            clauses.append("folded >= ? AND folded < ?")
+            params += [prefix, prefix + "\uffff"]
+        sql = "SELECT data FROM people"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY folded LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def relations(self, name: str) -> List[Dict[str, str]]:
+        """与某人相关的关系边（两个方向；姓名简繁均可，返回归一化后的简体姓名）"""
+        name = fold(name)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT source, relation, target FROM relations WHERE source = ? "
+                "UNION SELECT source, relation, target FROM relations WHERE target = ?",
+                (name, name)).fetchall()
+        return [{"source": s, "relation": r, "target": t} for s, r, t in rows]
+
+    # ---- 作品 ----
+
+    def add_works(self, items: Iterable[Any]) -> int:
+        """写入 Writing/Find 的作品条目（已有的作品更新资料），返回处理的条数"""
+        now = time.time()
+        rows = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            author = _text(_field(item, "Author"))
+            # 题目与正文缺失时存空串，使唯一约束对它们同样生效
+            rows.append((_text(_field(item, "Title")) or "", author, fold(author) if author else None,
+                         _text(_field(item, "Dynasty")), _text(_field(item, "Content")) or "",
+                         json.dumps(item, ensure_ascii=False, separators=(",", ":")), now))
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO works (title, author, folded, dynasty, content, data, fetched) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (folded, title, content) DO UPDATE SET "
+                "author = excluded.author, dynasty = excluded.dynasty, data = excluded.data, "
+                "fetched = excluded.fetched", rows)
+        return len(rows)
+
+    def works(self, author: Optional[str] = None, dynasty: Optional[str] = None,
+              title: Optional[str] = None, limit: Optional[int] = None,
+              offset: int = 0) -> List[Dict[str, Any]]:
+        """按作者（简繁均可）、朝代、题目查询作品，按写入顺序返回原始条目"""
+        clauses, params = [], []
+        if author:
+            clauses.append("folded = ?")
+            params.append(fold(author))
+        if dynasty:
+            clauses.append("dynasty = ?")
+            params.append(dynasty)
+        if title:
+            clauses.append("title = ?")
+            params.append(title)
+        sql = "SELECT data FROM works"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def mark_author_synced(self, author: str, page_size: int):
+        """记录某位作者的作品已全部取回"""
+        folded = fold(author)
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM works WHERE folded = ?", (folded,)).fetchone()[0]
+            self._db.execute("INSERT OR REPLACE INTO authors (folded, page_size, works, synced) VALUES (?, ?, ?, ?)",
+                             (folded, max(1, page_size), count, time.time()))
+
+    def author_page_size(self, author: str) -> Optional[int]:
+        """作者的作品已完整同步且未过期时，返回同步时的每页条数；否则返回 None"""
+        with self._lock:
+            row = self._db.execute("SELECT page_size FROM authors WHERE folded = ? AND synced > ?",
+                                   (fold(author), time.time() - self.author_max_age)).fetchone()
+        return row[0] if row else None
+
+    # ---- 维护 ----
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("people", "relations", "works", "authors")}
+            return {"path": self.path, **counts, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            for table in ("people", "relations", "works", "authors"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[KnowledgeStore] = None
+_store_lock = threading.Lock()
+_store_disabled = False
+
+
+def get_store() -> Optional[KnowledgeStore]:
+    """返回进程内共享的本地库（首次调用时打开）；关闭或无法打开时返回 None"""
+    global _store, _store_disabled
+    with _store_lock:
+        if _store is None and not _store_disabled:
+            off = ("0", "false", "no", "off")
+            if (os.environ.get("CNKGRAPH_STORE", "1").strip().lower() in off
+                    or os.environ.get("CNKGRAPH_CACHE", "1").strip().lower() in off):
+                _store_disabled = True
+                return None
+            try:
+                _store = KnowledgeStore(os.environ.get("CNKGRAPH_STORE_PATH") or DEFAULT_STORE_PATH)
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️  本地知识库不可用: {e}", file=sys.stderr)
+                _store_disabled = True
+        return _store
+
+
+def configure_store(store: Optional[KnowledgeStore]) -> Optional[KnowledgeStore]:
+    """替换共享的本地库；传入 None 时本进程不再读写本地库（如 query_api.py --no-cache）"""
+    global _store, _store_disabled
+    with _store_lock:
+        _store = store
+        _store_disabled = store is None
+        return store
+
+
+def person_through_store(name: str, fetch: Callable[[], Any]) -> Any:
+    """先查本地库，未命中再 fetch() 请求人物 API，成功的结果写回本地库"""
+    store = get_store()
+    if store is not None:
+        with span("store.lookup", table="people"):
+            data = store.get_person(name)
+        count("cache", cache="store", endpoint="People", result="miss" if data is None else "hit")
+        if data is not None:
+            return data
+    data = fetch()
+    if store is not None and isinstance(data, dict) and not data.get("error"):
+        try:
+            store.put_person(data, name)
+        except sqlite3.Error as e:
+            print(f"⚠️  写入本地知识库出错: {e}", file=sys.stderr)
+    return data
+
+
+def poetry_through_store(body: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+    """Writing/Find 经本地库：只按作者（及朝代）查询且该作者已完整同步时由本地回答，
+    否则 fetch() 请求 API，并把结果中的作品写入本地库"""
+    store = get_store()
+    author = body.get("Author")
+    if store is not None and author and not body.get("Key"):
+        with span("store.lookup", table="works"):
+            page_size = store.author_page_size(author)
+            if page_size is not None:
+                page_no = int(body.get("PageNo") or 0)
+                data = {"Result": store.works(author=author, dynasty=body.get("Dynasty"),
+                                              limit=page_size, offset=page_no * page_size)}
+        count("cache", cache="store", endpoint="Writing/Find", result="miss" if page_size is None else "hit")
+        if page_size is not None:
+            return data
+    data = fetch()
+    if store is not None and not (isinstance(data, dict) and data.get("error")):
+        try:
+            store.add_works(extract_items(data))
+        except sqlite3.Error as e:
+            print(f"⚠️  写入本地知识库出错: {e}", file=sys.stderr)
+    return data
+
+
+def sync_author(store: KnowledgeStore, author: str) -> Dict[str, Any]:
+    """翻页取回某位作者的全部作品写入本地库；全部取回时标记为完整同步"""
+    import query_api
+
+    page_size = 0
+    fetched = 0
+    pages = 0
+    error = None
+    page_no = 0
+    while page_no < DEFAULT_MAX_PAGES:
+        # 直接请求 API，不经 poetry_through_store，避免读到本地已有的结果
+        data = query_api.fetch_poetry_page({"Author": author, "PageNo": page_no})
+        pages += 1
+        if isinstance(data, dict) and data.get("error"):
+            error = data["error"]
+            break
+        items = extract_items(data)
+        if not items:
+            break
+        page_size = max(page_size, len(items))
+        fetched += store.add_works(items)
+        page_no += 1
+    complete = error is None and page_no < DEFAULT_MAX_PAGES
+    if complete:
+        store.mark_author_synced(author, page_size)
+    return {"author": author, "works": fetched, "pages": pages, "complete": complete, "error": error}
+
+
+def sync_person(store: KnowledgeStore, name: str) -> Dict[str, Any]:
+    """请求人物 API 并写入本地库（忽略本地已有的记录）"""
+    import query_api
+
+    data = query_api.fetch_person(name)
+    if isinstance(data, dict) and not data.get("error"):
+        store.put_person(data, name)
+        return {"person": name, "relations": len(list(person_relations(data))), "error": None}
+    return {"person": name, "relations": 0, "error": data.get("error") if isinstance(data, dict) else "无法识别的结果"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="人物与作品本地知识库")
+    subparsers = parser.add_subparsers(dest="command")
+
+    sync_parser = subparsers.add_parser("sync", help="批量预取人物与作者作品")
+    sync_parser.add_argument("--author", action="append", default=[], help="作者（可重复）")
+    sync_parser.add_argument("--person", action="append", default=[], help="人物（可重复）")
+
+    works_parser = subparsers.add_parser("works", help="查询本地作品")
+    works_parser.add_argument("--author", help="作者")
+    works_parser.add_argument("--dynasty", help="朝代")
+    works_parser.add_argument("--title", help="题目")
+    works_parser.add_argument("--limit", type=int, default=20, help="返回条数")
+
+    people_parser = subparsers.add_parser("people", help="查询本地人物")
+    people_parser.add_argument("--dynasty", help="朝代")
+    people_parser.add_argument("--name", help="姓名前缀")
+    people_parser.add_argument("--relations", action="store_true", help="同时列出关系")
+    people_parser.add_argument("--limit", type=int, default=20, help="返回条数")
+
+    subparsers.add_parser("stats", help="显示本地库统计")
+    subparsers.add_parser("clear", help="清空本地库")
+
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+
+    store = get_store()
+    if store is None:
+        print("❌ 本地知识库已关闭（CNKGRAPH_STORE=0 或 CNKGRAPH_CACHE=0）")
+        sys.exit(1)
+
+    if args.command == "sync":
+        if not (args.author or args.person):
+            print("❌ 请用 --author 或 --person 指定要预取的对象")
+            sys.exit(1)
+        failed = False
+        for author in args.author:
+            result = sync_author(store, author)
+            failed = failed or not result["complete"]
+            mark = "✓" if result["complete"] else "⚠️ "
+            detail = f"，出错: {result['error']}" if result["error"] else ""
+            print(f"{mark} {author}：{result['works']} 篇作品，{result['pages']} 页{detail}")
+        for name in args.person:
+            result = sync_person(store, name)
+            failed = failed or bool(result["error"])
+            if result["error"]:
+                print(f"⚠️  {name}：{result['error']}")
+            else:
+                print(f"✓ {name}：{result['relations']} 条关系")
+        if failed:
+            sys.exit(1)
+
+    elif args.command == "works":
+        start = time.perf_counter()
+        works = store.works(author=args.author, dynasty=args.dynasty, title=args.title, limit=args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for item in works:
+            print(f"《{_field(item, 'Title') or '无题'}》 {_field(item, 'Dynasty') or ''}·{_field(item, 'Author') or ''}")
+        print(f"\n共 {len(works)} 篇（本地查询 {elapsed:.1f} ms）")
+
+    elif args.command == "people":
+        for person in store.people(dynasty=args.dynasty, name=args.name, limit=args.limit):
+            name = _field(person, "Name")
+            print(f"{name}（{_field(person, 'Dynasty') or '朝代不详'}）")
+            if args.relations and name:
+                for edge in store.relations(name):
+                    other = edge["target"] if edge["source"] == fold(name) else edge["source"]
+                    print(f"    {edge['relation']}: {other}")
+
+    elif args.command == "stats":
+        print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+
+    elif args.command == "clear":
+        store.clear()
+        print("✓ 已清空本地知识库")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+cnkgraph 分页结果的惰性迭代
+
+Book/Find、Writing/Find 每次只返回一页（PageNo 从 0 开始）。Paginator 按需逐页
+请求，并在消费当前页时于后台预取下一页；达到条数上限或某页为空时停止。
+取前 N 条只发出必要的请求，大结果集也只在内存中保留当前页。
+
+使用示例：
+    from query_api import iter_book_passages
+
+    pages = iter_book_passages("崔浩", limit=20)
+    for passage in pages:
+        print(passage.book, passage.volume, passage.matched)
+    if pages.error:
+        print(pages.error)
+"""
+
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 单次迭代最多请求的页数（防止服务端忽略 PageNo 时无限翻页）
+DEFAULT_MAX_PAGES = 50
+
+PASSAGE_FIELDS = ("PreviousText", "MatchedText", "LaterText")
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, list):
+        return value
+    return [] if value is None else [value]
+
+
+def _label(obj: Any, *keys: str) -> Optional[str]:
+    """取对象的名称字段（字段值本身也可能是带 Title/Name 的对象）"""
+    if not isinstance(obj, dict):
+        return obj if isinstance(obj, str) else None
+    for key in keys:
+        value = obj.get(key)
+        if isinstance(value, str) and value:
+            return value
+        if isinstance(value, dict):
+            nested = _label(value, "Title", "Name")
+            if nested:
+                return nested
+    return None
+
+
+def extract_items(data: Any) -> List[Any]:
+    """取出一页结果中的条目列表（Writing/Find 等：顶层列表或 Result/Items/Data 字段）"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ("Result", "Writings", "Items", "Data"):
+            value = data.get(key)
+            if isinstance(value, list):
+                return value
+    return []
+
+
+class Paginator:
+    """逐页请求并逐条产出结果的可迭代对象
+
+    fetch_page(page_no) 返回一页原始结果（出错时为 {"error": ...}），
+    extract(data) 从中取出条目列表。迭代结束后可通过 error 查看是否因出错而中止，
+    pages_fetched 为实际请求的页数，last_page 为最后一页的原始结果
+    （结构无法识别、取不出条目时可据此原样输出）。
+    """
+
+    def __init__(self, fetch_page: Callable[[int], Any],
+                 extract: Callable[[Any], List[Any]],
+                 limit: Optional[int] = None,
+                 start_page: int = 0,
+                 prefetch: bool = True,
+                 max_pages: int = DEFAULT_MAX_PAGES):
+        self.fetch_page = fetch_page
+        self.extract = extract
+        self.limit = limit
+        self.start_page = start_page
+        self.prefetch = prefetch
+        self.max_pages = max_pages
+        self.error: Optional[str] = None
+        self.pages_fetched = 0
+        self.last_page: Any = None
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.limit is not None and self.limit <= 0:
+            return
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        pending: Optional[Future] = None
+        yielded = 0
+        previous: Optional[List[Any]] = None
+        try:
+            for page_no in range(self.start_page, self.start_page + self.max_pages):
+                data = pending.result() if pending is not None else self.fetch_page(page_no)
+                pending = None
+                self.pages_fetched += 1
+                self.last_page = data
+                if isinstance(data, dict) and data.get("error"):
+                    self.error = data["error"]
+                    return
+                items = self.extract(data)
+                # 空页，或服务端忽略页码返回了同一页，视为结束
+                if not items or items == previous:
+                    return
+                previous = items
+
+                remaining = None if self.limit is None else self.limit - yielded
+                if executor is not None and (remaining is None or remaining > len(items)):
+                    # 预取线程沿用当前上下文（追踪、守护进程的输出重定向）
+                    pending = executor.submit(contextvars.copy_context().run, self.fetch_page, page_no + 1)
+
+                for item in items:
+                    yield item
+                    yielded += 1
+                    if self.limit is not None and yielded >= self.limit:
+                        return
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+跨关键词的原文片段去重与合并
+
+多次查询策略（崔浩、暴扬国恶、国史 刊石……）分别检索 Book/Find 时，不同关键词
+常命中同一书同一卷中相互重叠的上下文。PassageMerger 按（书名, 卷）分组，
+用定长字符 shingle（去除空白后的正文子串）索引已有片段：新片段与某段共享
+shingle 且重叠部分逐字一致时，拼接为同一段连续文本（span），并记录每个关键词
+在其中的命中位置；一个片段同时衔接两段时，两段也会合并。每个字符只做一次
+shingle 查找，数千条片段的合并耗时与总字数近似线性。
+
+使用示例：
+    from passage_merge import PassageMerger
+    from passages import iter_passages
+
+    merger = PassageMerger()
+    for keyword in ("崔浩", "暴扬国恶", "国史 刊石"):
+        for passage in iter_passages(find_book_passages(keyword)):
+            merger.add(keyword, passage)
+    for span in merger.spans():
+        print(span.book, span.volume, span.keywords, span.text)
+    print(merger.stats())
+
+命令行：python cnkgraph/scripts/async_query_api.py 崔浩 暴扬国恶 "国史 刊石" --merge
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# shingle 长度（字符）。过短会把常见词组误当作重叠，过长则漏掉较短的重叠
+DEFAULT_SHINGLE_SIZE = 12
+
+
+def normalize(text: Optional[str]) -> str:
+    """去除全部空白（含全角空格与换行），作为比较与拼接的基准文本"""
+    return "".join(text.split()) if text else ""
+
+
+class MergedSpan:
+    """合并后的一段连续原文"""
+
+    __slots__ = ("id", "book", "volume", "text", "origin", "hits", "passages")
+
+    def __init__(self, span_id: int, book: Optional[str], volume: Optional[str], text: str, origin: int = 0):
+        self.id = span_id
+        self.book = book
+        self.volume = volume
+        self.text = text
+        # text[0] 在本段坐标系中的位置；向前拼接时减小，已记录的位置无需平移
+        self.origin = origin
+        # (关键词, 起, 止) -> None，保持首次出现顺序并去重；坐标同 origin
+        self.hits: Dict[Tuple[str, int, int], None] = {}
+        self.passages = 0
+
+    @property
+    def end(self) -> int:
+        return self.origin + len(self.text)
+
+    @property
+    def keywords(self) -> List[str]:
+        """命中本段的关键词（按首次出现顺序）"""
+        return list(dict.fromkeys(keyword for keyword, _, _ in self.hits))
+
+    def hit_spans(self) -> List[Tuple[str, int, int]]:
+        """各关键词在 text 中的命中区间 [起, 止)"""
+        return [(keyword, start - self.origin, end - self.origin) for keyword, start, end in self.hits]
+
+    def agrees(self, text: str, start: int) -> bool:
+        """把 text 放在本段坐标 start 处时，与已有文本的重叠部分是否逐字一致（且确有重叠）"""
+        lo, hi = max(self.origin, start), min(self.end, start + len(text))
+        if lo >= hi:
+            return False
+        return self.text[lo - self.origin:hi - self.origin] == text[lo - start:hi - start]
+
+    def extend(self, text: str, start: int):
+        """把位于 start 处的 text 并入本段（只补上超出两端的部分）"""
+        end = self.end
+        if start + len(text) > end:
+            self.text += text[end - start:]
+        if start < self.origin:
+            self.text = text[:self.origin - start] + self.text
+            self.origin = start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "Book": self.book,
+            "Volume": self.volume,
+            "Text": self.text,
+            "Keywords": self.keywords,
+            "Hits": [{"Keyword": k, "Start": s, "End": e} for k, s, e in self.hit_spans()],
+            "Passages": self.passages,
+        }
+
+    def __repr__(self) -> str:
+        return f"MergedSpan({self.book!r}, {self.volume!r}, {len(self.text)} 字, {self.keywords!r})"
+
+
+class _Group:
+    """同一书同一卷内的片段索引"""
+
+    __slots__ = ("spans", "index", "short")
+
+    def __init__(self):
+        self.spans: Dict[int, MergedSpan] = {}
+        # shingle -> (span id, 该 shingle 在 span 坐标系中的位置)，只保留首次出现
+        self.index: Dict[str, Tuple[int, int]] = {}
+        # 短于 shingle 的片段只能按全文精确去重
+        self.short: Dict[str, int] = {}
+
+
+class PassageMerger:
+    """增量合并原文片段：add 逐条加入，spans 取当前的合并结果"""
+
+    def __init__(self, shingle_size: int = DEFAULT_SHINGLE_SIZE):
+        self.shingle_size = max(2, shingle_size)
+        self._groups: Dict[Tuple[Optional[str], Optional[str]], _Group] = {}
+        # 全部存活的 span，按首次出现顺序
+        self._spans: Dict[int, MergedSpan] = {}
+        self._next_id = 0
+        self.passages_in = 0
+        self.chars_in = 0
+
+    def _new_span(self, group: _Group, book: Optional[str], volume: Optional[str], text: str) -> MergedSpan:
+        span = MergedSpan(self._next_id, book, volume, text)
+        self._next_id += 1
+        group.spans[span.id] = span
+        self._spans[span.id] = span
+        return span
+
+    def _index(self, group: _Group, span: MergedSpan, text: str, start: int):
+        k = self.shingle_size
+        index = group.index
+        for i in range(len(text) - k + 1):
+            index.setdefault(text[i:i + k], (span.id, start + i))
+
+    def _absorb(self, group: _Group, target: MergedSpan, other: MergedSpan, delta: int):
+        """把 other 并入 target；other 的坐标 x 对应 target 的 x + delta"""
+        target.extend(other.text, other.origin + delta)
+        for (keyword, start, end) in other.hits:
+            target.hits[(keyword, start + delta, end + delta)] = None
+        target.passages += other.passages
+        k = self.shingle_size
+        index = group.index
+        text, origin = other.text, other.origin
+        for i in range(len(text) - k + 1):
+            shingle = text[i:i + k]
+            if index.get(shingle, (None,))[0] == other.id:
+                index[shingle] = (target.id, origin + i + delta)
+        for key, span_id in group.short.items():
+            if span_id == other.id:
+                group.short[key] = target.id
+        del group.spans[other.id]
+        del self._spans[other.id]
+
+    def add(self, keyword: str, passage: Any):
+        """加入一条片段（passages.Passage，或含 PreviousText/MatchedText/LaterText 的 dict）"""
+        previous = normalize(passage.get("PreviousText"))
+        matched = normalize(passage.get("MatchedText"))
+        later = normalize(passage.get("LaterText"))
+        text = previous + matched + later
+        if not text:
+            return
+        self.passages_in += 1
+        self.chars_in += len(text)
+        book, volume = passage.get("Book"), passage.get("Volume")
+        group = self._groups.get((book, volume))
+        if group is None:
+            group = self._groups[(book, volume)] = _Group()
+
+        k = self.shingle_size
+        target: Optional[MergedSpan] = None
+        position = 0
+        if len(text) < k:
+            span_id = group.short.get(text)
+            if span_id is not None:
+                target = group.spans[span_id]
+                position = target.origin
+        else:
+            # 每个已有 span 取第一个共享的 shingle 作为对齐点
+            anchors: Dict[int, Tuple[int, int]] = {}
+            index = group.index
+            for i in range(len(text) - k + 1):
+                entry = index.get(text[i:i + k])
+                if entry is not None and entry[0] not in anchors:
+                    anchors[entry[0]] = (entry[1], i)
+            for span_id, (at, i) in anchors.items():
+                span = group.spans.get(span_id)
+                if span is None or span is target:
+                    continue
+                start = at - i
+                if target is None:
+                    if span.agrees(text, start):
+                        target, position = span, start
+                        target.extend(text, start)
+                elif target.agrees(span.text, span.origin + position - start):
+                    # 新片段衔接了两段：本片段在 span 中位于 start，在 target 中位于 position
+                    self._absorb(group, target, span, position - start)
+
+        if target is None:
+            target = self._new_span(group, book, volume, text)
+            position = 0
+            if len(text) < k:
+                group.short[text] = target.id
+        target.passages += 1
+        target.hits[(keyword, position + len(previous), position + len(previous) + len(matched))] = None
+        self._index(group, target, text, position)
+
+    def add_all(self, keyword: str, passages: Iterable[Any]):
+        for passage in passages:
+            self.add(keyword, passage)
+
+    def spans(self) -> List[MergedSpan]:
+        """当前的合并结果（按首次出现顺序）"""
+        return list(self._spans.values())
+
+    def stats(self) -> Dict[str, int]:
+        spans = self._spans.values()
+        return {
+            "passages": self.passages_in,
+            "spans": len(self._spans),
+            "chars_in": self.chars_in,
+            "chars_out": sum(len(span.text) for span in spans),
+        }
+
+
+def merge_passages(items: Iterable[Tuple[str, Any]],
+                   shingle_size: int = DEFAULT_SHINGLE_SIZE) -> List[MergedSpan]:
+    """合并 (关键词, 片段) 序列，返回合并后的 span 列表"""
+    merger = PassageMerger(shingle_size)
+    for keyword, passage in items:
+        merger.add(keyword, passage)
+    return merger.spans()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Book/Find 原文片段的紧凑表示
+
+Book/Find 返回 Result[].Books[].Volumes[].Pages[] 的嵌套结构。parse_passages 一次
+展开为 Passage 列表：每条片段是一个 __slots__ 对象（前文、命中、后文、书名、卷），
+书名、卷名与命中词经 sys.intern 驻留，同一部书的成百上千条片段共用一份字符串。
+跨多页的大批量检索因此比保留原始嵌套 dict 省内存，按出处过滤、排序、去重也更快
+（Passage 可哈希，相等即出处与正文完全相同）。
+
+使用示例：
+    from passages import parse_passages
+
+    passages = parse_passages(find_book_passages("崔浩"))
+    for p in sorted(set(passages), key=lambda p: (p.book or "", p.volume or "")):
+        print(p.book, p.volume, p.previous + p.matched + p.later)
+
+    # 仍需原始字段名时
+    p["MatchedText"], p.to_dict()
+"""
+
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pagination import PASSAGE_FIELDS, _as_list, _label
+
+# Passage 属性与 API 字段名的对应关系
+FIELD_NAMES = {
+    "Book": "book",
+    "Volume": "volume",
+    "PreviousText": "previous",
+    "MatchedText": "matched",
+    "LaterText": "later",
+}
+
+
+# 只含这些键的片段不需要保存 extra
+_TEXT_FIELDS = frozenset(PASSAGE_FIELDS)
+
+
+def _intern(value: Any) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else None
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _extra(page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if page.keys() <= _TEXT_FIELDS:
+        return None
+    return {k: v for k, v in page.items() if k not in FIELD_NAMES} or None
+
+
+class Passage:
+    """一条原文片段（带出处）"""
+
+    __slots__ = ("book", "volume", "previous", "matched", "later", "extra")
+
+    def __init__(self, book: Optional[str], volume: Optional[str], previous: str, matched: str,
+                 later: str, extra: Optional[Dict[str, Any]] = None):
+        self.book = book
+        self.volume = volume
+        self.previous = previous
+        self.matched = matched
+        self.later = later
+        # API 返回的其他字段（如页码、位置），没有时为 None 以节省内存
+        self.extra = extra
+
+    @classmethod
+    def from_page(cls, page: Dict[str, Any], book: Optional[str] = None,
+                  volume: Optional[str] = None) -> "Passage":
+        """由 Pages[] 中的一项构造；页内自带字符串 Book/Volume 时优先使用"""
+        return cls(
+            _intern(page.get("Book")) or _intern(book),
+            _intern(page.get("Volume")) or _intern(volume),
+            _text(page.get("PreviousText")),
+            sys.intern(_text(page.get("MatchedText"))),
+            _text(page.get("LaterText")),
+            _extra(page),
+        )
+
+    @property
+    def text(self) -> str:
+        """前文 + 命中 + 后文"""
+        return self.previous + self.matched + self.later
+
+    def key(self) -> Tuple[Optional[str], Optional[str], str, str, str]:
+        """去重键：出处与正文"""
+        return (self.book, self.volume, self.previous, self.matched, self.later)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Passage) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __getitem__(self, name: str) -> Any:
+        """按 API 字段名取值（passage["MatchedText"]），兼容按 dict 处理片段的代码"""
+        attr = FIELD_NAMES.get(name)
+        if attr is not None:
+            return getattr(self, attr)
+        if self.extra is not None and name in self.extra:
+            return self.extra[name]
+        raise KeyError(name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """还原为 API 字段名的 dict（用于 JSON 输出）"""
+        data: Dict[str, Any] = {
+            "PreviousText": self.previous,
+            "MatchedText": self.matched,
+            "LaterText": self.later,
+        }
+        if self.extra:
+            data.update(self.extra)
+        data["Book"] = self.book
+        data["Volume"] = self.volume
+        return data
+
+    def __repr__(self) -> str:
+        return f"Passage({self.book!r}, {self.volume!r}, {self.matched!r})"
+
+
+def iter_passages(data: Any) -> Iterator[Passage]:
+    """逐条产出一页 Book/Find 结果中的片段
+
+    结果结构为 Result[].Books[].Volumes[].Pages[]，每个片段带上所属的书名与卷；
+    已是扁平片段的条目直接转换。
+    """
+    intern = sys.intern
+    result = data.get("Result") if isinstance(data, dict) else data
+    for entry in _as_list(result):
+        if not isinstance(entry, dict):
+            continue
+        if any(field in entry for field in PASSAGE_FIELDS):
+            yield Passage.from_page(entry)
+            continue
+        for book in _as_list(entry.get("Books")) or [entry]:
+            if not isinstance(book, dict):
+                continue
+            book_name = _intern(_label(book, "Book", "Title", "Name"))
+            for volume in _as_list(book.get("Volumes")):
+                if not isinstance(volume, dict):
+                    continue
+                volume_name = _intern(_label(volume, "Volume", "Title", "Name"))
+                for page in _as_list(volume.get("Pages")):
+                    if not isinstance(page, dict):
+                        continue
+                    # 常见情形（只有三段正文、均为字符串）走快速路径，书名卷名每卷只驻留一次
+                    previous, matched, later = page.get("PreviousText"), page.get("MatchedText"), page.get("LaterText")
+                    if (page.keys() <= _TEXT_FIELDS and type(previous) is str
+                            and type(matched) is str and type(later) is str):
+                        yield Passage(book_name, volume_name, previous, intern(matched), later)
+                    else:
+                        yield Passage.from_page(page, book_name, volume_name)
+
+
+def parse_passages(data: Any) -> List[Passage]:
+    """把一页 Book/Find 结果展开为 Passage 列表（不复制原始 dict）"""
+    return list(iter_passages(data))
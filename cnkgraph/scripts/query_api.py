@@ -13,34 +13,75 @@
     python cnkgraph/scripts/query_api.py find --keyword 崔浩
     python cnkgraph/scripts/query_api.py find --keyword "暴扬国恶"
     
+    # 跨页收集前 30 条原文片段（自动翻页）
+    python cnkgraph/scripts/query_api.py find --keyword 崔浩 --limit 30
+    
     # 查询人物
     python cnkgraph/scripts/query_api.py people --name 苏轼
     
     # 查询事件
     python cnkgraph/scripts/query_api.py event --keyword 安史之乱
+    
+    # 查看/清空本地响应缓存；--no-cache 跳过缓存直接请求
+    python cnkgraph/scripts/query_api.py cache --stats
+    python cnkgraph/scripts/query_api.py --no-cache find --keyword 崔浩
+    
+    # 查看已探测的端点请求方式；--discover 从 Swagger 文档预先登记
+    python cnkgraph/scripts/query_api.py endpoints --discover
+    
+    # 查询结束后显示请求、重试、限速与缓存指标
+    python cnkgraph/scripts/query_api.py --metrics find --keyword 崔浩 --limit 50
+    
+    # 分阶段耗时（缓存查找、建连、首字节、下载、JSON 解析），或导出为 Prometheus/OpenTelemetry
+    python cnkgraph/scripts/query_api.py --profile find --keyword 崔浩 --limit 50
+    python cnkgraph/scripts/query_api.py --trace-export /tmp/find.json find --keyword 崔浩
+    
+    # 结构化输出：逐条写出 passage/poem/person/event 等记录（JSON Lines 或 msgpack）
+    python cnkgraph/scripts/query_api.py --format jsonl find --keyword 崔浩 --limit 30
 """
 
 import sys
+import os
+
+# 共享的 daemon_client、structured_output 位于项目的 scripts/ 目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+
+if __name__ == "__main__":
+    # 常驻查询守护进程（scripts/history_daemon.py）运行时直接转发，复用其连接池与缓存
+    try:
+        from daemon_client import forward
+    except ImportError:
+        pass
+    else:
+        forward("query_api")
+
 import argparse
 import requests
 import json
+import time
 from typing import Optional, Dict, Any, List
 from urllib.parse import quote
 
-# API基础URL
-BASE_URL = "https://open.cnkgraph.com/api"
-
-# 超时设置（秒）
-TIMEOUT = 30
+from cnkgraph_client import BASE_URL, JSON_HEADERS, configure_client, get_client
+from endpoint_methods import load_swagger
+from knowledge_store import configure_store, person_through_store, poetry_through_store
+from pagination import Paginator, extract_items
+from passages import parse_passages
+from structured_output import (FORMATS, TEXT, RecordWriter, book_record, error_record, event_record,
+                               open_writer, passage_record, person_record, poem_record)
+from tracing import add_trace_arguments, report_trace
+from zh_variants import fold
 
 def search_poetry(keyword: Optional[str] = None,
                   author: Optional[str] = None,
                   dynasty: Optional[str] = None,
                   title: Optional[str] = None,
-                  limit: int = 10) -> Dict[str, Any]:
-    """查询诗词。按 Swagger 使用 POST /api/Writing/Find，请求体为 WritingModel。"""
-    url = f"{BASE_URL}/Writing/Find"
-    body: Dict[str, Any] = {"PageNo": 0}
+                  limit: int = 10,
+                  page_no: int = 0) -> Dict[str, Any]:
+    """查询诗词。按 Swagger 使用 POST /api/Writing/Find，请求体为 WritingModel。
+    返回单页结果；跨页按条数收集请用 iter_poetry。
+    结果写入本地知识库；只按作者查询且该作者已同步时由本地库回答（见 knowledge_store.py）。"""
+    body: Dict[str, Any] = {"PageNo": page_no}
     if keyword:
         body["Key"] = keyword
     if author:
@@ -49,15 +90,13 @@ def search_poetry(keyword: Optional[str] = None,
         body["Dynasty"] = dynasty
     if title and not keyword:
         body["Key"] = title
+    return poetry_through_store(body, lambda: fetch_poetry_page(body))
+
+def fetch_poetry_page(body: Dict[str, Any]) -> Dict[str, Any]:
+    """直接请求 Writing/Find 的一页（不经本地知识库）"""
+    url = f"{BASE_URL}/Writing/Find"
     try:
-        response = requests.post(
-            url,
-            json=body,
-            timeout=TIMEOUT,
-            headers={"Content-Type": "application/json; charset=utf-8"},
-        )
-        response.raise_for_status()
-        return response.json()
+        return get_client().post_json(url, body)
     except requests.exceptions.Timeout:
         return {"error": "请求超时"}
     except requests.exceptions.RequestException as e:
@@ -70,15 +109,7 @@ def search_books(keyword: str, limit: int = 10, page_no: int = 0, book_id: Optio
     if book_id:
         params["bookId"] = book_id
     try:
-        response = requests.post(
-            url,
-            json=keyword,
-            params=params,
-            timeout=TIMEOUT,
-            headers={"Content-Type": "application/json; charset=utf-8"},
-        )
-        response.raise_for_status()
-        return response.json()
+        return get_client().post_json(url, keyword, params=params)
     except requests.exceptions.Timeout:
         return {"error": "请求超时"}
     except requests.exceptions.RequestException as e:
@@ -93,45 +124,59 @@ def find_book_passages(keyword: str, page_no: int = 0, book_ids: Optional[List[s
     if book_ids:
         body["BookIds"] = book_ids
     try:
-        response = requests.post(
-            url,
-            json=body,
-            timeout=TIMEOUT,
-            headers={"Content-Type": "application/json; charset=utf-8"},
-        )
-        response.raise_for_status()
-        return response.json()
+        return get_client().post_json(url, body)
     except requests.exceptions.Timeout:
         return {"error": "请求超时"}
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
+def iter_book_passages(keyword: str, limit: Optional[int] = None, book_ids: Optional[List[str]] = None,
+                       start_page: int = 0, prefetch: bool = True) -> Paginator:
+    """逐页检索古籍原文片段并逐条产出 passages.Passage（带 book、volume 出处），取满 limit 条或无更多结果时停止"""
+    return Paginator(lambda page_no: find_book_passages(keyword, page_no, book_ids),
+                     parse_passages, limit=limit, start_page=start_page, prefetch=prefetch)
+
+def iter_poetry(keyword: Optional[str] = None,
+                author: Optional[str] = None,
+                dynasty: Optional[str] = None,
+                title: Optional[str] = None,
+                limit: Optional[int] = None,
+                start_page: int = 0,
+                prefetch: bool = True) -> Paginator:
+    """逐页查询诗词并逐条产出，取满 limit 条或无更多结果时停止"""
+    return Paginator(lambda page_no: search_poetry(keyword, author, dynasty, title, page_no=page_no),
+                     extract_items, limit=limit, start_page=start_page, prefetch=prefetch)
+
 def search_people(name: str) -> Dict[str, Any]:
-    """查询人物。按 Swagger 使用 GET /api/People/{id}，id 为姓名/朝代键/人物 Id。"""
-    url = f"{BASE_URL}/People/{quote(name, safe='')}"
+    """查询人物。按 Swagger 使用 GET /api/People/{id}，id 为姓名/朝代键/人物 Id。
+
+    API 的人物键为简体，繁体或简繁混写的姓名先归一化（蘇軾 → 苏轼），一次请求即可命中。
+    本地知识库中已有未过期的资料时直接返回，不再请求 API（见 knowledge_store.py）。
+    """
+    return person_through_store(name, lambda: fetch_person(name))
+
+def fetch_person(name: str) -> Dict[str, Any]:
+    """直接请求 People/{id}（不经本地知识库）"""
+    url = f"{BASE_URL}/People/{quote(fold(name), safe='')}"
     try:
-        response = requests.get(url, timeout=TIMEOUT)
-        response.raise_for_status()
-        return response.json()
+        return get_client().get(url)
     except requests.exceptions.Timeout:
         return {"error": "请求超时"}
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
 def search_event(keyword: str) -> Dict[str, Any]:
-    """查询事件。Event 不在 Swagger 中，先 GET，遇 405 则 POST 请求体为关键词 JSON 字符串。"""
+    """查询事件。Event 不在 Swagger 中，候选为 GET ?keyword= 与 POST（请求体为关键词 JSON 字符串）。
+
+    首次按 GET、POST 的顺序探测，遇 405 换下一个；探测到的方式会被记住（见 endpoint_methods.py），
+    之后直接使用，不再多一次往返。
+    """
     url = f"{BASE_URL}/Event/Search"
     try:
-        response = requests.get(url, params={"keyword": keyword}, timeout=TIMEOUT)
-        if response.status_code == 405:
-            response = requests.post(
-                url,
-                json=keyword,
-                timeout=TIMEOUT,
-                headers={"Content-Type": "application/json; charset=utf-8"},
-            )
-        response.raise_for_status()
-        return response.json()
+        return get_client().request_negotiated(url, [
+            ("GET", {"params": {"keyword": keyword}}),
+            ("POST", {"json": keyword, "headers": dict(JSON_HEADERS)}),
+        ])
     except requests.exceptions.Timeout:
         return {"error": "请求超时"}
     except requests.exceptions.RequestException as e:
@@ -149,11 +194,14 @@ def format_poetry_result(data: Dict[str, Any]):
     print("="*60)
     
     if isinstance(data, list):
-        for i, item in enumerate(data[:5], 1):  # 只显示前5条
+        for i, item in enumerate(data, 1):  # 条数已由 --limit 限定
+            if not isinstance(item, dict):
+                print(f"\n【{i}】{item}")
+                continue
             print(f"\n【{i}】")
-            print(f"标题：{item.get('title', '未知')}")
-            print(f"作者：{item.get('author', '未知')} ({item.get('dynasty', '未知')})")
-            print(f"\n{item.get('content', '内容缺失')}")
+            print(f"标题：{item.get('title') or item.get('Title') or '未知'}")
+            print(f"作者：{item.get('author') or item.get('Author') or '未知'} ({item.get('dynasty') or item.get('Dynasty') or '未知'})")
+            print(f"\n{item.get('content') or item.get('Content') or '内容缺失'}")
             print("-"*60)
     else:
         print(json.dumps(data, ensure_ascii=False, indent=2))
@@ -191,8 +239,56 @@ def format_event_result(data: Dict[str, Any]):
     print("="*60)
     print(json.dumps(data, ensure_ascii=False, indent=2))
 
-def main():
+def write_records(args, writer: RecordWriter):
+    """按子命令查询并逐条写出结构化记录（--format jsonl/msgpack）；分页结果边取边写"""
+    def emit(record):
+        writer.write(record)
+        writer.flush()
+
+    if args.command == 'poetry':
+        pages = iter_poetry(keyword=args.keyword, author=args.author, dynasty=args.dynasty,
+                            title=args.title, limit=args.limit)
+        for item in pages:
+            emit(poem_record(item))
+        if pages.error:
+            emit(error_record('poetry', pages.error))
+
+    elif args.command == 'book':
+        result = search_books(args.keyword, args.limit)
+        if "error" in result:
+            emit(error_record('book', result['error']))
+        for item in extract_items(result):
+            emit(book_record(item, args.keyword))
+
+    elif args.command == 'find':
+        if args.limit is None:
+            result = find_book_passages(args.keyword, args.page)
+            if "error" in result:
+                emit(error_record('find', result['error']))
+            passages = parse_passages(result)
+        else:
+            passages = iter_book_passages(args.keyword, limit=args.limit, start_page=args.page)
+        for passage in passages:
+            emit(passage_record(passage, args.keyword))
+        if isinstance(passages, Paginator) and passages.error:
+            emit(error_record('find', passages.error))
+
+    elif args.command == 'people':
+        result = search_people(args.name)
+        emit(error_record('people', result['error']) if "error" in result
+             else person_record(result, args.name))
+
+    elif args.command == 'event':
+        result = search_event(args.keyword)
+        if isinstance(result, dict) and "error" in result:
+            emit(error_record('event', result['error']))
+        else:
+            for item in extract_items(result) or ([result] if result else []):
+                emit(event_record(item, args.keyword))
+
+def main(argv=None, prog=None):
     parser = argparse.ArgumentParser(
+        prog=prog,
         description="古籍文献知识图谱API查询工具",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
@@ -214,6 +310,12 @@ def main():
         """
     )
     
+    parser.add_argument('--no-cache', action='store_true', help='不读写本地响应缓存与本地知识库')
+    parser.add_argument('--metrics', action='store_true', help='查询结束后显示请求、重试、限速与缓存指标')
+    add_trace_arguments(parser)
+    parser.add_argument('--format', choices=FORMATS, default=TEXT,
+                        help='输出格式：text（默认，便于阅读）；jsonl、msgpack 逐条输出结构化记录')
+    
     subparsers = parser.add_subparsers(dest='command', help='查询类型')
     
     # 诗词查询
@@ -233,6 +335,7 @@ def main():
     find_parser = subparsers.add_parser('find', help='检索古籍原文片段（Book/Find，返回 PreviousText/MatchedText/LaterText）')
     find_parser.add_argument('--keyword', required=True, help='关键词或组合，如 崔浩、暴扬国恶、国史 刊石')
     find_parser.add_argument('--page', type=int, default=0, help='页码，默认 0')
+    find_parser.add_argument('--limit', type=int, help='跨页收集的片段条数上限（指定后从 --page 起自动翻页）')
     
     # 人物查询
     people_parser = subparsers.add_parser('people', help='查询人物')
@@ -242,32 +345,123 @@ def main():
     event_parser = subparsers.add_parser('event', help='查询事件')
     event_parser.add_argument('--keyword', required=True, help='关键词')
     
-    args = parser.parse_args()
+    # 本地响应缓存
+    cache_parser = subparsers.add_parser('cache', help='查看或清空本地响应缓存')
+    cache_parser.add_argument('--stats', action='store_true', help='显示缓存统计（默认）')
+    cache_parser.add_argument('--clear', action='store_true', help='清空缓存')
+    
+    # 端点请求方式记录
+    endpoints_parser = subparsers.add_parser('endpoints', help='查看、探测或清空已记录的端点请求方式')
+    endpoints_parser.add_argument('--discover', action='store_true', help='读取 Swagger 文档登记端点')
+    endpoints_parser.add_argument('--clear', action='store_true', help='清空记录（下次请求时重新探测）')
     
+    args = parser.parse_args(argv)
+    
+    start = time.monotonic()
+    try:
+        run_command(args, parser)
+    finally:
+        report_trace(args, time.monotonic() - start)
+
+def run_command(args, parser):
+    """按命令行参数执行一个子命令"""
     if not args.command:
         parser.print_help()
         sys.exit(1)
     
+    if args.command == 'cache':
+        cache = get_client().cache
+        if cache is None:
+            print("本地响应缓存已关闭（CNKGRAPH_CACHE=0）")
+            return
+        if args.clear:
+            cache.clear()
+            if args.format == TEXT:
+                print("✓ 已清空本地响应缓存")
+        if args.format != TEXT:
+            writer = open_writer(args.format)
+            writer.write({"type": "cache", **cache.stats()})
+            writer.flush()
+            return
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+        return
+    
+    if args.command == 'endpoints':
+        endpoints = get_client().endpoints
+        if args.clear:
+            endpoints.clear()
+            if args.format == TEXT:
+                print("✓ 已清空端点记录")
+        if args.discover:
+            try:
+                count = load_swagger(get_client(), BASE_URL)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"❌ 读取 Swagger 文档失败: {e}", file=sys.stderr)
+                sys.exit(1)
+            if args.format == TEXT:
+                print(f"✓ 从 Swagger 文档登记了 {count} 个端点")
+        if args.format != TEXT:
+            writer = open_writer(args.format)
+            writer.write({"type": "endpoints", **endpoints.stats(), "methods": endpoints.snapshot()})
+            writer.flush()
+            return
+        print(json.dumps(endpoints.snapshot(), ensure_ascii=False, indent=2))
+        return
+    
+    if args.no_cache:
+        configure_client(cache=None)
+        configure_store(None)
+    
+    if args.format != TEXT:
+        writer = open_writer(args.format)
+        try:
+            write_records(args, writer)
+        except BrokenPipeError:
+            sys.exit(0)
+        except Exception as e:
+            writer.write(error_record(args.command, e))
+            writer.flush()
+            sys.exit(1)
+        if args.metrics:
+            writer.write({"type": "metrics", **get_client().metrics()})
+            writer.flush()
+        return
+    
     print(f"\n正在查询古籍文献知识图谱API...")
     
     try:
         if args.command == 'poetry':
-            result = search_poetry(
+            pages = iter_poetry(
                 keyword=args.keyword,
                 author=args.author,
                 dynasty=args.dynasty,
                 title=args.title,
                 limit=args.limit
             )
-            format_poetry_result(result)
+            items = list(pages)
+            if items:
+                format_poetry_result(items)
+            elif pages.error:
+                format_poetry_result({"error": pages.error})
+            else:
+                # 无法识别分页结构时原样输出第一页
+                format_poetry_result(pages.last_page if pages.last_page is not None else [])
             
         elif args.command == 'book':
             result = search_books(args.keyword, args.limit)
             format_book_result(result)
             
         elif args.command == 'find':
-            result = find_book_passages(args.keyword, args.page)
-            format_book_result(result)
+            if args.limit is None:
+                result = find_book_passages(args.keyword, args.page)
+                format_book_result(result)
+            else:
+                pages = iter_book_passages(args.keyword, limit=args.limit, start_page=args.page)
+                passages = list(pages)
+                if pages.error and not passages:
+                    format_book_result({"error": pages.error})
+                else:
+                    format_book_result({"Passages": [p.to_dict() for p in passages], "Pages": pages.pages_fetched})
             
         elif args.command == 'people':
             result = search_people(args.name)
@@ -280,6 +474,12 @@ def main():
     except Exception as e:
         print(f"\n❌ 发生错误: {e}")
         sys.exit(1)
+    
+    if args.metrics:
+        print("\n" + "="*60)
+        print("请求指标")
+        print("="*60)
+        print(json.dumps(get_client().metrics(), ensure_ascii=False, indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+cnkgraph 请求限速与重试退避
+
+- TokenBucket：令牌桶限速器，进程内所有线程共享（async_query_api 的并发任务
+  在线程池中执行，同样受其约束）。收到 429 时速率减半并按 Retry-After 暂停
+  整个桶，之后每次成功请求逐步恢复到配置的速率（加性增、乘性减）。
+- RetryPolicy：对 429/5xx 与连接错误做带抖动的指数退避重试，优先遵循
+  服务端返回的 Retry-After。
+- RequestMetrics：请求数、重试次数、限速等待时间、各状态码计数等指标。
+
+默认速率可用环境变量 CNKGRAPH_RATE（每秒请求数，0 表示不限速）与
+CNKGRAPH_BURST 调整。
+"""
+
+import email.utils
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# 默认速率（每秒请求数）与突发容量
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+
+# 429 后速率下限（占配置速率的比例）与每次成功恢复的增量（每秒请求数）
+MIN_RATE_FRACTION = 0.1
+RATE_RECOVERY_STEP = 0.1
+
+# 可重试的 HTTP 状态码
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Retry-After 超过此值（秒）时不再等待，直接返回错误
+MAX_RETRY_AFTER = 60.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """解析 Retry-After（秒数或 HTTP 日期），返回需等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class TokenBucket:
+    """线程安全的令牌桶，支持 429 后自适应降速与整体暂停；rate <= 0 时不限速"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[float]:
+        """取得一个令牌，必要时阻塞等待；返回等待的秒数
+
+        timeout 为最长等待秒数，需要等待更久才能取得令牌时不等待，直接返回 None。
+        """
+        if self.max_rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            if timeout is not None and waited + delay > timeout:
+                return None
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """在 seconds 秒内暂停发放令牌（所有线程共同遵守）"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def penalize(self):
+        """收到 429：速率减半（不低于下限），并清空已积累的令牌"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def reward(self):
+        """请求成功：速率逐步恢复到配置值"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + RATE_RECOVERY_STEP)
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 20.0,
+                 statuses=RETRY_STATUSES):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.statuses = frozenset(statuses)
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试（从 0 开始）前的等待秒数
+
+        有 Retry-After 时以其为准并加少量抖动；否则为 full jitter：
+        在 [0, min(max_delay, base_delay * 2^attempt)] 内均匀取值。
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class RequestMetrics:
+    """请求指标（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttle_wait = 0.0
+        self.backoff_wait = 0.0
+        self.statuses: Counter = Counter()
+
+    def record(self, **changes: Any):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def record_status(self, status: int):
+        with self._lock:
+            self.statuses[status] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttle_wait": round(self.throttle_wait, 3),
+                "backoff_wait": round(self.backoff_wait, 3),
+                "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            }
+
+
+def _env_number(name: str, parse, default, minimum):
+    """读取数值环境变量；无法解析或小于 minimum 时提示并使用默认值"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        number = parse(value)
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number) or number < minimum:
+        print(f"⚠️  环境变量 {name}={value!r} 无效，使用默认值 {default}", file=sys.stderr)
+        return default
+    return number
+
+
+def default_bucket() -> TokenBucket:
+    """按环境变量创建默认令牌桶（CNKGRAPH_RATE=0 表示不限速）"""
+    rate = _env_number("CNKGRAPH_RATE", float, DEFAULT_RATE, 0)
+    burst = _env_number("CNKGRAPH_BURST", int, DEFAULT_BURST, 1)
+    return TokenBucket(rate, burst)
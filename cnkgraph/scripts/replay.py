@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+cnkgraph 请求的录制与回放
+
+录制模式下，共享客户端照常访问 API，并把每个请求/响应对追加写入 JSONL
+文件（cassette）；回放模式下不访问网络，直接按请求返回录制的响应，
+未录制的请求抛出 ReplayMiss（query_api 中表现为 {"error": ...}）。
+用于离线运行、回归测试和排除网络抖动的性能测量。
+
+同一请求录制了多次（如先 503、重试后 200）时按录制顺序依次回放，
+用完后重复最后一次，重试与退避的路径因此也能离线复现。
+
+启用方式（环境变量，对 query_api.py、history_query.py 等所有脚本生效）：
+    CNKGRAPH_RECORD=cassette.jsonl python cnkgraph/scripts/query_api.py find --keyword 崔浩
+    CNKGRAPH_REPLAY=cassette.jsonl python cnkgraph/scripts/query_api.py find --keyword 崔浩
+
+录制得到的文件也可以交给 standin_server.py 作为 fixtures 使用。
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class ReplayMiss(requests.exceptions.RequestException):
+    """回放模式下遇到未录制的请求"""
+
+
+def normalize_body(body: Any) -> str:
+    """规范化请求体：JSON 按键排序，其余按文本处理"""
+    if body is None:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(json.loads(body), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return body
+
+
+def request_path(url: str) -> str:
+    """URL 的路径与查询串（忽略协议与主机，录制文件可在线上与替身之间通用）"""
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def record_key(method: str, url: str, body: Any) -> Tuple[str, str, str]:
+    return method.upper(), request_path(url), normalize_body(body)
+
+
+class Cassette:
+    """一组录制的请求/响应对（JSONL 文件，每行一条）"""
+
+    def __init__(self, path: str, mode: str = REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"未知的模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        # 每个请求的全部录制（按录制顺序）与回放到的位置
+        self._records: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        self._cursor: Dict[Tuple[str, str, str], int] = {}
+        if os.path.exists(path):
+            self._load()
+        elif mode == REPLAY:
+            raise FileNotFoundError(f"找不到录制文件: {path}")
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                key = record_key(record["method"], record["url"], record.get("body"))
+                self._records.setdefault(key, []).append(record)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def records(self):
+        """返回所有录制记录（每个请求取最后一次）"""
+        with self._lock:
+            return [sequence[-1] for sequence in self._records.values()]
+
+    def find(self, method: str, url: str, body: Any) -> Optional[Dict[str, Any]]:
+        """返回该请求的下一条录制记录；录制用完后重复最后一条"""
+        key = record_key(method, url, body)
+        with self._lock:
+            sequence = self._records.get(key)
+            if not sequence:
+                return None
+            position = self._cursor.get(key, 0)
+            self._cursor[key] = position + 1
+            return sequence[min(position, len(sequence) - 1)]
+
+    def add(self, method: str, url: str, body: Any, response: requests.Response, elapsed: float):
+        record = {
+            "method": method.upper(),
+            "url": url,
+            "body": normalize_body(body),
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items()
+                        if k.lower() in ("content-type", "retry-after", "allow")},
+            "content": response.content.decode("utf-8", errors="replace"),
+            "elapsed": round(elapsed, 4),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._records.setdefault(record_key(method, url, body), []).append(record)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def build_response(record: Dict[str, Any], request: requests.PreparedRequest) -> requests.Response:
+    """由录制记录构造 Response"""
+    response = requests.Response()
+    response.status_code = record["status"]
+    response.headers = CaseInsensitiveDict(record.get("headers") or {})
+    response._content = record["content"].encode("utf-8")
+    response._content_consumed = True
+    # 重试前客户端会 close() 响应（见 CnkgraphClient.request），raw 须可关闭
+    response.raw = io.BytesIO(response._content)
+    response.encoding = "utf-8"
+    response.url = request.url
+    response.request = request
+    response.reason = "Replayed"
+    return response
+
+
+class CassetteAdapter(HTTPAdapter):
+    """按 cassette 模式录制或回放的传输适配器（录制时沿用连接池）"""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.cassette.mode == REPLAY:
+            record = self.cassette.find(request.method, request.url, request.body)
+            if record is None:
+                raise ReplayMiss(f"未录制的请求: {request.method} {request.url}", request=request)
+            return build_response(record, request)
+
+        start = time.monotonic()
+        response = super().send(request, **kwargs)
+        self.cassette.add(request.method, request.url, request.body, response, time.monotonic() - start)
+        return response
+
+
+def default_cassette() -> Optional[Cassette]:
+    """按环境变量 CNKGRAPH_REPLAY / CNKGRAPH_RECORD 创建 cassette，均未设置时返回 None"""
+    replay_path = os.environ.get("CNKGRAPH_REPLAY")
+    if replay_path:
+        return Cassette(replay_path, REPLAY)
+    record_path = os.environ.get("CNKGRAPH_RECORD")
+    if record_path:
+        return Cassette(record_path, RECORD)
+    return None
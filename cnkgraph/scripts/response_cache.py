@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+cnkgraph API 响应缓存（SQLite 持久层 + 内存前置层）
+
+同一批历史关键词（李白、安史之乱、崔浩……）会在不同会话中被反复查询。
+CnkgraphClient 在发请求前先查本缓存，命中时直接返回本地结果，
+减少对限流的非商业 API 的重复请求。
+
+- 缓存键：请求方法 + URL（含路径参数与查询串）+ 规范化后的 JSON 请求体 + Accept-Language；
+  其中的中文经简繁归一化（zh_variants.fold），「蘇軾」与「苏轼」共用同一条缓存。
+  Accept-Language 不归一化，简体与繁体（zh-hant）响应仍分别缓存
+- 过期：按端点分别设置 TTL（ENDPOINT_TTLS），未列出的端点不缓存
+- 淘汰：磁盘总大小超过上限时按最近访问时间（LRU）删除
+- 前置层：进程内有界 LRU，命中时不访问 SQLite
+
+缓存文件默认位于 ~/.cache/history-agent-skills/cnkgraph.sqlite3，
+可用环境变量 CNKGRAPH_CACHE_PATH 指定，CNKGRAPH_CACHE=0 关闭缓存。
+
+注意：命中时返回的是缓存中共享的对象，调用方不应原地修改。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlencode, urlsplit
+
+# 简繁对照表位于仓库根目录的 scripts/ 下
+_SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts")
+if _SHARED_DIR not in sys.path:
+    sys.path.insert(0, _SHARED_DIR)
+
+from zh_variants import fold
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache",
+                                  "history-agent-skills", "cnkgraph.sqlite3")
+
+DAY = 24 * 3600
+
+# 各端点的缓存有效期（秒）；人物资料几乎不变，事件端点不在 Swagger 中，保守缓存
+ENDPOINT_TTLS: Dict[str, float] = {
+    "People": 30 * DAY,
+    "Book/Find": 7 * DAY,
+    "Book/Search": 7 * DAY,
+    "Writing/Find": 7 * DAY,
+    "Event/Search": 1 * DAY,
+}
+
+# 磁盘缓存大小上限（字节）与内存前置层条目数
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 256
+
+# 每写入多少条检查一次磁盘大小上限
+EVICT_INTERVAL = 32
+
+# 磁盘层访问时间的刷新间隔（秒），避免每次命中都写库
+TOUCH_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key      TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    value    BLOB NOT NULL,
+    size     INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    expires  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def endpoint_of(url: str) -> str:
+    """从 URL 中取出端点名，如 .../api/Book/Find → Book/Find，.../api/People/苏轼 → People"""
+    parts = [p for p in urlsplit(url).path.split("/") if p]
+    if "api" in parts:
+        parts = parts[parts.index("api") + 1:]
+    if parts and parts[0] == "People":
+        return "People"
+    return "/".join(parts[:2])
+
+
+def make_key(method: str, url: str, params: Optional[Dict[str, Any]] = None,
+             body: Any = None, accept_language: Optional[str] = None) -> str:
+    """计算缓存键：JSON 请求体按键排序规范化，查询参数按名排序，中文按简繁归一化"""
+    normalized = [
+        method.upper(),
+        # 路径参数（如 People/蘇軾）以解码后的文字参与归一化
+        fold(unquote(url)),
+        urlencode(sorted((k, _fold_value(v)) for k, v in (params or {}).items()), doseq=True),
+        fold(json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))),
+        (accept_language or "").strip().lower(),
+    ]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
+def _fold_value(value: Any) -> Any:
+    """查询参数值的简繁归一化（doseq 时值可以是列表）"""
+    if isinstance(value, str):
+        return fold(value)
+    if isinstance(value, (list, tuple)):
+        return [fold(v) if isinstance(v, str) else v for v in value]
+    return value
+
+
+class ResponseCache:
+    """线程安全的两级响应缓存"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 ttls: Optional[Dict[str, float]] = None):
+        """path 为 None 时只使用内存层"""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(ENDPOINT_TTLS if ttls is None else ttls)
+        self._memory_entries = max(0, memory_entries)
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                self._db = self._connect(path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️  响应缓存不可用，仅使用内存缓存: {e}", file=sys.stderr)
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        # WAL 模式：多个会话进程可同时读写同一缓存文件
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_SCHEMA)
+        return db
+
+    def ttl_for(self, url: str) -> Optional[float]:
+        """端点的缓存有效期，不缓存时返回 None"""
+        return self.ttls.get(endpoint_of(url))
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """返回 (是否命中, 结果)"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return True, entry[1]
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires, accessed FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[1] > now:
+                        if now - row[2] > TOUCH_INTERVAL:
+                            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.hits += 1
+                        return True, value
+                except sqlite3.Error as e:
+                    print(f"⚠️  读取响应缓存出错: {e}", file=sys.stderr)
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, url: str, value: Any, ttl: Optional[float] = None):
+        """写入一条结果；ttl 缺省时按端点取值，端点不缓存时忽略"""
+        ttl = self.ttl_for(url) if ttl is None else ttl
+        if not ttl:
+            return
+        now = time.time()
+        expires = now + ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            if self._db is None:
+                return
+            data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, endpoint, value, size, created, expires, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, endpoint_of(url), data, len(data), now, expires, now),
+                )
+                self._puts += 1
+                if self._puts % EVICT_INTERVAL == 0:
+                    self._evict(now)
+            except sqlite3.Error as e:
+                print(f"⚠️  写入响应缓存出错: {e}", file=sys.stderr)
+
+    def _remember(self, key: str, expires: float, value: Any):
+        if not self._memory_entries:
+            return
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float):
+        """删除过期条目，再按最近访问时间淘汰到大小上限以内"""
+        db = self._db
+        db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def evict(self):
+        """立即执行一次过期清理与大小淘汰"""
+        with self._lock:
+            if self._db is not None:
+                self._evict(time.time())
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.execute("VACUUM")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计与磁盘占用"""
+        with self._lock:
+            info: Dict[str, Any] = {
+                "path": self.path if self._db is not None else None,
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+            if self._db is not None:
+                entries, size = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+                info.update(entries=entries, bytes=size, max_bytes=self.max_bytes)
+            return info
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """按环境变量创建默认缓存；CNKGRAPH_CACHE=0 时返回 None"""
+    if os.environ.get("CNKGRAPH_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    return ResponseCache(os.environ.get("CNKGRAPH_CACHE_PATH") or DEFAULT_CACHE_PATH)
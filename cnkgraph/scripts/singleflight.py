@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+相同请求的合并（single-flight）
+
+多个线程（或 async_query_api 的并发任务）几乎同时发出相同的请求时，
+只有第一个真正访问 API，其余调用方等待并共享同一个解析后的结果
+（或同一个异常）。请求完成后即从表中移除，不做缓存——缓存见 response_cache.py。
+
+使用示例：
+    flight = SingleFlight()
+    value = flight.do(key, lambda: fetch())
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class _Call:
+    """一次进行中的请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并进行中的调用（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """执行 fn 并返回结果；同一 key 已有调用在进行时等待其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def stats(self) -> Dict[str, int]:
+        """返回实际执行与被合并的调用次数"""
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls)}
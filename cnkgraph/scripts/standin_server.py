@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+cnkgraph API 本地替身服务器
+
+在本机实现 /api/Writing/Find、/api/Book/Search、/api/Book/Find、/api/People/{id}
+与 /api/Event/Search，以及只列出前四个端点的 /swagger/v1/swagger.json（同线上）。
+响应来自 fixtures（cnkgraph/fixtures/standin.json）、录制文件（replay.py 生成的
+cassette），都没有时按关键词生成确定性的示例数据。
+可注入固定延迟、随机抖动、5xx 错误率与 429 限流率，用于在无网络环境下
+确定性地测量客户端自身的性能。
+
+使用示例：
+    # 启动替身（每个请求 50ms 延迟，5% 返回 503）
+    python cnkgraph/scripts/standin_server.py --port 8765 --latency 0.05 --error-rate 0.05
+
+    # 让所有脚本改为访问替身
+    CNKGRAPH_BASE_URL=http://127.0.0.1:8765/api python cnkgraph/scripts/query_api.py find --keyword 崔浩
+
+    # 在 Python 中启动（端口 0 表示自动分配）
+    from standin_server import StandinConfig, serve_in_thread
+    server, base_url = serve_in_thread(StandinConfig(latency=0.01))
+    ...
+    server.shutdown()
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from replay import Cassette, REPLAY, normalize_body, request_path
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixtures", "standin.json")
+
+# 与线上 Swagger 一致：Event/Search 不在文档中
+SWAGGER = {
+    "openapi": "3.0.1",
+    "info": {"title": "cnkgraph standin", "version": "v1"},
+    "paths": {
+        "/api/Writing/Find": {"post": {}},
+        "/api/Book/Search": {"post": {}},
+        "/api/Book/Find": {"post": {}},
+        "/api/People/{id}": {"get": {}},
+    },
+}
+
+# 生成数据时每个关键词的页数与每页条数
+DEFAULT_PAGES = 3
+ITEMS_PER_PAGE = 10
+
+
+class StandinConfig:
+    """替身服务器的延迟与故障注入配置"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 pages: int = DEFAULT_PAGES, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.pages = pages
+        self.seed = seed
+
+
+def _digest(*parts: Any) -> int:
+    return int(hashlib.md5("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def synth_passages(keyword: str, page_no: int, pages: int) -> Dict[str, Any]:
+    """生成 Book/Find 的一页示例结果（Result[].Books[].Volumes[].Pages[]）"""
+    if page_no >= pages:
+        return {"Result": []}
+    books = []
+    for b in range(2):
+        n = _digest(keyword, page_no, b)
+        books.append({
+            "Title": f"示例古籍{n % 97}",
+            "Volumes": [{
+                "Title": f"卷{n % 120 + 1}",
+                "Pages": [{
+                    "PreviousText": f"（示例前文 {page_no}-{b}-{i}）",
+                    "MatchedText": keyword,
+                    "LaterText": f"（示例后文 {page_no}-{b}-{i}）",
+                } for i in range(ITEMS_PER_PAGE // 2)],
+            }],
+        })
+    return {"Result": [{"Books": books}]}
+
+
+def synth_writings(key: str, page_no: int, pages: int) -> Dict[str, Any]:
+    """生成 Writing/Find 的一页示例结果"""
+    if page_no >= pages:
+        return {"Result": []}
+    return {"Result": [{
+        "Title": f"示例诗题{_digest(key, page_no, i) % 1000}",
+        "Author": key,
+        "Dynasty": "唐",
+        "Content": f"（示例正文 {page_no}-{i}）",
+    } for i in range(ITEMS_PER_PAGE)]}
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: StandinConfig,
+                 fixtures: Optional[Dict[str, Any]] = None, cassette: Optional[Cassette] = None):
+        super().__init__(address, StandinHandler)
+        self.config = config
+        self.fixtures = fixtures or {}
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.requests = 0
+        # 录制记录按（方法, 路径+查询串, 规范化请求体）索引，忽略主机名
+        self.recorded: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for record in (cassette.records() if cassette is not None else []):
+            self.recorded[(record["method"], request_path(record["url"]), record.get("body") or "")] = record
+
+    def draw(self) -> Tuple[float, float]:
+        """取一次随机数：(故障判定值, 延迟抖动)"""
+        with self.rng_lock:
+            self.requests += 1
+            return self.rng.random(), self.rng.uniform(0, self.config.jitter)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分两次写出，开启 Nagle 时会与客户端的延迟确认叠加出约 40ms 的停顿
+    disable_nagle_algorithm = True
+    server: StandinServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None,
+              raw: Optional[str] = None):
+        body = (raw if raw is not None else json.dumps(payload, ensure_ascii=False)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject(self) -> bool:
+        """施加延迟与故障；已发送故障响应时返回 True"""
+        config = self.server.config
+        roll, jitter = self.server.draw()
+        if config.latency or jitter:
+            time.sleep(config.latency + jitter)
+        if roll < config.throttle_rate:
+            self._send(429, {"error": "Too Many Requests"},
+                       headers={"Retry-After": f"{config.retry_after:g}"})
+            return True
+        if roll < config.throttle_rate + config.error_rate:
+            self._send(503, {"error": "Service Unavailable"})
+            return True
+        return False
+
+    def _replay(self, body: str) -> bool:
+        record = self.server.recorded.get((self.command, self.path, body))
+        if record is None:
+            return False
+        self._send(record["status"], headers={k: v for k, v in record.get("headers", {}).items()
+                                              if k.lower() != "content-type"},
+                   raw=record["content"])
+        return True
+
+    def _fixture(self, endpoint: str, key: str) -> Any:
+        return self.server.fixtures.get(endpoint, {}).get(key)
+
+    def do_GET(self):
+        if self._inject() or self._replay(""):
+            return
+        path = urlsplit(self.path).path
+        if path.startswith("/api/People/"):
+            name = unquote(path[len("/api/People/"):])
+            person = self._fixture("People", name)
+            self._send(200, person if person is not None else {"Name": name, "Dynasty": "", "Description": "（示例人物）"})
+        elif path == "/swagger/v1/swagger.json":
+            self._send(200, SWAGGER)
+        elif path == "/api/Event/Search":
+            # 与线上一致：Event 只接受 POST
+            self._send(405, {"error": "Method Not Allowed"}, headers={"Allow": "POST"})
+        else:
+            self._send(404, {"error": "Not Found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8") if length else ""
+        if self._inject() or self._replay(normalize_body(raw)):
+            return
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON"})
+            return
+
+        path = urlsplit(self.path).path
+        pages = self.server.config.pages
+        if path == "/api/Book/Find" and isinstance(body, dict):
+            keyword, page_no = body.get("Key", ""), int(body.get("PageNo") or 0)
+            fixture = self._fixture("Book/Find", keyword)
+            if fixture is not None:
+                self._send(200, fixture[page_no] if page_no < len(fixture) else {"Result": []})
+            else:
+                self._send(200, synth_passages(keyword, page_no, pages))
+        elif path == "/api/Writing/Find" and isinstance(body, dict):
+            key = body.get("Key") or body.get("Author") or ""
+            page_no = int(body.get("PageNo") or 0)
+            fixture = self._fixture("Writing/Find", key)
+            if fixture is not None:
+                self._send(200, fixture[page_no] if page_no < len(fixture) else {"Result": []})
+            else:
+                self._send(200, synth_writings(key, page_no, pages))
+        elif path == "/api/Book/Search" and isinstance(body, str):
+            fixture = self._fixture("Book/Search", body)
+            self._send(200, fixture if fixture is not None else {
+                "Result": [{"Title": f"示例古籍{_digest(body, i) % 97}", "Count": _digest(body, i) % 50 + 1}
+                           for i in range(5)]})
+        elif path == "/api/Event/Search" and isinstance(body, str):
+            fixture = self._fixture("Event/Search", body)
+            self._send(200, fixture if fixture is not None else {"Result": [{"Name": body}]})
+        else:
+            self._send(404, {"error": "Not Found"})
+
+
+def load_fixtures(path: Optional[str] = DEFAULT_FIXTURES) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_server(config: StandinConfig, host: str = "127.0.0.1", port: int = 0,
+                fixtures_path: Optional[str] = DEFAULT_FIXTURES,
+                cassette_path: Optional[str] = None) -> StandinServer:
+    cassette = Cassette(cassette_path, REPLAY) if cassette_path else None
+    return StandinServer((host, port), config, load_fixtures(fixtures_path), cassette)
+
+
+def serve_in_thread(config: Optional[StandinConfig] = None, **kwargs) -> Tuple[StandinServer, str]:
+    """在后台线程启动替身，返回 (服务器, API 基础 URL)；用完调用 server.shutdown()"""
+    server = make_server(config or StandinConfig(), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/api"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="cnkgraph API 本地替身服务器（fixtures / 录制回放 / 延迟与故障注入）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例：
+  %(prog)s --port 8765 --latency 0.05 --jitter 0.02
+  %(prog)s --port 8765 --error-rate 0.05 --throttle-rate 0.02 --seed 42
+  %(prog)s --port 8765 --cassette cassette.jsonl
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口，0 为自动分配')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='附加的随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='返回 429 的概率')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429 响应的 Retry-After（秒）')
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES, help='生成数据时每个关键词的页数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（故障与抖动可复现）')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='fixtures JSON 文件')
+    parser.add_argument('--cassette', help='replay.py 录制的 JSONL 文件，优先于 fixtures')
+    args = parser.parse_args()
+
+    config = StandinConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                           pages=args.pages, seed=args.seed)
+    server = make_server(config, args.host, args.port, args.fixtures, args.cassette)
+    host, port = server.server_address[:2]
+    print(f"cnkgraph 替身已启动：http://{host}:{port}/api")
+    print(f"使用方式：CNKGRAPH_BASE_URL=http://{host}:{port}/api python cnkgraph/scripts/query_api.py ...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n已停止")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+辞典释文全文倒排索引
+
+离线遍历一次 MDX 的全部释文，按单字与双字（bigram）建立倒排表，写入 MDX 旁路的
+`<文件名>.fts` 文件。倒排项为 (文档号差值, 词频) 的 varint 编码，按需解码。
+查询时只读取查询词涉及的倒排表，按 BM25 排序后仅对排名靠前的候选回读释文
+做短语校验，不需要扫描全部词条。
+
+查询语法：
+    节度使 河北          AND：同时包含「节度使」与「河北」（各自连续出现，位置不限）
+    节度使 OR 观察使     OR：包含任一（也可写作 |）
+    "河北 节度使"        短语：引号内各词按顺序紧接出现，忽略空白（释文不以空格
+                         分词，等同于 河北节度使）；引号内的 OR、AND 按普通文字处理
+
+使用示例：
+    # 构建索引（一次性，耗时取决于辞典大小）
+    python dict/scripts/query_dict.py fulltext --build
+
+    # 查询
+    python dict/scripts/query_dict.py fulltext 节度使 河北
+"""
+
+import html
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+from array import array
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+FULLTEXT_SUFFIX = ".fts"
+FULLTEXT_MAGIC = b"HMDXFTS1"
+
+_HEADER = struct.Struct("<8sQqQQQQd")
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 排名靠前、回读释文做校验的候选数量上限（相对 limit 的倍数）
+VERIFY_FACTOR = 20
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+_RUN_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+class FullTextHit(NamedTuple):
+    """一条全文检索结果"""
+    word: str
+    score: float
+    snippet: str
+
+
+def fulltext_path_for(mdx_path: str) -> str:
+    """返回 MDX 对应的全文索引路径"""
+    return mdx_path + FULLTEXT_SUFFIX
+
+
+def plain_text(record: str) -> str:
+    """去掉释文中的 HTML 标签与实体，合并空白"""
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", record))).strip()
+
+
+def text_grams(text: str) -> List[str]:
+    """文本的单字与双字 n-gram（不跨越标点与空白）"""
+    grams = []
+    for run in _RUN_RE.findall(text.lower()):
+        grams.extend(run)
+        grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class FullTextIndex:
+    """只读的全文倒排索引（mmap）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.mdx_size, self.mdx_mtime_ns, n_docs, n_terms,
+         term_blob_size, postings_size, self.avg_length) = _HEADER.unpack_from(self._mm, 0)
+        if magic != FULLTEXT_MAGIC:
+            self._mm.close()
+            raise ValueError(f"不是有效的全文索引文件: {path}")
+
+        self._view = memoryview(self._mm)
+        offset = _HEADER.size
+        self.doc_entries = self._view[offset:offset + n_docs * 4].cast("I")
+        offset += _padded(n_docs * 4)
+        self.doc_lengths = self._view[offset:offset + n_docs * 4].cast("I")
+        offset += _padded(n_docs * 4)
+        self._term_offsets = self._view[offset:offset + (n_terms + 1) * 8].cast("Q")
+        offset += (n_terms + 1) * 8
+        self._posting_offsets = self._view[offset:offset + (n_terms + 1) * 8].cast("Q")
+        offset += (n_terms + 1) * 8
+        self._dfs = self._view[offset:offset + n_terms * 4].cast("I")
+        offset += _padded(n_terms * 4)
+        self._postings_start = offset
+        self._term_blob_start = offset + postings_size
+        self.num_docs = n_docs
+        self._num_terms = n_terms
+
+    def is_current(self, mdx_path: str) -> bool:
+        """索引是否与当前 MDX 文件一致"""
+        stat = os.stat(mdx_path)
+        return self.mdx_size == stat.st_size and self.mdx_mtime_ns == stat.st_mtime_ns
+
+    def _term_slot(self, term: str) -> Optional[int]:
+        target = term.encode("utf-8")
+        mm, offsets, base = self._mm, self._term_offsets, self._term_blob_start
+        lo, hi = 0, self._num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mm[base + offsets[mid]:base + offsets[mid + 1]] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._num_terms and mm[base + offsets[lo]:base + offsets[lo + 1]] == target:
+            return lo
+        return None
+
+    def document_frequency(self, term: str) -> int:
+        slot = self._term_slot(term)
+        return 0 if slot is None else self._dfs[slot]
+
+    def postings(self, term: str) -> Dict[int, int]:
+        """解码一个 n-gram 的倒排表：文档号 -> 词频"""
+        slot = self._term_slot(term)
+        if slot is None:
+            return {}
+        start = self._postings_start + self._posting_offsets[slot]
+        data = self._mm[start:self._postings_start + self._posting_offsets[slot + 1]]
+        result = {}
+        doc = 0
+        value = shift = 0
+        is_doc = True
+        for byte in data:
+            value |= (byte & 0x7f) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            if is_doc:
+                doc += value
+            else:
+                result[doc] = value
+            is_doc = not is_doc
+            value = shift = 0
+        return result
+
+    def close(self):
+        for view in (self.doc_entries, self.doc_lengths, self._term_offsets,
+                     self._posting_offsets, self._dfs):
+            view.release()
+        self._view.release()
+        self._mm.close()
+
+
+def build_fulltext(reader, path: Optional[str] = None) -> str:
+    """遍历全部释文构建全文索引，原子地写入并返回索引路径"""
+    index = reader.index
+    path = path or fulltext_path_for(reader.path)
+    stat = os.stat(reader.path)
+
+    # 按记录区顺序遍历，使记录块依次解压；文档号即遍历顺序，倒排表天然递增
+    order = sorted(range(len(index)), key=lambda i: index.location(i)[0])
+    doc_entries = array("I", order)
+    doc_lengths = array("I")
+    postings: Dict[str, bytearray] = {}
+    last_doc: Dict[str, int] = {}
+    dfs: Dict[str, int] = {}
+
+    for doc, entry in enumerate(order):
+        grams = Counter(text_grams(plain_text(reader.read_entry(entry))))
+        doc_lengths.append(sum(grams.values()))
+        for gram, tf in grams.items():
+            out = postings.get(gram)
+            if out is None:
+                out = postings[gram] = bytearray()
+                last_doc[gram] = 0
+                dfs[gram] = 0
+            _encode_varint(doc - last_doc[gram], out)
+            _encode_varint(tf, out)
+            last_doc[gram] = doc
+            dfs[gram] += 1
+
+    terms = sorted(postings, key=lambda t: t.encode("utf-8"))
+    term_offsets = array("Q", [0])
+    posting_offsets = array("Q", [0])
+    term_df = array("I")
+    term_blob = bytearray()
+    posting_blob = bytearray()
+    for term in terms:
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        posting_blob += postings[term]
+        posting_offsets.append(len(posting_blob))
+        term_df.append(dfs[term])
+
+    avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    def padded_bytes(values: array) -> bytes:
+        data = values.tobytes()
+        return data.ljust(_padded(len(data)), b"\x00")
+
+    parts = [
+        _HEADER.pack(FULLTEXT_MAGIC, stat.st_size, stat.st_mtime_ns, len(order), len(terms),
+                     len(term_blob), len(posting_blob), avg_length),
+        padded_bytes(doc_entries),
+        padded_bytes(doc_lengths),
+        term_offsets.tobytes(),
+        posting_offsets.tobytes(),
+        padded_bytes(term_df),
+        bytes(posting_blob),
+        bytes(term_blob),
+    ]
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".mdxfts-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for part in parts:
+                f.write(part)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """把查询解析为 OR 连接的若干子句，每个子句是需同时出现的词/短语列表
+
+    短语去掉其中的空白后作为一个整体匹配（"河北 节度使" → 河北节度使）。
+    """
+    clauses: List[List[str]] = [[]]
+    for match in _QUERY_RE.finditer(query):
+        phrase, word = match.group(1), match.group(2)
+        if word is not None and word.upper() in ("OR", "|"):
+            clauses.append([])
+            continue
+        if word is not None and word.upper() in ("AND", "&"):
+            continue
+        term = _SPACE_RE.sub("", phrase) if phrase is not None else word
+        if term:
+            clauses[-1].append(term)
+    return [clause for clause in clauses if clause]
+
+
+def _term_grams(term: str) -> List[str]:
+    """词/短语对应的查询 n-gram：多字取双字，单字取单字"""
+    grams = []
+    for run in _RUN_RE.findall(term.lower()):
+        if len(run) == 1:
+            grams.append(run)
+        else:
+            grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def _snippet(text: str, terms: List[str], width: int = 40) -> str:
+    lowered = text.lower()
+    positions = [lowered.find(t.lower()) for t in terms]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width // 2) if positions else 0
+    snippet = text[start:start + width * 2]
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width * 2 < len(text) else "")
+
+
+def search_fulltext(reader, fulltext: FullTextIndex, query: str,
+                    limit: int = 10) -> Tuple[List[FullTextHit], int]:
+    """布尔/短语全文检索，返回 (按 BM25 排序并经过校验的结果, 估计匹配数)
+
+    估计匹配数为 n-gram 求交得到的候选文档数，只有排名靠前的候选经过回读校验，
+    实际匹配数可能更少。
+    """
+    clauses = parse_query(query)
+    n_docs = fulltext.num_docs
+    scores: Dict[int, float] = {}
+
+    for clause in clauses:
+        grams = [g for term in clause for g in _term_grams(term)]
+        if not grams:
+            continue
+        gram_postings = {g: fulltext.postings(g) for g in set(grams)}
+        if any(not p for p in gram_postings.values()):
+            continue
+        # AND：从最短的倒排表开始求交
+        ordered = sorted(gram_postings.values(), key=len)
+        candidates = set(ordered[0])
+        for posting in ordered[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+
+        for gram, posting in gram_postings.items():
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc in candidates:
+                tf = posting[doc]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * fulltext.doc_lengths[doc] / (fulltext.avg_length or 1))
+                score = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                scores[doc] = scores.get(doc, 0.0) + score
+
+    ranked = sorted(scores, key=lambda d: -scores[d])
+    hits: List[FullTextHit] = []
+    index = reader.index
+    # n-gram 求交可能有误报（词语不连续），按排名回读释文校验
+    for doc in ranked[:max(limit * VERIFY_FACTOR, limit)]:
+        entry = fulltext.doc_entries[doc]
+        text = plain_text(reader.read_entry(entry))
+        # 查询词与短语都不含空白，在去掉空白的释文上校验
+        compact = _SPACE_RE.sub("", text.lower())
+        matched = next((c for c in clauses if all(t.lower() in compact for t in c)), None)
+        if matched is None:
+            continue
+        hits.append(FullTextHit(index.key(entry), round(scores[doc], 4), _snippet(text, matched)))
+        if len(hits) >= limit:
+            break
+    return hits, len(ranked)
+
+
+def load_fulltext(mdx_path: str, path: Optional[str] = None) -> FullTextIndex:
+    """加载全文索引；不存在或已过期时抛出 FileNotFoundError"""
+    path = path or fulltext_path_for(mdx_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"全文索引不存在，请先构建: {path}")
+    fulltext = FullTextIndex(path)
+    if not fulltext.is_current(mdx_path):
+        fulltext.close()
+        raise FileNotFoundError(f"全文索引已过期（辞典文件已更新），请重新构建: {path}")
+    return fulltext
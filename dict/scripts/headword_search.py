@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+辞典词头检索：前缀、子串、模糊（编辑距离）
+
+基于 mdx_index.py 中的排序词头数组与字符 n-gram 倒排表，一次调用返回
+若干候选词头，代替「精确查不到 → 手工简化关键词 → 再查」的多轮重试。
+
+检索方式：
+    prefix     以查询词开头的词头（排序数组上二分出前缀区间）
+    substring  包含查询词的词头（n-gram 倒排表求交后校验）
+    contained  被查询词包含的词头，如 唐太宗李世民 → 李世民、唐太宗
+    fuzzy      编辑距离不超过阈值的词头（n-gram 计数筛选后计算距离）
+    auto       精确命中在前，其余各类候选轮流合并
+"""
+
+from collections import Counter
+from itertools import zip_longest
+from typing import Dict, List, NamedTuple, Optional
+
+from mdx_index import HeadwordIndex, NGRAM_SIZE
+
+SEARCH_MODES = ("auto", "prefix", "substring", "contained", "fuzzy")
+
+# 模糊检索时参与编辑距离计算的候选上限
+MAX_FUZZY_CANDIDATES = 2000
+
+# 前缀/子串检索时最多检查的词头数（常见单字的命中区间可能很长）
+MAX_SCAN = 5000
+
+
+class HeadwordMatch(NamedTuple):
+    """一条候选词头"""
+    word: str
+    kind: str
+    distance: int
+
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Levenshtein 编辑距离；超过 max_distance 时提前返回 max_distance + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _intersect(postings: List) -> List[int]:
+    """求若干升序下标数组的交集（从最短的开始）"""
+    postings = sorted(postings, key=len)
+    result = set(postings[0])
+    for posting in postings[1:]:
+        result.intersection_update(posting)
+        if not result:
+            break
+    return sorted(result)
+
+
+def _query_grams(query: str) -> List[str]:
+    if len(query) < NGRAM_SIZE:
+        return [query]
+    return [query[i:i + NGRAM_SIZE] for i in range(len(query) - NGRAM_SIZE + 1)]
+
+
+def search_prefix(index: HeadwordIndex, query: str, limit: int = 10) -> List[HeadwordMatch]:
+    """以 query 开头的词头，短词在前"""
+    lo, hi = index.prefix_range(query)
+    words = []
+    previous = None
+    for i in range(lo, min(hi, lo + MAX_SCAN)):
+        word = index.key(i)
+        if word != previous and word != query:
+            words.append(word)
+        previous = word
+    words.sort(key=len)
+    return [HeadwordMatch(w, "prefix", len(w) - len(query)) for w in words[:limit]]
+
+
+def search_substring(index: HeadwordIndex, query: str, limit: int = 10) -> List[HeadwordMatch]:
+    """包含 query 的词头，短词在前"""
+    if not query:
+        return []
+    postings = [index.gram_postings(g) for g in set(_query_grams(query))]
+    if any(len(p) == 0 for p in postings):
+        return []
+    words = set()
+    for i in _intersect(postings)[:MAX_SCAN]:
+        word = index.key(i)
+        if query in word and word != query:
+            words.add(word)
+    ranked = sorted(words, key=lambda w: (len(w), w.find(query)))
+    return [HeadwordMatch(w, "substring", len(w) - len(query)) for w in ranked[:limit]]
+
+
+def search_contained(index: HeadwordIndex, query: str, limit: int = 10,
+                     min_length: int = 2) -> List[HeadwordMatch]:
+    """被 query 包含的词头，长词在前（如 唐太宗李世民 → 李世民）"""
+    found: Dict[str, int] = {}
+    for start in range(len(query)):
+        for end in range(len(query), start + min_length - 1, -1):
+            word = query[start:end]
+            if word != query and word not in found and word in index:
+                found[word] = len(query) - len(word)
+    ranked = sorted(found, key=lambda w: (-len(w), query.find(w)))
+    return [HeadwordMatch(w, "contained", found[w]) for w in ranked[:limit]]
+
+
+def search_fuzzy(index: HeadwordIndex, query: str, limit: int = 10,
+                 max_distance: int = 2) -> List[HeadwordMatch]:
+    """编辑距离不超过 max_distance 的词头"""
+    if len(query) < 2:
+        return []
+    # 短词的编辑距离阈值随长度收紧，否则几乎所有词头都会成为候选
+    max_distance = min(max_distance, max(1, len(query) // 3))
+    # q-gram 引理：每次编辑最多破坏 NGRAM_SIZE 个 n-gram；双字不够时退回单字计数
+    grams = set(_query_grams(query))
+    required = len(_query_grams(query)) - NGRAM_SIZE * max_distance
+    if required < 1:
+        grams = set(query)
+        required = max(1, len(grams) - max_distance)
+
+    counts: Counter = Counter()
+    for gram in grams:
+        counts.update(index.gram_postings(gram))
+    candidates = [i for i, count in counts.items() if count >= required]
+    candidates.sort(key=lambda i: -counts[i])
+
+    matches = {}
+    for i in candidates[:MAX_FUZZY_CANDIDATES]:
+        word = index.key(i)
+        if word == query or word in matches:
+            continue
+        distance = edit_distance(query, word, max_distance)
+        if distance <= max_distance:
+            matches[word] = distance
+    ranked = sorted(matches, key=lambda w: (matches[w], abs(len(w) - len(query)), w))
+    return [HeadwordMatch(w, "fuzzy", matches[w]) for w in ranked[:limit]]
+
+
+def search_headwords(index: HeadwordIndex, query: str, mode: str = "auto",
+                     limit: int = 10, max_distance: int = 2) -> List[HeadwordMatch]:
+    """按指定方式检索候选词头，返回至多 limit 条"""
+    query = query.strip()
+    if mode == "prefix":
+        return search_prefix(index, query, limit)
+    if mode == "substring":
+        return search_substring(index, query, limit)
+    if mode == "contained":
+        return search_contained(index, query, limit)
+    if mode == "fuzzy":
+        return search_fuzzy(index, query, limit, max_distance)
+    if mode != "auto":
+        raise ValueError(f"未知的检索方式: {mode}（可选：{', '.join(SEARCH_MODES)}）")
+
+    groups = [
+        search_prefix(index, query, limit),
+        search_contained(index, query, limit),
+        search_substring(index, query, limit),
+        search_fuzzy(index, query, limit, max_distance),
+    ]
+    results: List[HeadwordMatch] = []
+    seen = set()
+    if query in index:
+        results.append(HeadwordMatch(query, "exact", 0))
+        seen.add(query)
+    # 各类候选轮流取一条，避免某一类（如常见字前缀）占满结果
+    for round_matches in zip_longest(*groups):
+        for match in round_matches:
+            if match is not None and match.word not in seen:
+                seen.add(match.word)
+                results.append(match)
+    return results[:limit]
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+MDX 词头索引旁路文件（sidecar）
+
+首次使用时解析一次 MDX 的词头区与记录块目录，把「词头 -> 记录区偏移」
+按词头排序后写成紧凑的二进制文件（默认为 MDX 同目录下的 `<文件名>.idx`）。
+之后每个进程启动时只需 mmap 这个文件，不再重新解析词头区。
+MDX 文件的大小或修改时间变化时自动重建。
+
+索引同时包含词头的字符 n-gram（单字与双字）倒排表，供前缀、子串与模糊检索
+使用（见 headword_search.py）；以及简繁归一化后与原词头不同的词头（如「蘇軾」→「苏轼」）
+到词头下标的映射，简体、繁体或简繁混写的查询都能一次定位到同一词条（见 zh_variants.py）。
+
+文件布局（偏移均为 8 字节无符号数，倒排项为 4 字节，字节序记录在元数据中）：
+    头部      magic, MDX 大小, MDX mtime_ns, 词头数, 记录块数, 词头区字节数, 元数据字节数,
+              n-gram 数, n-gram 区字节数, 倒排项数, 归一化词头数, 归一化词头区字节数
+    元数据    JSON（MDX 版本、编码、加密键等），补齐到 8 字节
+    记录块    文件偏移[块数]、压缩大小[块数]、解压后起始偏移[块数 + 1]
+    词头      词头起始偏移[词头数 + 1]、记录起始偏移[词头数]、记录结束偏移[词头数]
+    n-gram    n-gram 起始偏移[n-gram 数 + 1]、倒排表起始下标[n-gram 数 + 1]
+    归一化    归一化词头起始偏移[归一化词头数 + 1]、对应的词头排序下标[归一化词头数]
+    倒排表    各 n-gram 所在词头的排序下标（同名词头只记第一个），补齐到 8 字节
+    词头区    按 UTF-8 字节序排序后拼接的词头
+    n-gram 区 按 UTF-8 字节序排序后拼接的 n-gram
+    归一化区  按 UTF-8 字节序排序后拼接的归一化词头
+
+使用示例：
+    # 预先构建索引（可选，首次查询时也会自动构建）
+    python dict/scripts/mdx_index.py dict/历史辞典4合1.mdx
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 简繁对照表位于仓库根目录的 scripts/ 下
+_SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts")
+if _SHARED_DIR not in sys.path:
+    sys.path.insert(0, _SHARED_DIR)
+
+from zh_variants import fold, table_version
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"HMDXIDX3"
+INDEX_FORMAT = 3
+
+# 倒排表中 n-gram 的最大长度
+NGRAM_SIZE = 2
+
+_HEADER = struct.Struct("<8sQqQQQQQQQQQ")
+
+
+def index_path_for(mdx_path: str) -> str:
+    """返回 MDX 对应的旁路索引路径"""
+    return mdx_path + INDEX_SUFFIX
+
+
+class HeadwordIndex:
+    """按词头排序、以数组存储偏移的只读索引"""
+
+    def __init__(self, buf, mapped: Optional[mmap.mmap] = None):
+        self._buf = buf
+        self._mapped = mapped
+        (magic, self.mdx_size, self.mdx_mtime_ns, n_keys, n_blocks,
+         blob_size, meta_size, n_grams, gram_blob_size, n_postings,
+         n_variants, variant_blob_size) = _HEADER.unpack_from(buf, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("不是有效的词头索引文件")
+
+        offset = _HEADER.size
+        self.meta: Dict[str, Any] = json.loads(bytes(buf[offset:offset + meta_size]).decode("utf-8"))
+        offset += _padded(meta_size)
+
+        self._view = memoryview(buf)
+        arrays = []
+        for count in (n_blocks, n_blocks, n_blocks + 1, n_keys + 1, n_keys, n_keys,
+                      n_grams + 1, n_grams + 1, n_variants + 1, n_variants):
+            arrays.append(self._view[offset:offset + count * 8].cast("Q"))
+            offset += count * 8
+        (self.block_offsets, self.block_sizes, self.block_starts,
+         self._key_offsets, self._record_starts, self._record_ends,
+         self._gram_offsets, self._posting_offsets,
+         self._variant_offsets, self._variant_targets) = arrays
+        self._postings = self._view[offset:offset + n_postings * 4].cast("I")
+        offset += _padded(n_postings * 4)
+        self._blob_start = offset
+        self._gram_blob_start = offset + blob_size
+        self._variant_blob_start = self._gram_blob_start + gram_blob_size
+        self._size = n_keys
+        self._num_grams = n_grams
+        self._num_variants = n_variants
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, word: str) -> bool:
+        lo, hi = self.find(word)
+        return lo < hi
+
+    def key_bytes(self, i: int) -> bytes:
+        base = self._blob_start
+        return self._buf[base + self._key_offsets[i]:base + self._key_offsets[i + 1]]
+
+    def key(self, i: int) -> str:
+        return self.key_bytes(i).decode("utf-8", errors="ignore")
+
+    def keys(self) -> Iterator[str]:
+        """按排序顺序遍历词头（同名词头只出现一次）"""
+        previous = None
+        for i in range(self._size):
+            raw = self.key_bytes(i)
+            if raw != previous:
+                previous = raw
+                yield raw.decode("utf-8", errors="ignore")
+
+    def location(self, i: int) -> Tuple[int, int]:
+        """返回第 i 个词头在解压后记录区中的 [起始, 结束) 偏移"""
+        return self._record_starts[i], self._record_ends[i]
+
+    def find(self, word: str) -> Tuple[int, int]:
+        """二分查找词头，返回排序数组中的 [lo, hi) 区间"""
+        target = word.encode("utf-8")
+        lo = self._bisect(target, right=False)
+        hi = self._bisect(target, right=True, lo=lo)
+        return lo, hi
+
+    def resolve(self, word: str) -> Tuple[int, int]:
+        """查找词头，精确未命中时按简繁归一化后的形式再找，返回 [lo, hi) 区间"""
+        lo, hi = self.find(word)
+        if lo < hi:
+            return lo, hi
+        folded = fold(word)
+        if folded != word:
+            lo, hi = self.find(folded)
+            if lo < hi:
+                return lo, hi
+        i = self._variant_target(folded.encode("utf-8"))
+        if i is None:
+            return lo, lo
+        return self.find(self.key(i))
+
+    def _variant_target(self, target: bytes) -> Optional[int]:
+        """归一化形式为 target 的（繁体或混写）词头下标；有多个时取排序最前者"""
+        buf, offsets, base = self._buf, self._variant_offsets, self._variant_blob_start
+        lo, hi = 0, self._num_variants
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if buf[base + offsets[mid]:base + offsets[mid + 1]] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._num_variants or buf[base + offsets[lo]:base + offsets[lo + 1]] != target:
+            return None
+        return self._variant_targets[lo]
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """返回以 prefix 开头的词头在排序数组中的 [lo, hi) 区间"""
+        target = prefix.encode("utf-8")
+        lo = self._bisect(target, right=False)
+        # 0xff 不会出现在 UTF-8 中，可作为前缀区间的上界
+        hi = self._bisect(target + b"\xff", right=False, lo=lo)
+        return lo, hi
+
+    def gram_postings(self, gram: str):
+        """返回包含该 n-gram 的词头下标数组（升序）；没有时返回空序列"""
+        target = gram.encode("utf-8")
+        buf, offsets, base = self._buf, self._gram_offsets, self._gram_blob_start
+        lo, hi = 0, self._num_grams
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if buf[base + offsets[mid]:base + offsets[mid + 1]] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._num_grams or buf[base + offsets[lo]:base + offsets[lo + 1]] != target:
+            return ()
+        return self._postings[self._posting_offsets[lo]:self._posting_offsets[lo + 1]]
+
+    def _bisect(self, target: bytes, right: bool, lo: int = 0) -> int:
+        buf, offsets, base = self._buf, self._key_offsets, self._blob_start
+        hi = self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = buf[base + offsets[mid]:base + offsets[mid + 1]]
+            if key < target or (right and key == target):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def close(self):
+        """释放数组视图与映射"""
+        for view in (self.block_offsets, self.block_sizes, self.block_starts,
+                     self._key_offsets, self._record_starts, self._record_ends,
+                     self._gram_offsets, self._posting_offsets,
+                     self._variant_offsets, self._variant_targets, self._postings):
+            view.release()
+        self._view.release()
+        if self._mapped is not None:
+            self._mapped.close()
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def headword_grams(word: str) -> set:
+    """词头的单字与双字 n-gram 集合"""
+    grams = set(word)
+    for n in range(2, NGRAM_SIZE + 1):
+        grams.update(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+def _read_record_blocks(mdx) -> List[Tuple[int, int, int]]:
+    """读取记录块目录：[(文件偏移, 压缩大小, 解压后大小)]"""
+    number_format = mdx._number_format
+    number_width = mdx._number_width
+
+    def read_number(f) -> int:
+        return struct.unpack(number_format, f.read(number_width))[0]
+
+    def read_int32(f) -> int:
+        return struct.unpack(">I", f.read(4))[0]
+
+    blocks = []
+    with open(mdx._fname, "rb") as f:
+        f.seek(mdx._record_block_offset)
+        if mdx._version >= 3:
+            num_blocks = read_int32(f)
+            read_number(f)  # 记录区总字节数
+            for _ in range(num_blocks):
+                decompressed_size = read_int32(f)
+                compressed_size = read_int32(f)
+                blocks.append((f.tell(), compressed_size, decompressed_size))
+                f.seek(compressed_size, 1)
+        else:
+            num_blocks = read_number(f)
+            read_number(f)  # 词条数
+            info_size = read_number(f)
+            read_number(f)  # 记录区总字节数
+            file_offset = f.tell() + info_size
+            for _ in range(num_blocks):
+                compressed_size = read_number(f)
+                decompressed_size = read_number(f)
+                blocks.append((file_offset, compressed_size, decompressed_size))
+                file_offset += compressed_size
+    return blocks
+
+
+def build_index(mdx_path: str) -> bytes:
+    """解析 MDX 词头区，返回旁路索引文件的完整内容"""
+    from mdict_utils.base.readmdict import MDX
+
+    stat = os.stat(mdx_path)
+    mdx = MDX(mdx_path)
+    blocks = _read_record_blocks(mdx)
+    total = sum(decompressed for _, _, decompressed in blocks)
+
+    key_list = mdx._key_list
+    entries = []
+    for i, (start, key) in enumerate(key_list):
+        end = key_list[i + 1][0] if i + 1 < len(key_list) else total
+        entries.append((key, start, end))
+    # 稳定排序：同名词头保持 MDX 中的原始顺序
+    entries.sort(key=lambda entry: entry[0])
+
+    encrypted_key = mdx._encrypted_key
+    meta = json.dumps({
+        "format": INDEX_FORMAT,
+        "byteorder": sys.byteorder,
+        "version": mdx._version,
+        "encoding": mdx._encoding,
+        "encrypted_key": encrypted_key.hex() if encrypted_key else None,
+        "fold_table": table_version(),
+    }).encode("utf-8")
+
+    key_offsets = array("Q", [0])
+    blob = bytearray()
+    postings: Dict[bytes, array] = {}
+    variants: List[Tuple[bytes, int]] = []
+    previous = None
+    for i, (key, _, _) in enumerate(entries):
+        blob += key
+        key_offsets.append(len(blob))
+        if key != previous:
+            previous = key
+            word = key.decode("utf-8", errors="ignore")
+            folded = fold(word)
+            if folded != word:
+                variants.append((folded.encode("utf-8"), i))
+            for gram in headword_grams(word):
+                gram_key = gram.encode("utf-8")
+                if gram_key not in postings:
+                    postings[gram_key] = array("I")
+                postings[gram_key].append(i)
+
+    gram_offsets = array("Q", [0])
+    posting_offsets = array("Q", [0])
+    posting_data = array("I")
+    gram_blob = bytearray()
+    for gram_key in sorted(postings):
+        gram_blob += gram_key
+        gram_offsets.append(len(gram_blob))
+        posting_data.extend(postings[gram_key])
+        posting_offsets.append(len(posting_data))
+    posting_bytes = posting_data.tobytes()
+
+    # 稳定排序：归一化形式相同的多个词头，排序靠前的在前
+    variants.sort(key=lambda variant: variant[0])
+    variant_offsets = array("Q", [0])
+    variant_blob = bytearray()
+    for folded_key, _ in variants:
+        variant_blob += folded_key
+        variant_offsets.append(len(variant_blob))
+
+    block_starts = array("Q", [0])
+    for _, _, decompressed in blocks:
+        block_starts.append(block_starts[-1] + decompressed)
+
+    parts = [
+        _HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(entries),
+                     len(blocks), len(blob), len(meta),
+                     len(postings), len(gram_blob), len(posting_data),
+                     len(variants), len(variant_blob)),
+        meta.ljust(_padded(len(meta)), b" "),
+        array("Q", [offset for offset, _, _ in blocks]).tobytes(),
+        array("Q", [size for _, size, _ in blocks]).tobytes(),
+        block_starts.tobytes(),
+        key_offsets.tobytes(),
+        array("Q", [start for _, start, _ in entries]).tobytes(),
+        array("Q", [end for _, _, end in entries]).tobytes(),
+        gram_offsets.tobytes(),
+        posting_offsets.tobytes(),
+        variant_offsets.tobytes(),
+        array("Q", [i for _, i in variants]).tobytes(),
+        posting_bytes.ljust(_padded(len(posting_bytes)), b"\x00"),
+        bytes(blob),
+        bytes(gram_blob),
+        bytes(variant_blob),
+    ]
+    return b"".join(parts)
+
+
+def _is_current(index: HeadwordIndex, stat: os.stat_result) -> bool:
+    return (index.mdx_size == stat.st_size
+            and index.mdx_mtime_ns == stat.st_mtime_ns
+            and index.meta.get("format") == INDEX_FORMAT
+            and index.meta.get("byteorder") == sys.byteorder
+            and index.meta.get("fold_table") == table_version())
+
+
+def _open_index_file(index_path: str, stat: os.stat_result) -> Optional[HeadwordIndex]:
+    """映射已有的索引文件；不存在、损坏或已过期时返回 None"""
+    try:
+        with open(index_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        index = HeadwordIndex(mapped, mapped)
+    except (ValueError, struct.error):
+        mapped.close()
+        return None
+    if not _is_current(index, stat):
+        index.close()
+        return None
+    return index
+
+
+def write_index(mdx_path: str, index_path: Optional[str] = None) -> str:
+    """构建并原子地写入旁路索引，返回索引路径"""
+    index_path = index_path or index_path_for(mdx_path)
+    data = build_index(mdx_path)
+    directory = os.path.dirname(os.path.abspath(index_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".mdxidx-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return index_path
+
+
+def load_index(mdx_path: str, index_path: Optional[str] = None) -> HeadwordIndex:
+    """加载词头索引；索引缺失或过期时重建，目录不可写时退回内存索引"""
+    index_path = index_path or index_path_for(mdx_path)
+    stat = os.stat(mdx_path)
+    index = _open_index_file(index_path, stat)
+    if index is not None:
+        return index
+
+    try:
+        write_index(mdx_path, index_path)
+    except OSError:
+        return HeadwordIndex(build_index(mdx_path))
+    index = _open_index_file(index_path, os.stat(mdx_path))
+    if index is None:
+        # 构建期间 MDX 又被修改，直接使用内存中的索引
+        return HeadwordIndex(build_index(mdx_path))
+    return index
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python dict/scripts/mdx_index.py <辞典.mdx> [索引路径]")
+        sys.exit(1)
+
+    mdx_path = sys.argv[1]
+    index_path = sys.argv[2] if len(sys.argv) > 2 else None
+    if not os.path.exists(mdx_path):
+        print(f"错误：找不到辞典文件 {mdx_path}")
+        sys.exit(1)
+
+    path = write_index(mdx_path, index_path)
+    index = load_index(mdx_path, path)
+    print(f"已写入词头索引：{path}（{len(index)} 个词头，{os.path.getsize(path)} 字节）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+MDX 辞典进程内读取器
+
+打开 MDX 文件时只加载一次词头索引，之后常驻内存，按需读取并解压词条所在的
+记录块。替代每次查询都启动一个 `mdict -q` 子进程、重复解析整个词头索引的做法。
+
+词头索引来自 MDX 旁路的 `.idx` 文件（见 mdx_index.py），启动时只需 mmap，
+不再解析词头区。记录区同样通过 mmap 只读映射，查询时只解压命中的记录块，
+并用有界 LRU 缓存最近解压的块；多个 worker 进程共享操作系统页缓存，
+常驻内存不随进程数增长。
+
+打开、查询、检索与记录块解压分阶段计时，记录块缓存的命中情况计入
+dict_block_cache 计数器（见 scripts/tracing.py）。
+
+使用示例：
+    from mdx_reader import open_dictionary
+
+    reader = open_dictionary("dict/历史辞典4合1.mdx")
+    print(reader.lookup("李白"))
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mdict_utils.base.readmdict import _fast_decrypt, _salsa_decrypt
+from mdict_utils.base.ripemd128 import ripemd128
+
+# 追踪模块位于仓库根目录的 scripts/ 下
+_SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts")
+if _SHARED_DIR not in sys.path:
+    sys.path.insert(0, _SHARED_DIR)
+
+from fulltext_index import FullTextHit, load_fulltext, search_fulltext
+from headword_search import HeadwordMatch, search_headwords
+from mdx_index import HeadwordIndex, load_index
+from tracing import count, span
+
+# 多个词条同名时的分隔符，与 `mdict -q` 的输出保持一致
+RECORD_SEPARATOR = "\n---\n"
+
+# 默认缓存的已解压记录块数量（每块通常为几十 KB）
+DEFAULT_CACHE_BLOCKS = 64
+
+# 批量查询时每轮排序解析的关键词数
+BATCH_CHUNK_SIZE = 10000
+
+
+def decode_block(raw: bytes, decompressed_size: int, encrypted_key: Optional[bytes] = None) -> bytes:
+    """解密并解压一个 MDX 数据块（块头为 4 字节类型 + 4 字节 adler32）"""
+    info = struct.unpack("<L", raw[:4])[0]
+    compression = info & 0xf
+    encryption = (info >> 4) & 0xf
+    encryption_size = (info >> 8) & 0xff
+
+    data = raw[8:]
+    if encryption:
+        key = encrypted_key or ripemd128(raw[4:8])
+        if encryption == 1:
+            data = _fast_decrypt(data[:encryption_size], key) + data[encryption_size:]
+        elif encryption == 2:
+            data = _salsa_decrypt(data[:encryption_size], key) + data[encryption_size:]
+        else:
+            raise ValueError(f"不支持的加密方式: {encryption}")
+
+    if compression == 0:
+        return data
+    if compression == 1:
+        # LZO 块：使用 mdict-utils 自带的纯 Python 实现
+        from mdict_utils.base import lzo
+        return lzo.decompress(data, initSize=decompressed_size, blockSize=1308672)
+    if compression == 2:
+        return zlib.decompress(data)
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+class MDXReader:
+    """常驻内存的 MDX 辞典读取器（线程安全）"""
+
+    def __init__(self, path: str, cache_blocks: int = DEFAULT_CACHE_BLOCKS,
+                 index: Optional[HeadwordIndex] = None):
+        self.path = path
+        self.index = index or load_index(path)
+        self._encoding = self.index.meta["encoding"]
+        encrypted_key = self.index.meta.get("encrypted_key")
+        self._encrypted_key = bytes.fromhex(encrypted_key) if encrypted_key else None
+        self._lock = threading.Lock()
+
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._mm, "madvise") and hasattr(mmap, "MADV_RANDOM"):
+            # 随机访问：避免内核预读与本次查询无关的记录块
+            self._mm.madvise(mmap.MADV_RANDOM)
+
+        # 已解压记录块的 LRU 缓存：块号 -> 解压后的字节
+        self._cache_blocks = max(1, cache_blocks)
+        self._block_cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        # 全文索引按需加载（需先离线构建）
+        self._fulltext = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self.index
+
+    def keys(self) -> Iterator[str]:
+        """按排序顺序返回所有词头"""
+        return self.index.keys()
+
+    def lookup(self, keyword: str) -> Optional[str]:
+        """精确查询词条（简繁写法均可，见 HeadwordIndex.resolve），未收录时返回 None"""
+        with span("dict.lookup") as current:
+            lo, hi = self.index.resolve(keyword)
+            if current is not None:
+                current.set(found=lo != hi)
+            if lo == hi:
+                return None
+            records = [self.read_entry(i) for i in range(lo, hi)]
+            return RECORD_SEPARATOR.join(records)
+
+    def lookup_many(self, keywords: Iterable[str],
+                    chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[Tuple[str, Optional[str]]]:
+        """批量精确查询，按解析完成的顺序产出 (关键词, 释文或 None)
+
+        每轮取 chunk_size 个关键词，先在词头索引中定位，再按记录在 MDX 中的
+        偏移排序读取：落在同一记录块的词条只解压一次。未收录的关键词最先产出，
+        重复的关键词只查询一次。
+        """
+        keywords = iter(keywords)
+        seen = set()
+        while True:
+            chunk = list(islice(keywords, chunk_size))
+            if not chunk:
+                return
+            located = []
+            for keyword in chunk:
+                if keyword in seen:
+                    continue
+                seen.add(keyword)
+                lo, hi = self.index.resolve(keyword)
+                if lo == hi:
+                    yield keyword, None
+                else:
+                    located.append((self.index.location(lo)[0], keyword, lo, hi))
+            located.sort()
+            for _, keyword, lo, hi in located:
+                yield keyword, RECORD_SEPARATOR.join(self.read_entry(i) for i in range(lo, hi))
+
+    def read_entry(self, i: int) -> str:
+        """按词头索引中的排序下标读取释文"""
+        return self._read_record(*self.index.location(i))
+
+    def search(self, query: str, mode: str = "auto", limit: int = 10,
+               max_distance: int = 2) -> List[HeadwordMatch]:
+        """检索候选词头（前缀/子串/模糊），详见 headword_search.py"""
+        with span("dict.search", mode=mode):
+            return search_headwords(self.index, query, mode=mode, limit=limit,
+                                    max_distance=max_distance)
+
+    def fulltext_search(self, query: str, limit: int = 10) -> Tuple[List[FullTextHit], int]:
+        """在释文全文索引中检索，详见 fulltext_index.py"""
+        with span("dict.fulltext"):
+            with self._lock:
+                if self._fulltext is None:
+                    self._fulltext = load_fulltext(self.path)
+            return search_fulltext(self, self._fulltext, query, limit=limit)
+
+    def cache_info(self) -> Dict[str, int]:
+        """返回记录块缓存的命中统计"""
+        with self._lock:
+            return {
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "blocks": len(self._block_cache),
+                "max_blocks": self._cache_blocks,
+            }
+
+    def close(self):
+        """关闭底层映射与文件"""
+        with self._lock:
+            self._block_cache.clear()
+        self._mm.close()
+        self._file.close()
+        self.index.close()
+        if self._fulltext is not None:
+            self._fulltext.close()
+
+    def _block_for_offset(self, offset: int) -> int:
+        return bisect.bisect_right(self.index.block_starts, offset) - 1
+
+    def _load_block(self, block_no: int) -> bytes:
+        """取得解压后的记录块，优先命中 LRU 缓存"""
+        with self._lock:
+            block = self._block_cache.get(block_no)
+            if block is not None:
+                self._block_cache.move_to_end(block_no)
+                self._cache_hits += 1
+                hit = True
+            else:
+                self._cache_misses += 1
+                hit = False
+        count("dict_block_cache", result="hit" if hit else "miss")
+        if hit:
+            return block
+
+        # 只从映射中切出这一块的压缩数据，解压在锁外进行
+        index = self.index
+        start = index.block_offsets[block_no]
+        raw = self._mm[start:start + index.block_sizes[block_no]]
+        decompressed_size = index.block_starts[block_no + 1] - index.block_starts[block_no]
+        with span("dict.block_decode"):
+            block = decode_block(raw, decompressed_size, self._encrypted_key)
+
+        with self._lock:
+            self._block_cache[block_no] = block
+            self._block_cache.move_to_end(block_no)
+            while len(self._block_cache) > self._cache_blocks:
+                self._block_cache.popitem(last=False)
+        return block
+
+    def _read_record(self, start: int, end: int) -> str:
+        block_no = self._block_for_offset(start)
+        block_start = self.index.block_starts[block_no]
+        data = self._load_block(block_no)[start - block_start:end - block_start]
+        # 记录可能跨越块边界
+        num_blocks = len(self.index.block_offsets)
+        while len(data) < end - start and block_no + 1 < num_blocks:
+            block_no += 1
+            data += self._load_block(block_no)[:end - start - len(data)]
+        return data.strip(b"\x00").strip().decode(self._encoding, errors="ignore")
+
+
+_readers: Dict[str, MDXReader] = {}
+_readers_lock = threading.Lock()
+
+
+def open_dictionary(path: str, cache_blocks: int = DEFAULT_CACHE_BLOCKS) -> MDXReader:
+    """返回进程内共享的辞典读取器，同一文件只打开一次"""
+    key = os.path.abspath(path)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is None:
+            with span("dict.open"):
+                reader = MDXReader(path, cache_blocks=cache_blocks)
+            _readers[key] = reader
+        return reader
@@ -5,51 +5,113 @@
 使用示例：
     python dict/scripts/query_dict.py 李白
     python dict/scripts/query_dict.py 安史之乱 科举制度
+
+    # 批量查询：从文件或标准输入读取关键词（每行一个），逐行输出 JSONL
+    python dict/scripts/query_dict.py --input keywords.txt > results.jsonl
+    cat keywords.txt | python dict/scripts/query_dict.py --input -
+    python dict/scripts/query_dict.py --jsonl 李白 杜甫
+    python dict/scripts/query_dict.py --format msgpack --input keywords.txt > results.msgpack
+
+    # 检索候选词头（前缀/子串/模糊），一次返回多个候选
+    python dict/scripts/query_dict.py --search 唐太宗李世民
+    python dict/scripts/query_dict.py --search --mode prefix 李世
+    python dict/scripts/query_dict.py --search --input keywords.txt   # 逐个检索，输出 JSONL
+
+    # 释文全文检索（需先构建一次全文索引）
+    python dict/scripts/query_dict.py fulltext --build
+    python dict/scripts/query_dict.py fulltext 节度使 河北
+    python dict/scripts/query_dict.py fulltext 节度使 OR 观察使
 """
 
 import sys
-import subprocess
 import os
-import shutil
+
+# 共享的 daemon_client、structured_output 位于项目的 scripts/ 目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+
+if __name__ == "__main__":
+    # 常驻查询守护进程（scripts/history_daemon.py）运行时直接转发，省去导入与打开辞典
+    try:
+        from daemon_client import forward
+    except ImportError:
+        pass
+    else:
+        forward("query_dict")
+
+import argparse
+import importlib.util
+import itertools
+import time
+
+from structured_output import FORMATS, JSONL, TEXT
+from tracing import add_trace_arguments, report_trace
+
+DICT_PATH = "dict/历史辞典4合1.mdx"
 
 def query_dictionary(keyword):
     """查询历史辞典"""
-    dict_path = "dict/历史辞典4合1.mdx"
+    dict_path = DICT_PATH
     
     if not os.path.exists(dict_path):
         print(f"错误：找不到辞典文件 {dict_path}")
         return None
     
     try:
-        # 使用 mdict 命令查询
-        result = subprocess.run(
-            ["mdict", "-q", keyword, dict_path],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            if output:
-                return output
-            else:
-                return None
-        else:
-            print(f"查询出错：{result.stderr}")
-            return None
-            
-    except subprocess.TimeoutExpired:
-        print(f"查询超时（关键词：{keyword}）")
-        return None
-    except FileNotFoundError:
+        from mdx_reader import open_dictionary
+    except ImportError:
         print("错误：未安装 mdict-utils，请运行：pip install mdict-utils")
         return None
+    
+    try:
+        # 辞典在进程内只打开一次，多个关键词共用同一个读取器
+        return open_dictionary(dict_path).lookup(keyword)
     except Exception as e:
         print(f"查询出错：{e}")
         return None
 
-def format_result(keyword, result):
+def suggest_headwords(keyword, mode="auto", limit=10):
+    """检索候选词头，返回 HeadwordMatch 列表"""
+    if not os.path.exists(DICT_PATH):
+        return []
+    
+    try:
+        from mdx_reader import open_dictionary
+        return open_dictionary(DICT_PATH).search(keyword, mode=mode, limit=limit)
+    except ImportError:
+        return []
+    except Exception as e:
+        print(f"检索出错：{e}")
+        return []
+
+def read_keywords(path):
+    """逐行读取关键词（path 为 - 时读标准输入），跳过空行"""
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in stream:
+            keyword = line.strip()
+            if keyword:
+                yield keyword
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def batch_lookup(keywords, writer=None, flush_every=100):
+    """批量查询并流式写出 entry 记录（默认以 JSONL 写到标准输出），返回 (总数, 命中数)"""
+    from mdx_reader import open_dictionary
+    from structured_output import RecordWriter, entry_record
+    writer = writer or RecordWriter()
+    reader = open_dictionary(DICT_PATH)
+    total = found = 0
+    for keyword, result in reader.lookup_many(keywords):
+        writer.write(entry_record(keyword, result))
+        total += 1
+        found += result is not None
+        if total % flush_every == 0:
+            writer.flush()
+    writer.flush()
+    return total, found
+
+def format_result(keyword, result, suggestions=None):
     """格式化输出结果"""
     print(f"\n{'='*60}")
     print(f"关键词：{keyword}")
@@ -59,7 +121,9 @@ def format_result(keyword, result):
         print(f"\n根据《中国历史大辞典》：")
         print(f"\n「{result}」")
     else:
-        print(f"\n未找到词条"{keyword}"")
+        print(f"\n未找到词条“{keyword}”")
+        if suggestions:
+            print("\n相近词条：" + "、".join(m.word for m in suggestions))
         print("\n建议：")
         print("  1. 尝试简化关键词")
         print("  2. 使用同义词或别称")
@@ -67,11 +131,107 @@ def format_result(keyword, result):
     
     print(f"\n{'='*60}\n")
 
+def format_suggestions(keyword, mode, suggestions):
+    """格式化候选词头"""
+    kind_names = {
+        "exact": "精确",
+        "prefix": "前缀",
+        "contained": "包含于查询词",
+        "substring": "包含查询词",
+        "fuzzy": "相近",
+    }
+    print(f"\n{'='*60}")
+    print(f"候选词头：{keyword}（{mode}）")
+    print(f"{'='*60}")
+    if not suggestions:
+        print("\n无候选词头")
+    for i, match in enumerate(suggestions, 1):
+        print(f"  {i:>2}. {match.word}  [{kind_names.get(match.kind, match.kind)}]")
+    print()
+
+def fulltext_main(argv, prog=None):
+    """fulltext 子命令：构建全文索引或按布尔/短语条件检索释文"""
+    parser = argparse.ArgumentParser(
+        prog=f"{prog or 'query_dict.py'} fulltext",
+        description="辞典释文全文检索",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+查询语法：
+  节度使 河北          同时包含（AND）
+  节度使 OR 观察使     包含任一（OR，也可写作 |）
+  "河北 节度使"        短语：各词按顺序紧接出现（忽略空白，同 河北节度使）
+
+  --profile 节度使 河北 结束后输出分阶段耗时
+        """
+    )
+    parser.add_argument('query', nargs='*', help='查询条件')
+    parser.add_argument('--build', action='store_true', help='构建（或重建）全文索引')
+    parser.add_argument('--limit', type=int, default=10, help='返回结果数量上限')
+    parser.add_argument('--format', choices=FORMATS, default=TEXT,
+                        help='输出格式：text（默认）；jsonl、msgpack 逐条输出 hit 记录')
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    start = time.monotonic()
+    try:
+        fulltext_command(args, parser)
+    finally:
+        report_trace(args, time.monotonic() - start)
+
+def fulltext_command(args, parser):
+    """按命令行参数构建全文索引或执行全文检索"""
+    if not check_environment():
+        sys.exit(1)
+    
+    from mdx_reader import open_dictionary
+    reader = open_dictionary(DICT_PATH)
+    # 结构化输出时，进度信息写到标准错误
+    log = sys.stdout if args.format == TEXT else sys.stderr
+    
+    if args.build:
+        from fulltext_index import build_fulltext
+        print("正在构建全文索引（遍历全部释文，可能需要几分钟）...", file=log)
+        path = build_fulltext(reader)
+        print(f"✓ 已写入全文索引：{path}（{os.path.getsize(path)} 字节）", file=log)
+        if not args.query:
+            return
+    
+    if not args.query:
+        parser.print_help()
+        sys.exit(1)
+    
+    # 命令行里加引号的 "河北 节度使" 到这里已是一个含空格的参数，按短语处理
+    query = " ".join(f'"{part}"' if len(part.split()) > 1 and '"' not in part else part
+                     for part in args.query)
+    try:
+        hits, total = reader.fulltext_search(query, limit=args.limit)
+    except FileNotFoundError as e:
+        print(f"❌ {e}", file=log)
+        print("\n构建全文索引：python dict/scripts/query_dict.py fulltext --build", file=log)
+        sys.exit(1)
+    
+    if args.format != TEXT:
+        from structured_output import hit_record, open_writer
+        writer = open_writer(args.format)
+        writer.write_all(hit_record(query, hit.word, hit.score, hit.snippet) for hit in hits)
+        writer.flush()
+        return
+    
+    print(f"\n{'='*60}")
+    print(f"全文检索：{query}（约 {total} 条候选，显示 {len(hits)} 条）")
+    print(f"{'='*60}")
+    for i, hit in enumerate(hits, 1):
+        print(f"\n{i:>2}. {hit.word}  （相关度 {hit.score}）")
+        print(f"    {hit.snippet}")
+    if not hits:
+        print("\n未找到匹配的词条")
+    print()
+
 def check_environment():
     """检查环境是否正确配置"""
-    # 检查mdict命令是否可用
-    if not shutil.which('mdict'):
-        print("❌ 错误：未找到 mdict 命令")
+    # 检查 mdict-utils 是否可用
+    if importlib.util.find_spec('mdict_utils') is None:
+        print("❌ 错误：未安装 mdict-utils")
         print("\n可能的解决方案：")
         print("1. 激活虚拟环境：")
         print("   cd /Users/zhi.q/HistoryAgentSkills")
@@ -83,7 +243,7 @@ def check_environment():
         return False
     
     # 检查辞典文件是否存在
-    dict_path = "dict/历史辞典4合1.mdx"
+    dict_path = DICT_PATH
     if not os.path.exists(dict_path):
         print(f"❌ 错误：找不到辞典文件 {dict_path}")
         print("\n请确保在项目根目录运行此脚本")
@@ -91,19 +251,93 @@ def check_environment():
     
     return True
 
-def main():
-    if len(sys.argv) < 2:
-        print("用法: python dict/scripts/query_dict.py <关键词1> [关键词2] ...")
-        print("\n示例:")
-        print("  python dict/scripts/query_dict.py 李白")
-        print("  python dict/scripts/query_dict.py 安史之乱 李白 杜甫")
-        sys.exit(1)
+def main(argv=None, prog=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'fulltext':
+        fulltext_main(argv[1:], prog)
+        return
+    
+    from headword_search import SEARCH_MODES
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="中国历史大辞典查询工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例：
+  %(prog)s 李白
+  %(prog)s 安史之乱 李白 杜甫
+  %(prog)s --input keywords.txt > results.jsonl   （批量查询，JSONL 输出）
+  %(prog)s --input keywords.txt --format msgpack > results.msgpack
+  %(prog)s --search 唐太宗李世民
+  %(prog)s --search --mode fuzzy --limit 5 李世明
+  %(prog)s fulltext 节度使 河北      （释文全文检索，详见 fulltext --help）
+  %(prog)s --profile 李白 杜甫       （结束后输出分阶段耗时）
+        """
+    )
+    parser.add_argument('keywords', nargs='*', help='关键词（可多个）')
+    parser.add_argument('--input', metavar='FILE', help='从文件读取关键词（每行一个，- 表示标准输入），批量查询并输出 JSONL')
+    parser.add_argument('--format', choices=FORMATS, default=TEXT,
+                        help='输出格式：text（默认）；jsonl、msgpack 逐条输出 entry/suggestion 记录（--input 时默认 jsonl）')
+    parser.add_argument('--jsonl', action='store_true', help='等同于 --format jsonl')
+    parser.add_argument('--search', action='store_true', help='检索候选词头而非精确查询')
+    parser.add_argument('--mode', choices=SEARCH_MODES, default='auto',
+                        help='候选词头检索方式：auto（默认）、prefix、substring、contained、fuzzy')
+    parser.add_argument('--limit', type=int, default=10, help='候选词头数量上限')
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    start = time.monotonic()
+    try:
+        lookup_main(args, parser)
+    finally:
+        report_trace(args, time.monotonic() - start)
+
+def lookup_main(args, parser):
+    """按命令行参数执行精确查询或候选词头检索"""
+    if not args.keywords and not args.input:
+        parser.error("请提供关键词或 --input 文件")
     
     # 环境检查
     if not check_environment():
         sys.exit(1)
     
-    keywords = sys.argv[1:]
+    fmt = JSONL if args.jsonl else args.format
+    if args.input and fmt == TEXT:
+        fmt = JSONL
+    
+    if fmt != TEXT:
+        from structured_output import open_writer, suggestion_record
+        writer = open_writer(fmt)
+        keywords = args.keywords
+        if args.input:
+            if args.input != '-' and not os.path.exists(args.input):
+                print(f"错误：找不到关键词文件 {args.input}", file=sys.stderr)
+                sys.exit(1)
+            keywords = itertools.chain(keywords, read_keywords(args.input))
+        if args.search:
+            try:
+                for keyword in keywords:
+                    writer.write_all(suggestion_record(keyword, match.word, match.kind)
+                                     for match in suggest_headwords(keyword, args.mode, args.limit))
+                    writer.flush()
+            except BrokenPipeError:
+                sys.exit(0)
+            return
+        try:
+            total, found = batch_lookup(keywords, writer)
+        except BrokenPipeError:
+            sys.exit(0)
+        print(f"已查询 {total} 个关键词，命中 {found} 个", file=sys.stderr)
+        return
+    
+    keywords = args.keywords
+    
+    if args.search:
+        for keyword in keywords:
+            format_suggestions(keyword, args.mode, suggest_headwords(keyword, args.mode, args.limit))
+        return
     
     print(f"\n正在查询 {len(keywords)} 个关键词...")
     
@@ -120,7 +354,8 @@ def main():
     print("="*60)
     
     for keyword, result in results.items():
-        format_result(keyword, result)
+        suggestions = None if result else suggest_headwords(keyword, limit=5)
+        format_result(keyword, result, suggestions)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+中国历史专家系统 - 性能基准测试
+
+测量以下路径的延迟分位数（p50/p95/p99）、吞吐量与峰值内存（RSS）：
+
+    dict_cold      每次重新打开辞典后查询（HistoryExpert.query_dictionary）
+    dict_warm      辞典已打开时的单次查询
+    dict_batch     每次批量查询一批关键词（MDXReader.lookup_many）
+    api_poetry     Writing/Find  ┐
+    api_books      Book/Search   │
+    api_find       Book/Find     ├ 访问本地替身（standin_server.py），关闭响应缓存与限速
+    api_people     People/{id}   │
+    api_event      Event/Search  │
+    api_find_many  多关键词并发检索（async_query_api.find_many）┘
+    e2e            HistoryExpert.comprehensive_query 端到端
+
+每个场景在独立子进程中运行，冷启动与峰值 RSS 互不影响。结果保存为 JSON
+（含 git 提交号），可用 --compare 与之前的结果对比。
+
+使用示例：
+    python scripts/benchmark.py
+    python scripts/benchmark.py --only dict_warm,api_find --iterations 200
+    python scripts/benchmark.py --latency 0.02 --compare benchmarks/abc1234.json
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import resource
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "dict", "scripts"))
+sys.path.insert(0, os.path.join(ROOT, "cnkgraph", "scripts"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+DICT_PATH = os.path.join(ROOT, "dict", "历史辞典4合1.mdx")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks")
+
+DICT_SCENARIOS = ("dict_cold", "dict_warm", "dict_batch")
+API_SCENARIOS = ("api_poetry", "api_books", "api_find", "api_people", "api_event", "api_find_many")
+SCENARIOS = DICT_SCENARIOS + API_SCENARIOS + ("e2e",)
+
+# 每批关键词数（dict_batch、api_find_many）
+BATCH_SIZE = 100
+SWEEP_SIZE = 30
+
+# 本地替身的默认延迟（秒）
+DEFAULT_LATENCY = 0.005
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def peak_rss_kb() -> int:
+    """当前进程的峰值常驻内存（KB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(name: str, op: Callable[[int], int], iterations: int, warmup: int = 0) -> Dict[str, Any]:
+    """执行 op(i) iterations 次，op 返回本次处理的条目数"""
+    for i in range(warmup):
+        op(i)
+    latencies = []
+    items = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        items += op(i)
+        latencies.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "items": items,
+        "total_s": round(total, 4),
+        "ops_per_s": round(iterations / total, 2) if total else 0.0,
+        "items_per_s": round(items / total, 2) if total else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def sample_keywords(dict_path: str, count: int) -> List[str]:
+    """从辞典词头中等间隔取样关键词（结果可复现）"""
+    from mdx_reader import open_dictionary
+    reader = open_dictionary(dict_path)
+    keys = list(reader.keys())
+    step = max(1, len(keys) // count)
+    return keys[::step][:count]
+
+
+def run_dict(name: str, dict_path: str, iterations: int) -> Dict[str, Any]:
+    import mdx_reader
+    from history_query import HistoryExpert
+
+    expert = HistoryExpert()
+    expert.dict_path = dict_path
+    keywords = sample_keywords(dict_path, max(iterations, BATCH_SIZE))
+
+    if name == "dict_cold":
+        def op(i: int) -> int:
+            # 关闭并丢弃共享读取器，下次查询重新打开辞典（操作系统页缓存仍是热的）
+            for reader in mdx_reader._readers.values():
+                reader.close()
+            mdx_reader._readers.clear()
+            expert.query_dictionary(keywords[i % len(keywords)])
+            return 1
+        return measure(name, op, iterations)
+
+    if name == "dict_warm":
+        def op(i: int) -> int:
+            expert.query_dictionary(keywords[i % len(keywords)])
+            return 1
+        return measure(name, op, iterations, warmup=min(iterations, 20))
+
+    reader = mdx_reader.open_dictionary(dict_path)
+
+    def op(i: int) -> int:
+        batch = keywords[(i * 7) % len(keywords):] + keywords[:(i * 7) % len(keywords)]
+        return sum(1 for _ in reader.lookup_many(batch[:BATCH_SIZE]))
+    return measure(name, op, max(1, iterations // 10), warmup=1)
+
+
+def run_api(name: str, iterations: int, latency: float, dict_path: str) -> Dict[str, Any]:
+    import query_api
+    from cnkgraph_client import configure_client
+    from standin_server import StandinConfig, serve_in_thread
+
+    server, base_url = serve_in_thread(StandinConfig(latency=latency))
+    query_api.BASE_URL = base_url
+    # 只测客户端与传输本身：关闭响应缓存与限速
+    configure_client(cache=None, limiter=None, pool_maxsize=SWEEP_SIZE)
+    try:
+        if name == "api_find_many":
+            from async_query_api import AsyncCnkgraph
+
+            async def sweep(i: int) -> int:
+                count = 0
+                async with AsyncCnkgraph(concurrency=8) as api:
+                    async for _ in api.find_many([f"关键词{i}-{k}" for k in range(SWEEP_SIZE)]):
+                        count += 1
+                return count
+            return measure(name, lambda i: asyncio.run(sweep(i)), max(1, iterations // 10), warmup=1)
+
+        if name == "e2e":
+            from history_query import HistoryExpert
+            expert = HistoryExpert()
+            expert.api_base = base_url
+            expert.dict_path = dict_path
+
+            def op(i: int) -> int:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expert.comprehensive_query(f"人物{i}")
+                return 1
+            return measure(name, op, max(1, iterations // 5), warmup=1)
+
+        calls = {
+            "api_poetry": lambda i: query_api.search_poetry(author=f"作者{i}"),
+            "api_books": lambda i: query_api.search_books(f"古籍{i}"),
+            "api_find": lambda i: query_api.find_book_passages(f"片段{i}"),
+            "api_people": lambda i: query_api.search_people(f"人物{i}"),
+            "api_event": lambda i: query_api.search_event(f"事件{i}"),
+        }
+        call = calls[name]
+
+        def op(i: int) -> int:
+            result = call(i)
+            if isinstance(result, dict) and result.get("error"):
+                raise RuntimeError(result["error"])
+            return 1
+        return measure(name, op, iterations, warmup=min(iterations, 5))
+    finally:
+        server.shutdown()
+
+
+def run_one(name: str, args) -> Dict[str, Any]:
+    """在当前进程中运行单个场景"""
+    if name in DICT_SCENARIOS:
+        result = run_dict(name, args.dict, args.iterations)
+    else:
+        result = run_api(name, args.iterations, args.latency, args.dict)
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+
+def run_isolated(name: str, args) -> Dict[str, Any]:
+    """在子进程中运行单个场景并取回结果"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-one", name,
+           "--iterations", str(args.iterations), "--latency", str(args.latency), "--dict", args.dict]
+    env = dict(os.environ, CNKGRAPH_CACHE="0")
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=ROOT)
+    if proc.returncode != 0:
+        return {"scenario": name, "error": (proc.stderr.strip().splitlines() or ["未知错误"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> Optional[str]:
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=ROOT, timeout=10)
+        return proc.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_table(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None):
+    header = f"{'场景':<14}{'次数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'条/秒':>11}{'RSS(MB)':>9}"
+    if baseline:
+        header += f"{'p50 变化':>10}"
+    print(header)
+    print("-" * (len(header) + 6))
+    for r in results:
+        if "error" in r:
+            print(f"{r['scenario']:<14}❌ {r['error']}")
+            continue
+        line = (f"{r['scenario']:<14}{r['iterations']:>6}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+                f"{r['p99_ms']:>10.3f}{r['items_per_s']:>11.1f}{r['peak_rss_kb'] / 1024:>9.1f}")
+        old = (baseline or {}).get(r["scenario"])
+        if old and old.get("p50_ms"):
+            line += f"{(r['p50_ms'] / old['p50_ms'] - 1) * 100:>+9.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="辞典查询、cnkgraph 客户端与综合查询的性能基准测试",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"场景：{', '.join(SCENARIOS)}"
+    )
+    parser.add_argument('--only', help='只运行指定场景（逗号分隔）')
+    parser.add_argument('--iterations', type=int, default=100, help='每个场景的迭代次数（批量场景为其 1/10）')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='本地替身每个请求的延迟（秒）')
+    parser.add_argument('--dict', default=DICT_PATH, help='辞典 MDX 文件')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 benchmarks/<提交号>.json')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args), ensure_ascii=False))
+        return
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"错误：未知的场景 {', '.join(unknown)}（可选：{', '.join(SCENARIOS)}）")
+        sys.exit(1)
+    if not os.path.exists(args.dict) or os.path.getsize(args.dict) < 1024:
+        skipped = [n for n in names if n in DICT_SCENARIOS]
+        if skipped:
+            print(f"⚠️  辞典文件不可用（{args.dict}），跳过: {', '.join(skipped)}")
+        names = [n for n in names if n not in DICT_SCENARIOS]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    results = []
+    for name in names:
+        print(f"运行 {name} ...", flush=True)
+        results.append(run_isolated(name, args))
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "settings": {"iterations": args.iterations, "latency": args.latency, "dict": args.dict},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{revision or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print()
+    print_table(results, baseline)
+    print(f"\n结果已保存：{output}")
+
+
+if __name__ == "__main__":
+    main()
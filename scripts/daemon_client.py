@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+常驻查询守护进程的轻量客户端
+
+history_query.py、query_dict.py 与 query_api.py 在导入其他模块之前调用
+forward()：守护进程（scripts/history_daemon.py）在运行时，把命令行参数通过
+Unix 套接字交给它执行，并原样转写其输出与退出码；守护进程未运行、无法连接
+或要求本地执行时返回，由脚本照常在本进程内执行。
+
+本模块只依赖标准库，避免拖慢每次调用的启动时间。
+
+协议（每条消息一行 JSON）：
+    请求: {"command": "query_dict", "argv": [...], "cwd": "...", "env": {...}}
+    响应: {"out": "..."} / {"err": "..."} / {"outb": "base64"}（二进制输出），
+          最后一条为 {"exit": 0}；
+          若要求本地执行则只有一条 {"fallback": "原因"}
+
+设置环境变量 HISTORY_DAEMON=0 可禁止转发。
+"""
+
+import base64
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, Iterator, Optional
+
+# 与 cnkgraph 响应缓存同目录
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".cache", "history-agent-skills", "daemon.sock")
+
+# 影响查询结果的环境变量前缀；与守护进程不一致时在本地执行
+FORWARDED_ENV_PREFIX = "CNKGRAPH_"
+
+# 连接守护进程的超时（秒）；之后的读取不设超时，由守护进程端的查询时限控制
+CONNECT_TIMEOUT = 1.0
+
+
+def socket_path() -> str:
+    return os.environ.get("HISTORY_DAEMON_SOCKET") or DEFAULT_SOCKET_PATH
+
+
+def forwarded_env() -> Dict[str, str]:
+    return {k: v for k, v in os.environ.items() if k.startswith(FORWARDED_ENV_PREFIX)}
+
+
+def connect(path: Optional[str] = None) -> Optional[socket.socket]:
+    """连接守护进程，未运行时返回 None"""
+    path = path or socket_path()
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(path)
+    except OSError:
+        # 守护进程已退出但套接字文件残留
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def send_request(sock: socket.socket, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """发送一条请求，逐条产出响应消息"""
+    sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+    with sock.makefile("rb") as reader:
+        for line in reader:
+            yield json.loads(line)
+
+
+def forward(command: str, argv: Optional[list] = None):
+    """把本次调用交给守护进程执行并以其退出码退出；无法转发时直接返回"""
+    if os.environ.get("HISTORY_DAEMON") == "0":
+        return
+    sock = connect()
+    if sock is None:
+        return
+
+    request = {
+        "command": command,
+        "argv": sys.argv[1:] if argv is None else argv,
+        "cwd": os.getcwd(),
+        "env": forwarded_env(),
+    }
+    started = False
+    try:
+        for message in send_request(sock, request):
+            if "fallback" in message:
+                return
+            started = True
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "outb" in message:
+                sys.stdout.buffer.write(base64.b64decode(message["outb"]))
+                sys.stdout.buffer.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+                sys.stderr.flush()
+            elif "exit" in message:
+                sys.exit(message["exit"])
+    except BrokenPipeError:
+        # 下游（如 head）提前关闭了输出
+        sys.exit(0)
+    except (OSError, ValueError) as e:
+        if not started:
+            return
+        print(f"\n❌ 与查询守护进程的连接中断: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        sock.close()
+
+    if started:
+        print("\n❌ 查询守护进程未返回结果即断开", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+常驻查询守护进程
+
+每次运行 history_query.py、query_dict.py 或 query_api.py 都要重新导入
+requests、重新打开辞典并重新建立 HTTPS 连接。守护进程常驻后台，保持辞典
+读取器、HTTP 连接池、响应缓存与限速器处于预热状态；三个脚本在守护进程
+运行时自动把调用转发给它（见 daemon_client.py），输出与退出码与本地执行一致。
+
+使用示例：
+    # 在项目根目录启动（后台运行，空闲 30 分钟后自动退出）
+    python scripts/history_daemon.py start
+
+    # 之后照常调用，自动经由守护进程执行
+    python scripts/history_query.py 李白
+    python dict/scripts/query_dict.py 安史之乱
+
+    # 查看状态 / 停止
+    python scripts/history_daemon.py status
+    python scripts/history_daemon.py stop
+
+    # 前台运行（调试用）
+    python scripts/history_daemon.py serve --idle-timeout 0
+
+以下调用不经守护进程、仍在本地执行：工作目录或 CNKGRAPH_* 环境变量与
+守护进程不同、从标准输入读取关键词（--input -）、query_api.py --no-cache、
+--profile 与 --trace-export（分阶段耗时只统计本次调用）。status 显示守护进程
+启动以来各阶段的累计耗时（见 tracing.py）。
+"""
+
+import sys
+import os
+import argparse
+import base64
+import contextvars
+import json
+import socketserver
+import subprocess
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dict", "scripts"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cnkgraph", "scripts"))
+
+from daemon_client import connect, forwarded_env, send_request, socket_path
+
+# 空闲多久（秒）后自动退出，0 表示不退出
+DEFAULT_IDLE_TIMEOUT = 30 * 60
+
+# 启动后等待守护进程就绪的时间（秒）
+START_TIMEOUT = 15.0
+
+
+class _ContextStream:
+    """按上下文分派的输出流：请求的输出写入各自的套接字，其余写入原输出
+
+    目标保存在 contextvars 中；线程池任务经 tracing.traced() 或
+    contextvars.copy_context().run 提交时沿用提交时的上下文，
+    因此工作线程的输出也回到发起请求的客户端。
+    """
+
+    def __init__(self, name: str, default):
+        self._default = default
+        self._target_var: "contextvars.ContextVar[Any]" = contextvars.ContextVar(name, default=None)
+
+    def redirect(self, target) -> "contextvars.Token":
+        return self._target_var.set(target)
+
+    def restore(self, token: "contextvars.Token"):
+        self._target_var.reset(token)
+
+    def _target(self):
+        return self._target_var.get() or self._default
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+class _BinaryWriter:
+    """二进制输出（--format msgpack）：flush 时以 {"outb": base64} 消息发给客户端"""
+
+    def __init__(self, channel: "_Channel"):
+        self.channel = channel
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def write(self, b: bytes) -> int:
+        with self.lock:
+            self.pending.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        with self.lock:
+            data, self.pending = b"".join(self.pending), []
+        if data:
+            self.channel.send({"outb": base64.b64encode(data).decode("ascii")})
+
+
+class _SocketWriter:
+    """把写入的文本按行作为 {"out": ...} 或 {"err": ...} 消息发给客户端
+
+    同一请求的多个工作线程共用一个写入器，缓冲区的读写加锁。
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, channel: "_Channel", field: str):
+        self.channel = channel
+        self.field = field
+        self.pending = []
+        self.lock = threading.Lock()
+        self.buffer = _BinaryWriter(channel)
+
+    def write(self, s: str) -> int:
+        with self.lock:
+            self.pending.append(s)
+        if "\n" in s:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        with self.lock:
+            data, self.pending = "".join(self.pending), []
+        if data:
+            self.channel.send({self.field: data})
+        self.buffer.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+
+class _Channel:
+    """一个客户端连接上的消息发送（stdout 与 stderr 共用）"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+
+    def send(self, message: Dict[str, Any]):
+        line = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self.lock:
+            self.wfile.write(line)
+
+
+def _commands() -> Dict[str, Callable]:
+    """可转发的命令；导入这些模块即完成 requests 等依赖的预热"""
+    import history_query
+    import query_api
+    import query_dict
+    return {
+        "history_query": history_query.main,
+        "query_dict": partial(query_dict.main, prog="query_dict.py"),
+        "query_api": partial(query_api.main, prog="query_api.py"),
+    }
+
+
+def local_only(command: str, argv: list) -> Optional[str]:
+    """需要在客户端本地执行的调用，返回原因"""
+    if "-" in argv:
+        return "从标准输入读取"
+    if command == "query_api" and "--no-cache" in argv:
+        # configure_client 会替换进程内的共享客户端，影响之后的所有请求
+        return "--no-cache 会改变共享客户端"
+    if any(arg == "--profile" or arg.startswith("--trace-export") for arg in argv):
+        # 守护进程的追踪数据是所有调用的累计，无法单独统计本次调用
+        return "分阶段耗时只统计本次调用"
+    return None
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.socket_file = path
+        self.idle_timeout = idle_timeout
+        self.commands = _commands()
+        self.started = time.time()
+        self.last_active = time.monotonic()
+        self.served = 0
+        self.active = 0
+        self.fallbacks = 0
+        self.lock = threading.Lock()
+        self.cwd = os.getcwd()
+        self.env = forwarded_env()
+        self.stdout = _ContextStream("daemon_stdout", sys.stdout)
+        self.stderr = _ContextStream("daemon_stderr", sys.stderr)
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(path, DaemonHandler)
+        finally:
+            os.umask(old_umask)
+
+    def warm_up(self):
+        """预先打开辞典并创建共享 HTTP 客户端"""
+        from cnkgraph_client import get_client
+        get_client()
+        import query_dict
+        if os.path.exists(query_dict.DICT_PATH):
+            try:
+                from mdx_reader import open_dictionary
+                open_dictionary(query_dict.DICT_PATH)
+            except Exception as e:
+                print(f"⚠️  辞典预加载失败: {e}", file=sys.stderr)
+
+    def status(self) -> Dict[str, Any]:
+        from cnkgraph_client import get_client
+        from tracing import get_tracer
+        with self.lock:
+            counts = {"served": self.served, "active": self.active, "fallbacks": self.fallbacks}
+        return {
+            "pid": os.getpid(),
+            "socket": self.socket_file,
+            "cwd": self.cwd,
+            "uptime": round(time.time() - self.started, 1),
+            "idle_timeout": self.idle_timeout,
+            **counts,
+            "cnkgraph": get_client().metrics(),
+            "trace": get_tracer().snapshot(),
+        }
+
+    def watch_idle(self):
+        """空闲超时后停止服务"""
+        while self.idle_timeout:
+            time.sleep(min(self.idle_timeout, 5.0))
+            with self.lock:
+                idle = self.active == 0 and time.monotonic() - self.last_active > self.idle_timeout
+            if idle:
+                print("空闲超时，守护进程退出")
+                self.shutdown()
+                return
+
+    def serve(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        threading.Thread(target=self.watch_idle, daemon=True).start()
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_file):
+                os.unlink(self.socket_file)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    server: DaemonServer
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        channel = _Channel(self.wfile)
+        command = request.get("command")
+
+        if command == "status":
+            channel.send({"status": self.server.status()})
+            return
+        if command == "shutdown":
+            channel.send({"exit": 0})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        main = self.server.commands.get(command)
+        argv = [str(arg) for arg in request.get("argv") or []]
+        reason = None
+        if main is None:
+            reason = f"未知命令: {command}"
+        elif request.get("cwd") != self.server.cwd:
+            # 辞典路径与输入文件都按工作目录解析
+            reason = "工作目录与守护进程不同"
+        elif (request.get("env") or {}) != self.server.env:
+            reason = "CNKGRAPH_* 环境变量与守护进程不同"
+        else:
+            reason = local_only(command, argv)
+        if reason:
+            with self.server.lock:
+                self.server.fallbacks += 1
+            channel.send({"fallback": reason})
+            return
+
+        with self.server.lock:
+            self.server.active += 1
+        try:
+            code = self.run(main, argv, channel)
+            channel.send({"exit": code})
+        except OSError:
+            # 客户端已断开
+            pass
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+                self.server.served += 1
+                self.server.last_active = time.monotonic()
+
+    def run(self, main: Callable, argv: list, channel: _Channel) -> int:
+        """在本线程执行命令，输出重定向到客户端，返回退出码"""
+        out, err = _SocketWriter(channel, "out"), _SocketWriter(channel, "err")
+        out_token = self.server.stdout.redirect(out)
+        err_token = self.server.stderr.redirect(err)
+        code = 0
+        try:
+            main(argv)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception as e:
+            print(f"\n❌ 发生错误: {e}", file=sys.stderr)
+            code = 1
+        finally:
+            try:
+                out.flush()
+                err.flush()
+            finally:
+                self.server.stdout.restore(out_token)
+                self.server.stderr.restore(err_token)
+        return code
+
+
+def query_status(path: str) -> Optional[Dict[str, Any]]:
+    sock = connect(path)
+    if sock is None:
+        return None
+    try:
+        for message in send_request(sock, {"command": "status"}):
+            return message.get("status")
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+    return None
+
+
+def serve(path: str, idle_timeout: float):
+    if query_status(path) is not None:
+        print(f"守护进程已在运行：{path}")
+        sys.exit(1)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        # 上次异常退出残留的套接字文件
+        os.unlink(path)
+    server = DaemonServer(path, idle_timeout)
+    server.warm_up()
+    print(f"✓ 查询守护进程已启动（pid {os.getpid()}）：{path}", flush=True)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        print("\n已停止")
+
+
+def start(path: str, idle_timeout: float):
+    status = query_status(path)
+    if status is not None:
+        print(f"守护进程已在运行（pid {status['pid']}）：{path}")
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    log_path = os.path.splitext(path)[0] + ".log"
+    with open(log_path, "a", encoding="utf-8") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--socket", path,
+             "serve", "--idle-timeout", str(idle_timeout)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        status = query_status(path)
+        if status is not None:
+            print(f"✓ 查询守护进程已启动（pid {status['pid']}）：{path}")
+            return
+        time.sleep(0.1)
+    print(f"❌ 守护进程未能在 {START_TIMEOUT:g} 秒内启动，详见日志：{log_path}")
+    sys.exit(1)
+
+
+def stop(path: str):
+    sock = connect(path)
+    if sock is None:
+        print("守护进程未运行")
+        return
+    try:
+        for _ in send_request(sock, {"command": "shutdown"}):
+            break
+    finally:
+        sock.close()
+    print("✓ 已停止查询守护进程")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="常驻查询守护进程（保持辞典、HTTP 连接池与缓存预热）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例：
+  %(prog)s start                     后台启动
+  %(prog)s status                    查看状态与请求指标
+  %(prog)s stop                      停止
+  %(prog)s serve --idle-timeout 0    前台运行，不自动退出
+        """
+    )
+    parser.add_argument('--socket', default=socket_path(),
+                        help='Unix 套接字路径（默认取 HISTORY_DAEMON_SOCKET 或 ~/.cache/history-agent-skills/daemon.sock）')
+    subparsers = parser.add_subparsers(dest='command', help='操作')
+    for name, help_text in (('start', '后台启动'), ('serve', '前台运行')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                         help='空闲多少秒后自动退出，0 表示不退出（默认 1800）')
+    subparsers.add_parser('status', help='查看状态')
+    subparsers.add_parser('stop', help='停止')
+    args = parser.parse_args()
+
+    if args.command == 'start':
+        start(args.socket, args.idle_timeout)
+    elif args.command == 'serve':
+        serve(args.socket, args.idle_timeout)
+    elif args.command == 'status':
+        status = query_status(args.socket)
+        if status is None:
+            print("守护进程未运行")
+            sys.exit(1)
+        print(json.dumps(status, ensure_ascii=False, indent=2))
+    elif args.command == 'stop':
+        stop(args.socket)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
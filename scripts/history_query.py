@@ -8,18 +8,92 @@
     python scripts/history_query.py "李白"
     python scripts/history_query.py "安史之乱"
     python scripts/history_query.py "科举制度"
+
+    # 结构化输出：每个数据源完成时立即写出其记录（entry/person/poem/book/source）
+    python scripts/history_query.py --format jsonl "李白"
+
+    # 分阶段耗时（辞典、建连、首字节、解析、缓存命中），或导出为 Prometheus/OpenTelemetry
+    python scripts/history_query.py --profile "李白"
+    python scripts/history_query.py --trace-export /tmp/query.prom "李白"
 """
 
 import sys
-import subprocess
-import requests
+import time
 import os
-from typing import Optional, Dict, Any, List
+import argparse
+
+if __name__ == "__main__":
+    # 常驻查询守护进程（scripts/history_daemon.py）运行时直接转发，复用预热的辞典与连接池
+    try:
+        from daemon_client import forward
+    except ImportError:
+        pass
+    else:
+        forward("history_query")
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, Dict, Any, List, Iterator, NamedTuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dict", "scripts"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cnkgraph", "scripts"))
+
+from cnkgraph_client import BASE_URL, get_client
+from knowledge_store import person_through_store, poetry_through_store
+from pagination import extract_items
+from passages import parse_passages
+from query_expansion import DEFAULT_API_BUDGET, ExpansionHit, expand_query
+from structured_output import (FORMATS, TEXT, RecordWriter, book_record, entry_record, error_record,
+                               expansion_record, open_writer, passage_record, person_record, poem_record)
+from tracing import add_trace_arguments, report_trace, span, traced
+from zh_variants import fold
 
 # 配置
 DICT_PATH = "dict/历史辞典4合1.mdx"
-API_BASE_URL = "https://open.cnkgraph.com/api"
-TIMEOUT = 30
+API_BASE_URL = BASE_URL
+TIMEOUT = 30  # 单次 API 查询（含重试与退避）的总时间（秒）
+
+# 各数据源的中文名称
+SOURCE_NAMES = {
+    "dict": "历史辞典",
+    "people": "人物",
+    "poetry": "诗词",
+    "books": "古籍",
+    "expansion": "自动扩展",
+}
+
+# 自动扩展命中时各改写方式的说明
+EXPANSION_REASONS = {
+    "variant": "简繁变体",
+    "title": "去除朝代、称号与尊称",
+    "phrase": "去除修饰",
+    "contained": "包含的词条",
+    "alias": "释文提及",
+    "headword": "相近词条",
+    "substring": "子串",
+}
+
+class SourceResult(NamedTuple):
+    """综合查询中单个数据源的结果"""
+    source: str
+    result: Any
+    elapsed: float
+    timed_out: bool = False
+
+def has_result(result: Any) -> bool:
+    """API 结果是否有效（非空且不是 {"error": ...}）"""
+    return bool(result) and not (isinstance(result, dict) and result.get('error'))
+
+def is_error(result: Any) -> bool:
+    """数据源是否请求出错（{"error": ...}），区别于正常返回但未命中"""
+    return isinstance(result, dict) and bool(result.get('error'))
+
+def api_failure(label: str, e: Exception) -> Optional[Dict]:
+    """API 请求异常的返回值：404 表示未收录，返回 None；其余（超时、5xx、连接错误）返回 {"error": ...}"""
+    response = getattr(e, "response", None)
+    if response is not None and response.status_code == 404:
+        return None
+    print(f"⚠️  {label}出错: {e}", file=sys.stderr)
+    return {"error": str(e)}
 
 class HistoryExpert:
     """历史专家系统"""
@@ -31,32 +105,36 @@ class HistoryExpert:
     def query_dictionary(self, keyword: str) -> Optional[str]:
         """查询历史辞典"""
         if not os.path.exists(self.dict_path):
-            print(f"⚠️  找不到辞典文件: {self.dict_path}")
+            print(f"⚠️  找不到辞典文件: {self.dict_path}", file=sys.stderr)
             return None
         
         try:
-            result = subprocess.run(
-                ["mdict", "-q", keyword, self.dict_path],
-                capture_output=True,
-                text=True,
-                timeout=TIMEOUT
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                return result.stdout.strip()
-            return None
-            
-        except subprocess.TimeoutExpired:
-            print(f"⚠️  辞典查询超时: {keyword}")
-            return None
-        except FileNotFoundError:
-            print("⚠️  未安装 mdict-utils，请运行: pip install mdict-utils")
+            from mdx_reader import open_dictionary
+        except ImportError:
+            print("⚠️  未安装 mdict-utils，请运行: pip install mdict-utils", file=sys.stderr)
             return None
+        
+        try:
+            # 进程内共享的读取器：辞典只解析一次，之后的查询直接命中常驻索引
+            return open_dictionary(self.dict_path).lookup(keyword)
         except Exception as e:
-            print(f"⚠️  辞典查询出错: {e}")
+            print(f"⚠️  辞典查询出错: {e}", file=sys.stderr)
             return None
     
-    def query_api_poetry(self, keyword: str = None, author: str = None) -> Optional[Dict]:
+    def suggest_headwords(self, keyword: str, limit: int = 5) -> List[str]:
+        """辞典未命中时，检索候选词头（前缀/包含/子串/模糊）"""
+        if not os.path.exists(self.dict_path):
+            return []
+        try:
+            from mdx_reader import open_dictionary
+            matches = open_dictionary(self.dict_path).search(keyword, limit=limit)
+            return [m.word for m in matches]
+        except Exception as e:
+            print(f"⚠️  辞典候选检索出错: {e}", file=sys.stderr)
+            return []
+    
+    def query_api_poetry(self, keyword: str = None, author: str = None,
+                         timeout: float = TIMEOUT) -> Optional[Dict]:
         """查询诗词API。按 Swagger 使用 POST /api/Writing/Find，请求体为 WritingModel。"""
         url = f"{self.api_base}/Writing/Find"
         body = {"PageNo": 0}
@@ -66,126 +144,270 @@ class HistoryExpert:
             body["Author"] = author
         if not (keyword or author):
             return None
-        try:
-            response = requests.post(
-                url,
-                json=body,
-                timeout=TIMEOUT,
-                headers={"Content-Type": "application/json; charset=utf-8"},
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"⚠️  诗词API查询出错: {e}")
-            return None
+        
+        def fetch():
+            try:
+                return get_client().post_json(url, body, timeout=timeout, deadline=timeout)
+            except Exception as e:
+                return api_failure("诗词API查询", e)
+        return poetry_through_store(body, fetch)
     
-    def query_api_books(self, keyword: str) -> Optional[Dict]:
+    def query_api_books(self, keyword: str, timeout: float = TIMEOUT) -> Optional[Dict]:
         """查询古籍API。按 Swagger 使用 POST /api/Book/Search，请求体为关键词的 JSON 字符串。"""
         url = f"{self.api_base}/Book/Search"
         try:
-            response = requests.post(
-                url,
-                json=keyword,
-                timeout=TIMEOUT,
-                headers={"Content-Type": "application/json; charset=utf-8"},
-            )
-            response.raise_for_status()
-            return response.json()
+            # 与 query_api.search_books 的请求一致（显式 pageNo=0），两者共用同一条缓存
+            return get_client().post_json(url, keyword, params={"pageNo": 0}, timeout=timeout, deadline=timeout)
         except Exception as e:
-            print(f"⚠️  古籍API查询出错: {e}")
-            return None
+            return api_failure("古籍API查询", e)
     
-    def query_api_people(self, name: str) -> Optional[Dict]:
-        """查询人物API。按 Swagger 使用 GET /api/People/{id}，id 为姓名/朝代键/人物 Id。"""
+    def query_api_people(self, name: str, timeout: float = TIMEOUT) -> Optional[Dict]:
+        """查询人物API。按 Swagger 使用 GET /api/People/{id}，id 为姓名/朝代键/人物 Id（繁体姓名先归一化为简体）。"""
         from urllib.parse import quote
-        url = f"{self.api_base}/People/{quote(name, safe='')}"
+        url = f"{self.api_base}/People/{quote(fold(name), safe='')}"
+        
+        def fetch():
+            try:
+                return get_client().get(url, timeout=timeout, deadline=timeout)
+            except Exception as e:
+                return api_failure("人物API查询", e)
+        return person_through_store(name, fetch)
+    
+    def query_api_passages(self, keyword: str, timeout: float = TIMEOUT) -> Optional[Dict]:
+        """检索古籍原文片段。按 Swagger 使用 POST /api/Book/Find（与 query_api.find_book_passages 共用缓存）。"""
+        url = f"{self.api_base}/Book/Find"
         try:
-            response = requests.get(url, timeout=TIMEOUT)
-            response.raise_for_status()
-            return response.json()
+            return get_client().post_json(url, {"Key": keyword, "PageNo": 0}, timeout=timeout, deadline=timeout)
         except Exception as e:
-            print(f"⚠️  人物API查询出错: {e}")
-            return None
+            return api_failure("古籍片段查询", e)
     
-    def comprehensive_query(self, keyword: str):
-        """综合查询：辞典 + API"""
-        print("\n" + "="*70)
-        print(f"中国历史专家系统 - 综合查询")
-        print("="*70)
-        print(f"\n🔍 查询关键词: {keyword}\n")
+    def query_expansion(self, keyword: str, timeout: float = TIMEOUT,
+                        budget: int = DEFAULT_API_BUDGET) -> Optional[ExpansionHit]:
+        """原词未命中时自动改写查询词：先查本地辞典，再在 budget 个请求内并行试探人物与古籍片段"""
+        reader = None
+        if os.path.exists(self.dict_path):
+            try:
+                from mdx_reader import open_dictionary
+                reader = open_dictionary(self.dict_path)
+            except Exception as e:
+                print(f"⚠️  辞典不可用，仅试探API: {e}", file=sys.stderr)
+        end_time = time.monotonic() + timeout
+        
+        def remaining() -> float:
+            # 试探在线程池中陆续开始，每个只用扩展查询剩下的时间
+            return max(0.1, end_time - time.monotonic())
+        
+        probes = {
+            "people": lambda word: self.query_api_people(word, timeout=remaining()),
+            "find": lambda word: self.query_api_passages(word, timeout=remaining()),
+        }
+        return expand_query(keyword, reader=reader, probes=probes, budget=budget, deadline=timeout)
+    
+    def stream_sources(self, keyword: str, deadline: float = TIMEOUT) -> Iterator[SourceResult]:
+        """并行查询辞典、人物、古籍（人物命中后追加诗词），按完成顺序逐个产出结果。
+        
+        辞典未命中时同时启动自动扩展查询（query_expansion.py），与其余数据源并行。
+        
+        所有数据源共享一个总截止时间 deadline（秒）；到期仍未完成的数据源以
+        timed_out=True 产出，不再等待。每个数据源的请求（含重试与退避）只用
+        剩余时间，工作线程随之在截止时间前后结束，不会拖住进程退出。
+        """
+        start = time.monotonic()
+        end_time = start + deadline
+        
+        def remaining() -> float:
+            return max(0.1, end_time - time.monotonic())
         
-        # 步骤1：查询历史辞典
-        print("📚 步骤1: 查询《中国历史大辞典》...")
-        dict_result = self.query_dictionary(keyword)
+        executor = ThreadPoolExecutor(max_workers=len(SOURCE_NAMES))
+        futures = {}
         
-        if dict_result:
-            print("✓ 找到辞典词条\n")
+        def submit(source: str, fn, *args, **kwargs):
+            # 每个数据源计时为 source.<名称> 阶段，其中的辞典与 HTTP 阶段挂在它下面
+            future = executor.submit(traced(f"source.{source}", fn), *args, **kwargs)
+            futures[future] = source
+            return future
+        
+        submit("dict", self.query_dictionary, keyword)
+        submit("people", self.query_api_people, keyword, timeout=remaining())
+        submit("books", self.query_api_books, keyword, timeout=remaining())
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=max(0, end_time - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    source = futures[future]
+                    result = future.result()
+                    # 诗词查询依赖人物结果：人物命中后立即追加
+                    if source == "people" and has_result(result):
+                        pending.add(submit("poetry", self.query_api_poetry, author=keyword, timeout=remaining()))
+                    # 辞典未命中：自动改写查询词，不必等人物、古籍的结果再手工重试
+                    if source == "dict" and result is None:
+                        pending.add(submit("expansion", self.query_expansion, keyword, timeout=remaining()))
+                    yield SourceResult(source, result, time.monotonic() - start)
+            for future in pending:
+                yield SourceResult(futures[future], None, time.monotonic() - start, timed_out=True)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _print_source_result(self, keyword: str, item: SourceResult):
+        """打印单个数据源的结果"""
+        name = SOURCE_NAMES[item.source]
+        if item.timed_out:
+            print(f"\n⏱  {name}: 超出总时限，未等待结果")
+            return
+        
+        print(f"\n[{name}] 完成（{item.elapsed:.2f} 秒）")
+        if is_error(item.result):
+            print(f"✗ 查询出错: {item.result['error']}")
+        elif item.source == "dict":
+            if item.result:
+                print("✓ 找到辞典词条\n")
+                print("-"*70)
+                print("根据《中国历史大辞典》：\n")
+                print(f"「{item.result}」")
+                print("-"*70)
+            else:
+                print("✗ 辞典中未找到此词条")
+                suggestions = self.suggest_headwords(keyword)
+                if suggestions:
+                    print(f"💡 相近词条: {'、'.join(suggestions)}")
+                else:
+                    print("💡 建议: 尝试使用同义词或简化关键词")
+        elif item.source == "people":
+            print("✓ 找到人物信息，追加查询相关诗词作品..." if has_result(item.result) else "✗ 未找到人物信息")
+        elif item.source == "poetry":
+            print("✓ 找到相关诗词" if has_result(item.result) else "✗ 未找到相关诗词")
+        elif item.source == "books":
+            print("✓ 找到相关古籍" if has_result(item.result) else "✗ 未找到相关古籍")
+        elif item.source == "expansion":
+            self._print_expansion(item.result)
+    
+    def _print_expansion(self, hit: Optional[ExpansionHit]):
+        """打印自动扩展查询的命中"""
+        if hit is None:
+            print("✗ 改写后的查询词均未命中")
+            return
+        reason = EXPANSION_REASONS.get(hit.reason, hit.reason)
+        if hit.source == "dict":
+            print(f"✓ 改查「{hit.candidate}」（{reason}）命中辞典词条\n")
             print("-"*70)
             print("根据《中国历史大辞典》：\n")
-            print(f"「{dict_result}」")
+            print(f"「{hit.data}」")
             print("-"*70)
+        elif hit.source == "people":
+            print(f"✓ 改查「{hit.candidate}」（{reason}）找到人物信息"
+                  f"（试探 {hit.probes} 个请求）")
         else:
-            print("✗ 辞典中未找到此词条")
-            print("💡 建议: 尝试使用同义词或简化关键词\n")
-        
-        # 步骤2：查询古籍API（人物）
-        print("\n📖 步骤2: 查询古籍文献知识图谱API...")
-        print("\n2.1 尝试作为人物查询...")
-        people_result = self.query_api_people(keyword)
-        
-        if people_result and not people_result.get('error'):
-            print("✓ 找到人物信息")
-            # 这里可以进一步格式化输出
-            
-            # 如果是人物，尝试查询其作品
-            print("\n2.2 查询相关诗词作品...")
-            poetry_result = self.query_api_poetry(author=keyword)
-            if poetry_result:
-                print("✓ 找到相关诗词")
-        else:
-            print("✗ 未找到人物信息")
-        
-        # 步骤3：查询古籍
-        print("\n2.3 查询相关古籍文献...")
-        book_result = self.query_api_books(keyword)
+            passages = parse_passages(hit.data)
+            print(f"✓ 改查「{hit.candidate}」（{reason}）找到 {len(passages)} 条古籍原文片段"
+                  f"（试探 {hit.probes} 个请求）")
+            for passage in passages[:3]:
+                print(f"  《{passage.get('Book')}》{passage.get('PreviousText') or ''}"
+                      f"【{passage.get('MatchedText') or ''}】{passage.get('LaterText') or ''}")
+    
+    def source_records(self, keyword: str, item: SourceResult) -> Iterator[Dict[str, Any]]:
+        """把单个数据源的结果转换为结构化记录，最后附一条 source 记录"""
+        if item.source == "dict" and not item.timed_out:
+            yield entry_record(keyword, item.result,
+                               None if item.result else self.suggest_headwords(keyword))
+        elif isinstance(item.result, dict) and item.result.get('error'):
+            yield error_record(item.source, item.result['error'])
+        elif item.source == "people" and has_result(item.result):
+            yield person_record(item.result, keyword)
+        elif item.source == "poetry" and has_result(item.result):
+            for poem in extract_items(item.result):
+                yield poem_record(poem)
+        elif item.source == "books" and has_result(item.result):
+            for book in extract_items(item.result):
+                yield book_record(book, keyword)
+        elif item.source == "expansion" and item.result is not None:
+            hit = item.result
+            yield expansion_record(keyword, hit.candidate, hit.reason, hit.source, hit.elapsed, hit.probes)
+            if hit.source == "dict":
+                yield entry_record(hit.candidate, hit.data)
+            elif hit.source == "people":
+                yield person_record(hit.data, hit.candidate)
+            else:
+                for passage in parse_passages(hit.data):
+                    yield passage_record(passage, hit.candidate)
+        yield {"type": "source", "source": item.source, "found": has_result(item.result),
+               "elapsed": round(item.elapsed, 3), "timed_out": item.timed_out}
+    
+    def structured_query(self, keyword: str, writer: RecordWriter, deadline: float = TIMEOUT):
+        """综合查询的结构化输出：每个数据源完成时立即写出其记录"""
+        with span("query", keyword=keyword):
+            for item in self.stream_sources(keyword, deadline=deadline):
+                writer.write_all(self.source_records(keyword, item))
+                writer.flush()
+    
+    def comprehensive_query(self, keyword: str, deadline: float = TIMEOUT):
+        """综合查询：辞典 + API（并行执行，结果按完成顺序输出）"""
+        print("\n" + "="*70)
+        print(f"中国历史专家系统 - 综合查询")
+        print("="*70)
+        print(f"\n🔍 查询关键词: {keyword}\n")
+        print("📚 并行查询《中国历史大辞典》与古籍文献知识图谱API（人物、古籍；人物命中后追加诗词）...")
         
-        if book_result and not book_result.get('error'):
-            print("✓ 找到相关古籍")
-        else:
-            print("✗ 未找到相关古籍")
+        start = time.monotonic()
+        results: Dict[str, Any] = {}
+        with span("query", keyword=keyword):
+            for item in self.stream_sources(keyword, deadline=deadline):
+                self._print_source_result(keyword, item)
+                results[item.source] = item.result
         
         # 总结
         print("\n" + "="*70)
-        print("查询完成")
+        print(f"查询完成（耗时 {time.monotonic() - start:.2f} 秒）")
         print("="*70)
         
-        has_result = dict_result or (people_result and not people_result.get('error')) or (book_result and not book_result.get('error'))
+        has_any = any(has_result(results.get(source)) for source in ("dict", "people", "books", "expansion"))
         
-        if has_result:
+        if has_any:
             print("\n✓ 已找到相关资料，可以基于以上信息回答问题")
         else:
             print("\n✗ 未找到相关资料")
             print("\n💡 建议:")
             print("  • 检查关键词拼写")
-            print("  • 尝试使用同义词或别称")
-            print("  • 简化查询词（如'唐太宗李世民' → '李世民'）")
+            print("  • 尝试使用同义词或别称（简繁变体、去除称号、子串已自动试过）")
             print("  • 查询相关的更大类别")
         
         print()
 
-def main():
-    if len(sys.argv) < 2:
-        print("用法: python scripts/history_query.py <关键词>")
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        print("用法: python scripts/history_query.py [--format text|jsonl|msgpack] [--profile] <关键词>")
         print("\n示例:")
         print("  python scripts/history_query.py 李白")
         print("  python scripts/history_query.py 安史之乱")
         print("  python scripts/history_query.py 科举制度")
+        print("  python scripts/history_query.py --format jsonl 李白")
+        print("  python scripts/history_query.py --profile 李白")
         sys.exit(1)
     
-    keyword = sys.argv[1]
+    parser = argparse.ArgumentParser(prog="history_query.py", description="中国历史专家系统 - 综合查询工具")
+    parser.add_argument('keyword', help='查询关键词')
+    parser.add_argument('--format', choices=FORMATS, default=TEXT,
+                        help='输出格式：text（默认）；jsonl、msgpack 在每个数据源完成时逐条输出结构化记录')
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
     
     expert = HistoryExpert()
-    expert.comprehensive_query(keyword)
+    start = time.monotonic()
+    try:
+        if args.format != TEXT:
+            try:
+                expert.structured_query(args.keyword, open_writer(args.format))
+            except BrokenPipeError:
+                sys.exit(0)
+        else:
+            expert.comprehensive_query(args.keyword)
+    finally:
+        report_trace(args, time.monotonic() - start)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+按主题列表批量预热本地缓存
+
+学习前往往已知要查的主题（如某一朝代的全部人物）。本脚本对关键词文件中的
+每个主题执行与 history_query.py 相同的数据源组合（辞典、人物、古籍，人物命中后
+追加诗词），由有界线程池并行执行，结果落入响应缓存（response_cache.py）与
+本地知识库（knowledge_store.py），辞典词头索引也随之建好。之后的交互查询
+直接命中本地缓存。
+
+断点续跑：每完成一个主题就向检查点文件（默认为 `<关键词文件>.prefetch.jsonl`）
+追加一行；再次运行时跳过已完成的主题，只重试未完成的主题。只有每个数据源都
+得到正常响应（命中或未命中）的主题才算完成；有数据源超时或请求出错（如 5xx、
+连接失败）时该主题未完成，缓存也未预热。--restart 忽略检查点从头开始。
+
+使用示例：
+    python scripts/prefetch.py topics.txt
+    python scripts/prefetch.py topics.txt --workers 8 --deadline 20
+    cat topics.txt | python scripts/prefetch.py - --checkpoint /tmp/topics.prefetch.jsonl
+
+    # 结构化进度：每个主题一条 prefetch 记录，最后一条 summary 记录
+    python scripts/prefetch.py topics.txt --format jsonl
+
+    # 结束后输出分阶段耗时，并把累计指标写成 Prometheus 文本
+    python scripts/prefetch.py topics.txt --profile --trace-export /tmp/prefetch.prom
+"""
+
+import sys
+import os
+import argparse
+import json
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dict", "scripts"))
+
+from history_query import TIMEOUT, HistoryExpert, has_result, is_error
+from query_dict import read_keywords
+from structured_output import FORMATS, TEXT, open_writer
+from tracing import add_trace_arguments, report_trace, span
+
+# 默认并行主题数；每个主题内部另有各数据源的并行请求，实际请求速率受令牌桶限制
+DEFAULT_WORKERS = 4
+
+CHECKPOINT_SUFFIX = ".prefetch.jsonl"
+
+# 文本模式下每隔多少秒刷新一次进度行
+PROGRESS_INTERVAL = 1.0
+
+
+def checkpoint_path_for(path: str) -> Optional[str]:
+    """关键词文件对应的默认检查点路径；标准输入没有默认检查点"""
+    return None if path == "-" else path + CHECKPOINT_SUFFIX
+
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    """读取检查点中已完成的主题（末尾写了一半的行忽略）"""
+    done: Set[str] = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("complete"):
+                done.add(record["keyword"])
+    return done
+
+
+def open_checkpoint(path: str):
+    """以追加方式打开检查点；上次中断时留下写了一半的行时先补上换行，新记录另起一行"""
+    torn = False
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+    except FileNotFoundError:
+        pass
+    log = open(path, "a", encoding="utf-8")
+    if torn:
+        log.write("\n")
+    return log
+
+
+def prefetch_topic(expert: HistoryExpert, keyword: str, deadline: float) -> Dict[str, Any]:
+    """对一个主题跑完全部数据源，返回其进度记录；有数据源超时或出错时 complete 为 False"""
+    start = time.monotonic()
+    found: Dict[str, bool] = {}
+    timed_out = []
+    errors = []
+    with span("prefetch.topic", keyword=keyword):
+        for item in expert.stream_sources(keyword, deadline=deadline):
+            if item.timed_out:
+                timed_out.append(item.source)
+            elif is_error(item.result):
+                errors.append(item.source)
+            else:
+                found[item.source] = has_result(item.result)
+    return {"type": "prefetch", "keyword": keyword, "complete": not (timed_out or errors), "found": found,
+            "timed_out": timed_out, "errors": errors, "elapsed": round(time.monotonic() - start, 3)}
+
+
+class Prefetcher:
+    """有界并行地预热一组主题，并把完成情况追加到检查点"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, deadline: float = TIMEOUT,
+                 checkpoint: Optional[str] = None, expert: Optional[HistoryExpert] = None):
+        self.workers = max(1, workers)
+        self.deadline = deadline
+        self.checkpoint = checkpoint
+        self.expert = expert or HistoryExpert()
+        self.completed = 0
+        self.incomplete = 0
+        self.skipped = 0
+
+    def run(self, keywords: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """逐个产出已处理主题的进度记录（按完成顺序）；已在检查点中的主题跳过"""
+        from cnkgraph_client import ensure_pool_size
+
+        # 每个主题最多同时有 人物/古籍/诗词 三个 API 请求
+        ensure_pool_size(self.workers * 3)
+        done = load_checkpoint(self.checkpoint)
+        log = open_checkpoint(self.checkpoint) if self.checkpoint else None
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        # 最多同时提交 workers * 2 个主题，大文件不必一次读完
+        pending: Set[Any] = set()
+        seen: Set[str] = set()
+        keywords = iter(keywords)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.workers * 2:
+                    keyword = next(keywords, None)
+                    if keyword is None:
+                        exhausted = True
+                        break
+                    if keyword in done or keyword in seen:
+                        self.skipped += keyword in done
+                        continue
+                    seen.add(keyword)
+                    pending.add(executor.submit(contextvars.copy_context().run, prefetch_topic,
+                                                self.expert, keyword, self.deadline))
+                if not pending:
+                    return
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    if record["complete"]:
+                        self.completed += 1
+                    else:
+                        self.incomplete += 1
+                    if log is not None:
+                        log.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                        log.flush()
+                    yield record
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if log is not None:
+                log.close()
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="prefetch.py", description="按主题列表批量预热辞典、响应缓存与本地知识库")
+    parser.add_argument('input', help='关键词文件（每行一个主题，- 表示标准输入）')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f'并行主题数，默认 {DEFAULT_WORKERS}')
+    parser.add_argument('--deadline', type=float, default=TIMEOUT, help=f'每个主题的总时限（秒），默认 {TIMEOUT}')
+    parser.add_argument('--checkpoint', help='检查点文件，默认为 <关键词文件>.prefetch.jsonl')
+    parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    parser.add_argument('--format', choices=FORMATS, default=TEXT,
+                        help='输出格式：text（默认，进度行写到标准错误）；jsonl、msgpack 逐条输出 prefetch 记录')
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.input != '-' and not os.path.exists(args.input):
+        print(f"❌ 找不到关键词文件: {args.input}", file=sys.stderr)
+        sys.exit(1)
+    checkpoint = args.checkpoint or checkpoint_path_for(args.input)
+    if args.restart and checkpoint and os.path.exists(checkpoint):
+        os.unlink(checkpoint)
+
+    total = None
+    if args.input != '-':
+        with open(args.input, encoding='utf-8') as f:
+            total = len({line.strip() for line in f if line.strip()})
+
+    writer = open_writer(args.format) if args.format != TEXT else None
+    prefetcher = Prefetcher(workers=args.workers, deadline=args.deadline, checkpoint=checkpoint)
+    start = time.monotonic()
+    last_report = 0.0
+    try:
+        for record in prefetcher.run(read_keywords(args.input)):
+            if writer is not None:
+                writer.write(record)
+                writer.flush()
+                continue
+            now = time.monotonic()
+            if record["timed_out"]:
+                print(f"\n⏱  {record['keyword']}: {'、'.join(record['timed_out'])} 超时，下次运行时重试", file=sys.stderr)
+            if record["errors"]:
+                print(f"\n⚠️  {record['keyword']}: {'、'.join(record['errors'])} 请求出错，下次运行时重试", file=sys.stderr)
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                processed = prefetcher.completed + prefetcher.incomplete
+                rate = processed / max(now - start, 1e-9)
+                progress = f"{processed + prefetcher.skipped}/{total}" if total else f"{processed + prefetcher.skipped}"
+                eta = ""
+                if total and rate > 0:
+                    eta = f"，预计剩余 {_format_eta((total - processed - prefetcher.skipped) / rate)}"
+                print(f"\r📥 {progress}  {rate:.1f} 个/秒{eta}    ", end="", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        print("\n⚠️  已中断，已完成的主题已写入检查点，再次运行即可继续", file=sys.stderr)
+        report_trace(args, time.monotonic() - start)
+        sys.exit(130)
+    except BrokenPipeError:
+        sys.exit(0)
+
+    elapsed = time.monotonic() - start
+    processed = prefetcher.completed + prefetcher.incomplete
+    from cnkgraph_client import get_client
+    http = get_client().metrics()["http"]
+    summary = {
+        "type": "summary",
+        "completed": prefetcher.completed,
+        "incomplete": prefetcher.incomplete,
+        "skipped": prefetcher.skipped,
+        "elapsed": round(elapsed, 3),
+        "topics_per_second": round(processed / elapsed, 2) if elapsed > 0 else None,
+        "requests": http["requests"],
+        "checkpoint": checkpoint,
+    }
+    if writer is not None:
+        writer.write(summary)
+        writer.flush()
+    else:
+        print(f"\r✓ 预热完成：{prefetcher.completed} 个主题完成，{prefetcher.incomplete} 个未完成（超时或出错），"
+              f"{prefetcher.skipped} 个已在检查点中跳过", file=sys.stderr)
+        print(f"  耗时 {elapsed:.1f} 秒，{summary['topics_per_second'] or 0} 个/秒，"
+              f"实际发出 {http['requests']} 个 API 请求", file=sys.stderr)
+        if checkpoint:
+            print(f"  检查点：{checkpoint}", file=sys.stderr)
+    report_trace(args, elapsed)
+    if prefetcher.incomplete:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+查询扩展：综合查询未命中时自动生成候选词并并行试探
+
+以往辞典查不到「唐太宗李世民」时，只能按提示手工改查「李世民」「唐太宗」、
+换别称或简繁写法，一次问题要串行重试好几轮。本模块把这些改写自动化：
+
+1. 生成候选词（按可信度排序）
+   variant    简繁变体（蘇軾 → 苏轼）
+   title      去掉朝代、庙号、身份等前缀与尊称后缀（唐代诗人李白 → 李白），
+              以及被去掉的称号本身（唐太宗李世民 → 唐太宗）
+   phrase     去掉「的……」等修饰（李白的诗 → 李白）
+   contained  辞典中被查询词包含的词头（headword_search.py）
+   alias      释文提到查询词的词条（需全文索引；如以别号查到本人）
+   headword   辞典中的前缀、子串、模糊匹配词头
+   substring  查询词的连续子串（只用于 API 试探，且只试人物端点）
+2. 先在本地辞典逐个查候选（进程内查找，不访问网络），命中即返回
+3. 本地全部未命中时，在请求预算内把候选并行发往 /api/People 与 /api/Book/Find，
+   返回排序最靠前的可信命中：某个试探可信时，须等排在它前面的试探都完成且
+   不可信才返回，尚未开始的试探随即取消
+
+使用示例：
+    from query_expansion import expand_query
+
+    hit = expand_query("唐太宗李世民", reader=open_dictionary(DICT_PATH),
+                       probes={"people": expert.query_api_people, "find": expert.query_api_passages})
+    if hit:
+        print(hit.candidate, hit.reason, hit.source)
+"""
+
+import contextvars
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from zh_variants import fold
+
+# API 试探的默认请求预算与并行度
+DEFAULT_API_BUDGET = 6
+MAX_PARALLEL_PROBES = 4
+
+# 参与试探的连续子串个数上限（长的在前）
+MAX_SUBSTRINGS = 6
+
+# 子串多为无意义片段（唐代诗人李 → 古籍全文里总能搜到），只接受同名人物
+SUBSTRING_PROBES = ("people",)
+
+# 从辞典候选检索中取的词头数
+MAX_HEADWORD_CANDIDATES = 5
+
+LINK_PREFIX = "@@@LINK="
+
+_DYNASTIES = (
+    "西周 东周 春秋 战国 西汉 东汉 三国 西晋 东晋 南朝 北朝 北魏 东魏 西魏 北齐 北周 五代 "
+    "后梁 后唐 后晋 后汉 后周 北宋 南宋 西夏 民国 夏 商 周 秦 汉 魏 蜀 吴 晋 宋 齐 梁 陈 隋 唐 辽 金 元 明 清"
+).split()
+
+_TITLES = (
+    "开国皇帝 皇帝 皇后 皇太后 太后 太子 公主 宰相 丞相 大将军 将军 名将 名臣 大臣 宦官 "
+    "诗人 词人 文学家 史学家 思想家 政治家 军事家 哲学家 书法家 画家 学者 高僧 皇子 权臣"
+).split()
+
+_SUFFIXES = "先生 大师 皇帝 将军 丞相 大人 其人".split()
+
+# 朝代（可带 代/朝/末/初/初年/末年）、身份称谓，或两字庙号谥号（太宗、高祖、武帝）
+_PREFIX_RE = re.compile(
+    "(?:" + "|".join(sorted(_DYNASTIES, key=len, reverse=True)) + ")(?:初年|末年|代|朝|末|初)?"
+    "|" + "|".join(sorted(_TITLES, key=len, reverse=True))
+    + "|[一-鿿][宗祖帝]"
+)
+
+# 「X的Y」「X是谁」之类的修饰与提问
+_PHRASE_RE = re.compile("^(.{2,}?)(?:的.+|是谁|是什么|生平|简介|事迹)$")
+
+
+class Candidate(NamedTuple):
+    """一个改写后的候选词"""
+    word: str
+    reason: str
+
+
+class ExpansionHit(NamedTuple):
+    """扩展查询的命中结果"""
+    keyword: str
+    candidate: str
+    reason: str
+    source: str       # dict / people / find
+    data: Any         # 辞典释文或 API 结果
+    elapsed: float
+    probes: int       # 实际发出的 API 试探数
+
+
+def strip_titles(keyword: str) -> List[Candidate]:
+    """去掉前缀称谓与尊称后缀，返回核心名与被去掉的称号（均至少两字）"""
+    found: List[Candidate] = []
+    rest = keyword
+    while True:
+        match = _PREFIX_RE.match(rest)
+        if not match or len(rest) - match.end() < 2:
+            break
+        rest = rest[match.end():]
+    head = keyword[:len(keyword) - len(rest)]
+    for suffix in _SUFFIXES:
+        if rest.endswith(suffix) and len(rest) - len(suffix) >= 2:
+            rest = rest[:-len(suffix)]
+            break
+    if rest != keyword:
+        found.append(Candidate(rest, "title"))
+    # 被去掉的部分含庙号谥号时本身也是候选（唐太宗李世民 → 唐太宗）
+    if len(head) >= 2 and re.search("[宗祖帝]", head[1:]):
+        found.append(Candidate(head, "title"))
+    return found
+
+
+def substrings(keyword: str, limit: int = MAX_SUBSTRINGS) -> List[str]:
+    """至少两字的连续子串，长的在前、同长度按出现位置"""
+    words = []
+    for length in range(len(keyword) - 1, 1, -1):
+        for start in range(len(keyword) - length + 1):
+            words.append(keyword[start:start + length])
+            if len(words) >= limit:
+                return words
+    return words
+
+
+def generate_candidates(keyword: str, reader=None) -> List[Candidate]:
+    """按可信度生成候选词（不含原词，去重）；reader 为 MDXReader 时加入辞典词头类候选"""
+    keyword = keyword.strip()
+    candidates: List[Candidate] = []
+    seen = {keyword}
+
+    def add(word: str, reason: str):
+        if word and word not in seen:
+            seen.add(word)
+            candidates.append(Candidate(word, reason))
+
+    base = keyword
+    folded = fold(keyword)
+    if folded != keyword:
+        add(folded, "variant")
+        base = folded
+    phrase = _PHRASE_RE.match(base)
+    if phrase:
+        add(phrase.group(1), "phrase")
+        base = phrase.group(1)
+    for candidate in strip_titles(base):
+        add(candidate.word, candidate.reason)
+
+    if reader is not None:
+        for match in reader.search(base, mode="contained", limit=MAX_HEADWORD_CANDIDATES):
+            add(match.word, "contained")
+        try:
+            hits, _ = reader.fulltext_search(base, limit=MAX_HEADWORD_CANDIDATES)
+        except (FileNotFoundError, ValueError):
+            # 未构建全文索引时没有别称候选
+            hits = []
+        for hit in hits:
+            add(hit.word, "alias")
+        for match in reader.search(base, limit=MAX_HEADWORD_CANDIDATES):
+            add(match.word, "headword")
+
+    for word in substrings(base):
+        add(word, "substring")
+    return candidates
+
+
+def probe_dictionary(reader, keyword: str, candidates: List[Candidate],
+                     start: Optional[float] = None) -> Optional[ExpansionHit]:
+    """依次在本地辞典查候选，返回第一个命中（跟随 @@@LINK= 跳转）"""
+    start = time.monotonic() if start is None else start
+    for candidate in candidates:
+        word, definition = candidate.word, reader.lookup(candidate.word)
+        if definition is not None and definition.startswith(LINK_PREFIX):
+            word = definition[len(LINK_PREFIX):].strip()
+            definition = reader.lookup(word)
+        if definition is not None:
+            return ExpansionHit(keyword, word, candidate.reason, "dict", definition,
+                                time.monotonic() - start, 0)
+    return None
+
+
+def _has_data(result: Any) -> bool:
+    return bool(result) and not (isinstance(result, dict) and result.get("error"))
+
+
+def is_confident(source: str, word: str, result: Any) -> bool:
+    """API 试探结果是否可信：人物须同名（简繁归一化后），古籍片段须非空"""
+    if not _has_data(result):
+        return False
+    if source == "people":
+        if not isinstance(result, dict):
+            return False
+        name = result.get("Name") or result.get("name")
+        return isinstance(name, str) and fold(name) == fold(word)
+    if source == "find":
+        from passages import parse_passages
+        return bool(parse_passages(result))
+    return True
+
+
+def probe_plan(candidates: List[Candidate], probes: Dict[str, Callable[[str], Any]],
+               budget: int = DEFAULT_API_BUDGET) -> List[tuple]:
+    """按排序展开 (候选, 端点) 试探计划，截取前 budget 个；子串候选只试 SUBSTRING_PROBES"""
+    plan = []
+    for candidate in candidates:
+        for source in probes:
+            if candidate.reason == "substring" and source not in SUBSTRING_PROBES:
+                continue
+            plan.append((candidate, source))
+    return plan[:max(0, budget)]
+
+
+def probe_api(keyword: str, candidates: List[Candidate], probes: Dict[str, Callable[[str], Any]],
+              budget: int = DEFAULT_API_BUDGET, deadline: float = 10.0,
+              start: Optional[float] = None) -> Optional[ExpansionHit]:
+    """在 budget 个请求内并行试探（候选 × 端点，按候选可信度顺序），返回排序最靠前的可信命中
+
+    某个试探可信时，只有排在它前面的试探都已完成且不可信才返回，因此结果与
+    串行逐个试探相同，只是更快。超过 deadline 时返回已完成试探中排序最靠前的
+    可信命中（没有则返回 None）。返回后尚未开始的试探取消。
+    """
+    start = time.monotonic() if start is None else start
+    plan = probe_plan(candidates, probes, budget)
+    if not plan:
+        return None
+    end_time = time.monotonic() + deadline
+    executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_PROBES, len(plan)))
+    # 试探沿用当前上下文（追踪、守护进程的输出重定向）
+    futures = [executor.submit(contextvars.copy_context().run, probes[source], candidate.word)
+               for candidate, source in plan]
+    confident: Dict[int, Any] = {}
+
+    def hit(rank: int) -> ExpansionHit:
+        for future in futures[rank + 1:]:
+            future.cancel()
+        candidate, source = plan[rank]
+        launched = sum(1 for future in futures if not future.cancelled())
+        return ExpansionHit(keyword, candidate.word, candidate.reason, source, confident[rank],
+                            time.monotonic() - start, launched)
+
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=max(0, end_time - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                rank = futures.index(future)
+                candidate, source = plan[rank]
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+                if is_confident(source, candidate.word, result):
+                    confident[rank] = result
+            # 从头找第一个尚未确定为不可信的试探：可信即返回，未完成则继续等待
+            for rank, future in enumerate(futures):
+                if rank in confident:
+                    return hit(rank)
+                if not future.done():
+                    break
+        # 全部完成且无可信命中，或已超时
+        return hit(min(confident)) if confident else None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def expand_query(keyword: str, reader=None, probes: Optional[Dict[str, Callable[[str], Any]]] = None,
+                 budget: int = DEFAULT_API_BUDGET, deadline: float = 10.0) -> Optional[ExpansionHit]:
+    """生成候选词，先查本地辞典，未命中再在预算内并行试探 API；都未命中时返回 None"""
+    start = time.monotonic()
+    candidates = generate_candidates(keyword, reader)
+    if reader is not None:
+        hit = probe_dictionary(reader, keyword, candidates, start)
+        if hit is not None:
+            return hit
+    if not probes:
+        return None
+    remaining = deadline - (time.monotonic() - start)
+    # 辞典词头类候选已在本地试过；简繁变体与原词的 API 请求相同（人物名与缓存键均已归一化），
+    # API 只试其余改写得到的候选
+    rewritten = [c for c in candidates if c.reason in ("phrase", "title", "substring")]
+    return probe_api(keyword, rewritten, probes, budget=budget, deadline=max(0.1, remaining), start=start)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+结构化输出：供程序（Agent）直接读取的紧凑记录流
+
+history_query.py、query_dict.py 与 query_api.py 的 --format jsonl|msgpack 使用
+本模块：每条结果是一个带 "type" 字段的扁平记录，逐条写出（JSON Lines 每行一条，
+msgpack 为连续的 map 对象），下游无需解析面向人阅读的文本。
+
+记录类型：
+    entry       辞典词条   keyword, found, definition[, suggestions]
+    suggestion  候选词头   keyword, word, kind
+    hit         全文检索   query, word, score, snippet
+    passage     古籍片段   keyword, book, volume, previous, matched, later
+    book        古籍书目   keyword, title, count, data
+    poem        诗词       title, author, dynasty, content, data
+    person      人物       name, dynasty, data
+    event       事件       keyword, name, data
+    expansion   扩展查询命中  keyword, candidate, reason, source, elapsed, probes
+    error       错误       source, message
+    source      综合查询中一个数据源完成  source, found, elapsed, timed_out
+
+msgpack 为可选依赖：pip install msgpack
+"""
+
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+TEXT = "text"
+JSONL = "jsonl"
+MSGPACK = "msgpack"
+FORMATS = (TEXT, JSONL, MSGPACK)
+
+
+class RecordWriter:
+    """把记录逐条写到输出流；write 只写入缓冲，flush 后下游即可读到"""
+
+    def __init__(self, fmt: str = JSONL, stream=None):
+        if fmt not in (JSONL, MSGPACK):
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        self.format = fmt
+        stream = stream or sys.stdout
+        self.count = 0
+        if fmt == MSGPACK:
+            import msgpack
+            self._packer = msgpack.Packer(use_bin_type=True)
+            self._stream = stream.buffer
+        else:
+            self._packer = None
+            self._stream = stream
+
+    def write(self, record: Dict[str, Any]):
+        if self._packer is not None:
+            self._stream.write(self._packer.pack(record))
+        else:
+            self._stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        self._stream.flush()
+
+
+def open_writer(fmt: str, stream=None) -> RecordWriter:
+    """按格式创建 RecordWriter；未安装 msgpack 时提示并退出"""
+    try:
+        return RecordWriter(fmt, stream)
+    except ImportError:
+        print("❌ 未安装 msgpack，请运行: pip install msgpack（或改用 --format jsonl）", file=sys.stderr)
+        sys.exit(1)
+
+
+def _field(item: Dict[str, Any], *names: str) -> Any:
+    """按大小写两种写法取字段"""
+    for name in names:
+        for key in (name, name[:1].lower() + name[1:]):
+            value = item.get(key)
+            if value not in (None, ""):
+                return value
+    return None
+
+
+def entry_record(keyword: str, definition: Optional[str],
+                 suggestions: Optional[List[str]] = None) -> Dict[str, Any]:
+    record = {"type": "entry", "keyword": keyword, "found": definition is not None, "definition": definition}
+    if suggestions is not None:
+        record["suggestions"] = suggestions
+    return record
+
+
+def suggestion_record(keyword: str, word: str, kind: str) -> Dict[str, Any]:
+    return {"type": "suggestion", "keyword": keyword, "word": word, "kind": kind}
+
+
+def hit_record(query: str, word: str, score: Any, snippet: str) -> Dict[str, Any]:
+    return {"type": "hit", "query": query, "word": word, "score": score, "snippet": snippet}
+
+
+def passage_record(passage: Any, keyword: Optional[str] = None) -> Dict[str, Any]:
+    """古籍原文片段（passages.Passage，或带 Book/Volume 字段的片段 dict）"""
+    return {
+        "type": "passage",
+        "keyword": keyword,
+        "book": passage.get("Book"),
+        "volume": passage.get("Volume"),
+        "previous": passage.get("PreviousText"),
+        "matched": passage.get("MatchedText"),
+        "later": passage.get("LaterText"),
+    }
+
+
+def book_record(item: Any, keyword: Optional[str] = None) -> Dict[str, Any]:
+    """Book/Search 的一条书目"""
+    if not isinstance(item, dict):
+        return {"type": "book", "keyword": keyword, "title": item, "count": None, "data": None}
+    return {"type": "book", "keyword": keyword, "title": _field(item, "Title", "Name", "Book"),
+            "count": _field(item, "Count", "Total"), "data": item}
+
+
+def poem_record(item: Any) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        return {"type": "poem", "title": None, "author": None, "dynasty": None, "content": item, "data": None}
+    return {"type": "poem", "title": _field(item, "Title"), "author": _field(item, "Author"),
+            "dynasty": _field(item, "Dynasty"), "content": _field(item, "Content"), "data": item}
+
+
+def person_record(data: Any, name: Optional[str] = None) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        return {"type": "person", "name": name, "dynasty": None, "data": data}
+    return {"type": "person", "name": _field(data, "Name") or name, "dynasty": _field(data, "Dynasty"), "data": data}
+
+
+def event_record(item: Any, keyword: Optional[str] = None) -> Dict[str, Any]:
+    name = _field(item, "Name", "Title") if isinstance(item, dict) else item
+    return {"type": "event", "keyword": keyword, "name": name, "data": item}
+
+
+def expansion_record(keyword: str, candidate: str, reason: str, source: str,
+                     elapsed: float, probes: int) -> Dict[str, Any]:
+    """原词未命中时自动扩展查询的命中（query_expansion.py）；其后跟随命中数据源的常规记录"""
+    return {"type": "expansion", "keyword": keyword, "candidate": candidate, "reason": reason,
+            "source": source, "elapsed": round(elapsed, 3), "probes": probes}
+
+
+def error_record(source: str, message: Any) -> Dict[str, Any]:
+    return {"type": "error", "source": source, "message": str(message)}
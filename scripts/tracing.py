@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+分阶段耗时追踪与指标导出
+
+综合查询慢时，以往无从判断时间花在辞典、DNS/TLS 建连、服务器处理还是 JSON
+解析上。本模块提供进程内共享的 Tracer：
+
+- span(name, **属性)：计时一个阶段，嵌套的 span 自动记录父子关系
+  （同一线程内；提交到线程池的任务用 traced() 包装后沿用提交时的上下文）
+- record(name, seconds)：登记在别处测得的阶段耗时（如 HTTP 的首字节时间）
+- count(name, **标签)：计数器（如缓存命中/未命中）
+
+每个阶段按名称累计次数、总耗时、最大值与直方图；最近的 span 保留在有界
+队列中。可导出为 Prometheus 文本格式（供 node_exporter textfile 收集器等读取）
+或 OpenTelemetry（OTLP）风格的 JSON。
+
+已埋点的阶段：
+    query / source.<数据源>               综合查询与其各数据源（history_query.py）
+    dict.open / dict.lookup / dict.search / dict.fulltext / dict.block_decode
+                                            辞典（mdx_reader.py）
+    prefetch.topic                          预热的一个主题（prefetch.py）
+    api.call / cache.lookup                 cnkgraph 调用与响应缓存查找（cnkgraph_client.py）
+    store.lookup                            本地知识库查找（knowledge_store.py）
+    http.request / http.connect / http.tcp  一次 HTTP 请求；新建连接（含 TLS）；其中的 DNS+TCP
+    http.ttfb / http.download / http.decode 发出请求到收到响应头；读取响应体；JSON 解析
+    http.throttle / http.backoff            限速等待；重试退避
+
+设置环境变量 HISTORY_TRACE=0 可关闭追踪。
+
+使用示例：
+    from tracing import count, get_tracer, span
+
+    with span("dict.lookup", keyword="李白"):
+        ...
+    count("cache", cache="cnkgraph", result="hit")
+    print(get_tracer().profile_table())
+
+命令行：history_query.py、query_dict.py、query_api.py 与 prefetch.py 支持
+--profile（结束后在标准错误输出分阶段耗时）与 --trace-export PATH
+（.prom/.txt 写 Prometheus 文本，其余写 OTLP JSON）。
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# 直方图上界（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 保留的最近 span 数；阶段统计不受此限制
+DEFAULT_MAX_SPANS = 4096
+
+SERVICE_NAME = "history-agent-skills"
+
+PROMETHEUS_SUFFIXES = (".prom", ".txt")
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("history_trace_span", default=None)
+
+
+class Span:
+    """一个已开始的阶段；结束后 duration 为耗时（秒）"""
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id",
+                 "start_ns", "end_ns", "duration", "error")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.attributes = attributes
+        # 标识只在导出时格式化为十六进制
+        self.trace_id = parent.trace_id if parent is not None else random.getrandbits(128)
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns = self.start_ns
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        """补充属性（如响应状态码）"""
+        self.attributes.update(attributes)
+
+
+class StageStats:
+    """一个阶段的累计统计"""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"count": self.count, "total": round(self.total, 6),
+                "avg": round(self.total / self.count, 6) if self.count else 0.0,
+                "max": round(self.max, 6)}
+
+
+class Tracer:
+    """线程安全的阶段统计与 span 收集器"""
+
+    def __init__(self, enabled: bool = True, max_spans: int = DEFAULT_MAX_SPANS):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans: "deque[Span]" = deque(maxlen=max_spans)
+        self._stages: Dict[str, StageStats] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self.started_ns = time.time_ns()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """计时 with 块；关闭追踪时产出 None"""
+        if not self.enabled:
+            yield None
+            return
+        current = Span(name, attributes, _current.get())
+        token = _current.set(current)
+        start = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.error = type(e).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter() - start
+            current.end_ns = current.start_ns + int(current.duration * 1e9)
+            _current.reset(token)
+            self._finish(current)
+
+    def record(self, name: str, seconds: float, **attributes: Any):
+        """登记一个已测得耗时的阶段（作为当前 span 的子 span，截止于此刻）"""
+        if not self.enabled:
+            return
+        finished = Span(name, attributes, _current.get())
+        finished.duration = max(0.0, seconds)
+        finished.end_ns = finished.start_ns
+        finished.start_ns -= int(finished.duration * 1e9)
+        self._finish(finished)
+
+    def count(self, name: str, value: int = 1, **labels: Any):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _finish(self, finished: Span):
+        with self._lock:
+            self._spans.append(finished)
+            stats = self._stages.get(finished.name)
+            if stats is None:
+                stats = self._stages[finished.name] = StageStats()
+            stats.add(finished.duration)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._stages.clear()
+            self._counters.clear()
+            self.started_ns = time.time_ns()
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def stages(self) -> Dict[str, Dict[str, Any]]:
+        """各阶段的 次数/总耗时/平均/最大（秒）"""
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in sorted(self._stages.items())}
+
+    def counters(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"stages": self.stages(), "counters": self.counters()}
+
+    def profile_table(self, wall: Optional[float] = None) -> str:
+        """面向人阅读的分阶段耗时表（按总耗时降序）"""
+        stages = sorted(self.stages().items(), key=lambda item: -item[1]["total"])
+        header = "⏱  分阶段耗时" + (f"（墙钟 {wall:.3f} 秒；并行阶段的合计可超过墙钟时间）" if wall is not None else "")
+        lines = [header, "  " + _pad("阶段", 20) + _pad("次数", 6, True) + _pad("合计(ms)", 12, True)
+                 + _pad("平均(ms)", 11, True) + _pad("最大(ms)", 11, True)]
+        for name, stats in stages:
+            lines.append(f"  {name:<20}{stats['count']:>6}{stats['total'] * 1000:>12.1f}"
+                         f"{stats['avg'] * 1000:>11.2f}{stats['max'] * 1000:>11.2f}")
+        if not stages:
+            lines.append("  （无记录）" if self.enabled else "  （追踪已关闭：HISTORY_TRACE=0）")
+        counters = self.counters()
+        if counters:
+            lines.append("  计数:")
+            for counter in counters:
+                labels = ", ".join(f"{k}={v}" for k, v in counter["labels"].items())
+                lines.append(f"    {counter['name']}{{{labels}}} {counter['value']}")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式：阶段耗时直方图 history_stage_seconds 与各计数器 history_<name>_total"""
+        lines = ["# HELP history_stage_seconds Latency of each query pipeline stage.",
+                 "# TYPE history_stage_seconds histogram"]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            counters = sorted(self._counters.items())
+        for name, stats in stages:
+            stage = _prom_label(name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, stats.buckets):
+                cumulative += n
+                lines.append(f'history_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'history_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats.count}')
+            lines.append(f'history_stage_seconds_sum{{stage="{stage}"}} {stats.total:.6f}')
+            lines.append(f'history_stage_seconds_count{{stage="{stage}"}} {stats.count}')
+        declared = set()
+        for (name, labels), value in counters:
+            metric = "history_" + "".join(c if c.isalnum() else "_" for c in name) + "_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            rendered = ",".join(f'{k}="{_prom_label(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{rendered}}} {value}" if rendered else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_otel(self) -> Dict[str, Any]:
+        """OTLP JSON：resourceSpans（最近的 span）与 resourceMetrics（阶段直方图与计数器）"""
+        resource = {"attributes": [_otel_attribute("service.name", SERVICE_NAME)]}
+        scope = {"name": SERVICE_NAME}
+        spans = []
+        for item in self.spans():
+            record: Dict[str, Any] = {
+                "traceId": f"{item.trace_id:032x}",
+                "spanId": f"{item.span_id:016x}",
+                "name": item.name,
+                # SPAN_KIND_CLIENT 为 3，其余为 SPAN_KIND_INTERNAL
+                "kind": 3 if item.name == "http.request" else 1,
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns),
+                "attributes": [_otel_attribute(k, v) for k, v in item.attributes.items()],
+                "status": {"code": 2, "message": item.error} if item.error else {},
+            }
+            if item.parent_id is not None:
+                record["parentSpanId"] = f"{item.parent_id:016x}"
+            spans.append(record)
+
+        now = str(time.time_ns())
+        start = str(self.started_ns)
+        with self._lock:
+            stages = sorted(self._stages.items())
+            counters = sorted(self._counters.items())
+        histogram_points = [{
+            "attributes": [_otel_attribute("stage", name)],
+            "startTimeUnixNano": start,
+            "timeUnixNano": now,
+            "count": str(stats.count),
+            "sum": stats.total,
+            "max": stats.max,
+            "bucketCounts": [str(n) for n in stats.buckets],
+            "explicitBounds": list(BUCKETS),
+        } for name, stats in stages]
+        metrics: List[Dict[str, Any]] = [{
+            "name": "history.stage.duration",
+            "unit": "s",
+            # AGGREGATION_TEMPORALITY_CUMULATIVE
+            "histogram": {"aggregationTemporality": 2, "dataPoints": histogram_points},
+        }]
+        by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for (name, labels), value in counters:
+            by_name.setdefault(name, []).append({
+                "attributes": [_otel_attribute(k, v) for k, v in labels],
+                "startTimeUnixNano": start,
+                "timeUnixNano": now,
+                "asInt": str(value),
+            })
+        for name, points in by_name.items():
+            metrics.append({"name": f"history.{name}", "sum": {
+                "aggregationTemporality": 2, "isMonotonic": True, "dataPoints": points}})
+        return {
+            "resourceSpans": [{"resource": resource, "scopeSpans": [{"scope": scope, "spans": spans}]}],
+            "resourceMetrics": [{"resource": resource, "scopeMetrics": [{"scope": scope, "metrics": metrics}]}],
+        }
+
+    def export(self, path: str):
+        """按扩展名写出：.prom/.txt 为 Prometheus 文本，其余为 OTLP JSON（原子替换，收集器不会读到半个文件）"""
+        if path.endswith(PROMETHEUS_SUFFIXES):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_otel(), ensure_ascii=False, indent=2) + "\n"
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".trace-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    """按终端显示宽度补齐（全角字符占两列）"""
+    shown = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    padding = " " * max(0, width - shown)
+    return padding + text if right else text + padding
+
+
+def _prom_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _otel_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+_tracer = Tracer(enabled=os.environ.get("HISTORY_TRACE", "1").strip().lower() not in ("0", "false", "no", "off"))
+
+
+def get_tracer() -> Tracer:
+    """返回进程内共享的 Tracer"""
+    return _tracer
+
+
+def span(name: str, **attributes: Any):
+    return _tracer.span(name, **attributes)
+
+
+def record(name: str, seconds: float, **attributes: Any):
+    _tracer.record(name, seconds, **attributes)
+
+
+def count(name: str, value: int = 1, **labels: Any):
+    _tracer.count(name, value, **labels)
+
+
+def traced(name: str, fn: Callable, **attributes: Any) -> Callable:
+    """包装提交到线程池的函数：在提交时的上下文中运行，并计时为 name 阶段"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        def inner():
+            with _tracer.span(name, **attributes):
+                return fn(*args, **kwargs)
+        return context.copy().run(inner)
+    return run
+
+
+def add_trace_arguments(parser):
+    """为命令行脚本添加 --profile 与 --trace-export 选项"""
+    parser.add_argument('--profile', action='store_true', help='结束后在标准错误输出分阶段耗时（辞典、建连、首字节、解析、缓存命中等）')
+    parser.add_argument('--trace-export', metavar='PATH',
+                        help='结束后导出追踪数据：.prom/.txt 为 Prometheus 文本格式，其余为 OpenTelemetry JSON')
+
+
+def report_trace(args, wall: Optional[float] = None):
+    """按 --profile / --trace-export 输出本进程的追踪数据"""
+    if getattr(args, "profile", False):
+        print(_tracer.profile_table(wall), file=sys.stderr)
+    path = getattr(args, "trace_export", None)
+    if path:
+        try:
+            _tracer.export(path)
+        except OSError as e:
+            print(f"⚠️  导出追踪数据出错: {e}", file=sys.stderr)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+简繁归一化：把繁体字逐字折叠为简体，作为辞典词头与 API 缓存键的统一形式
+
+cnkgraph 默认返回简体（Accept-Language: zh-hant 时返回繁体），辞典词头则简繁
+都有。以往「蘇軾」查不到时需要手动改成「苏轼」重查；现在辞典读取器与响应缓存
+都按 fold() 之后的键建索引，两种写法一次查询即可命中同一条目。
+
+对照表 zh_ts_chars.txt 由 OpenCC 的单字表预先生成（见文件头），首次调用时
+加载为 str.translate 所用的码位映射，之后每次折叠只是一次 translate。
+只做单字转换，不处理词组级的异形（如「乾隆」中的「乾」保持原字）。
+
+使用示例：
+    from zh_variants import fold
+
+    fold("蘇軾")   # → "苏轼"
+    fold("苏轼")   # → "苏轼"（已是简体时原样返回）
+"""
+
+import os
+import zlib
+from functools import lru_cache
+from typing import Dict
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zh_ts_chars.txt")
+
+
+@lru_cache(maxsize=None)
+def load_table(path: str = TABLE_PATH) -> Dict[int, str]:
+    """读取对照表，返回 繁体码位 -> 简体字 的映射"""
+    table: Dict[int, str] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            traditional, simplified = line.rstrip("\n").split("\t")
+            table[ord(traditional)] = simplified
+    return table
+
+
+@lru_cache(maxsize=None)
+def table_version(path: str = TABLE_PATH) -> str:
+    """对照表内容的校验值；持久化的归一化索引据此判断是否需要重建"""
+    with open(path, "rb") as f:
+        return format(zlib.crc32(f.read()), "08x")
+
+
+def fold(text: str) -> str:
+    """把繁体字折叠为简体；其余字符原样保留"""
+    return text.translate(load_table())
@@ -19,25 +19,12 @@ def test_imports():
         print("✗ requests 未安装，请运行: pip install requests")
         return False
     
-    # 注意: mdict-utils 是命令行工具，不是Python包
-    # 我们通过检查命令是否可用来验证
-    import subprocess
+    # 辞典脚本在进程内使用 mdict-utils 的解析器，不再依赖 mdict 命令
     try:
-        result = subprocess.run(
-            ["mdict", "--version"],
-            capture_output=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            print("✓ mdict-utils 已安装")
-        else:
-            print("✗ mdict-utils 可能未正确安装")
-            return False
-    except FileNotFoundError:
-        print("✗ mdict 命令未找到，请运行: pip install mdict-utils")
-        return False
-    except Exception as e:
-        print(f"✗ 检查 mdict 时出错: {e}")
+        import mdict_utils
+        print("✓ mdict-utils 已安装")
+    except ImportError:
+        print("✗ mdict-utils 未安装，请运行: pip install mdict-utils")
         return False
     
     return True
@@ -50,8 +37,34 @@ def test_files():
         "dict/历史辞典4合1.mdx",
         "dict/历史辞典4in1.mdd",
         "dict/scripts/query_dict.py",
+        "dict/scripts/mdx_reader.py",
+        "dict/scripts/mdx_index.py",
+        "dict/scripts/headword_search.py",
+        "dict/scripts/fulltext_index.py",
         "cnkgraph/scripts/query_api.py",
+        "cnkgraph/scripts/cnkgraph_client.py",
+        "cnkgraph/scripts/async_query_api.py",
+        "cnkgraph/scripts/response_cache.py",
+        "cnkgraph/scripts/endpoint_methods.py",
+        "cnkgraph/scripts/knowledge_store.py",
+        "cnkgraph/scripts/pagination.py",
+        "cnkgraph/scripts/passages.py",
+        "cnkgraph/scripts/passage_merge.py",
+        "cnkgraph/scripts/singleflight.py",
+        "cnkgraph/scripts/rate_limit.py",
+        "cnkgraph/scripts/replay.py",
+        "cnkgraph/scripts/http_timing.py",
+        "cnkgraph/scripts/standin_server.py",
         "scripts/history_query.py",
+        "scripts/history_daemon.py",
+        "scripts/daemon_client.py",
+        "scripts/structured_output.py",
+        "scripts/prefetch.py",
+        "scripts/query_expansion.py",
+        "scripts/tracing.py",
+        "scripts/zh_variants.py",
+        "scripts/zh_ts_chars.txt",
+        "scripts/benchmark.py",
         "SKILL.md",
         "dict/SKILL.md",
         "cnkgraph/SKILL.md"
@@ -0,0 +1,39 @@
+"""
+行为测试的公共设置：把三个脚本目录加入模块搜索路径，并提供生成小型 MDX 辞典的夹具
+
+运行: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _dir in ("scripts", "cnkgraph/scripts", "dict/scripts"):
+    if os.path.join(ROOT, _dir) not in sys.path:
+        sys.path.insert(0, os.path.join(ROOT, _dir))
+
+
+@pytest.fixture
+def make_mdx(tmp_path):
+    """按 {词头: 释文} 写出 MDX 文件并返回路径（需要 mdict-utils）"""
+    pytest.importorskip("mdict_utils")
+    from mdict_utils.base.writemdict import MDictWriter
+
+    def make(entries, name="test.mdx"):
+        path = str(tmp_path / name)
+        with open(path, "wb") as f:
+            MDictWriter(entries, title="测试", description="test", version="2.0").write(f)
+        return path
+
+    return make
+
+
+@pytest.fixture(autouse=True)
+def _isolated_state(tmp_path, monkeypatch):
+    """每个测试使用独立的缓存、知识库与端点记录文件，不触及用户目录"""
+    monkeypatch.setenv("CNKGRAPH_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setenv("CNKGRAPH_STORE_PATH", str(tmp_path / "store.db"))
+    monkeypatch.setenv("CNKGRAPH_ENDPOINTS_PATH", str(tmp_path / "endpoints.json"))
+    monkeypatch.setenv("HISTORY_DAEMON", "0")
@@ -0,0 +1,93 @@
+"""守护进程：转发调用的输出（含线程池中打印的部分）回到发起请求的客户端"""
+
+import contextvars
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import history_daemon
+from daemon_client import connect, forwarded_env, send_request
+from history_query import HistoryExpert, api_failure
+from tracing import traced
+
+
+@pytest.fixture
+def daemon(tmp_path, capsys):
+    """在后台线程运行的守护进程，自己的输出（日志）由 capsys 捕获"""
+    server = history_daemon.DaemonServer(str(tmp_path / "d.sock"), idle_timeout=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def call(server, command, argv):
+    """转发一次调用，返回 (stdout, stderr, 退出码)
+
+    调用期间 sys.stdout/stderr 与 serve() 中一样换成按上下文分派的流
+    （capsys 在每个测试阶段开始时会重新接管 sys.stdout，因此不在 fixture 中替换）。
+    """
+    request = {"command": command, "argv": argv, "cwd": server.cwd, "env": forwarded_env()}
+    out, err, code = [], [], None
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = server.stdout, server.stderr
+    try:
+        for message in send_request(connect(server.socket_file), request):
+            out.append(message.get("out", ""))
+            err.append(message.get("err", ""))
+            code = message.get("exit", code)
+    finally:
+        sys.stdout, sys.stderr = saved
+    return "".join(out), "".join(err), code
+
+
+def test_output_from_pool_threads_reaches_client(daemon, capsys):
+    def main(argv):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for i in range(8):
+                executor.submit(traced("test.echo", print), f"行{i}")
+            executor.submit(traced("test.warn", print), "警告", file=sys.stderr)
+        print("完成")
+
+    daemon.commands["echo"] = main
+    out, err, code = call(daemon, "echo", [])
+    assert code == 0
+    assert sorted(out.splitlines()) == sorted([f"行{i}" for i in range(8)] + ["完成"])
+    assert err == "警告\n"
+    # 守护进程自己的输出（日志）中没有这次调用的内容
+    assert "行" not in capsys.readouterr().out
+
+
+def test_forwarded_history_query_warnings_from_sources(daemon, monkeypatch, capsys):
+    def failing(label):
+        def query(self, *args, **kwargs):
+            return api_failure(label, ConnectionError("refused"))
+        return query
+
+    monkeypatch.setattr(HistoryExpert, "query_dictionary", lambda self, keyword: "唐代诗人")
+    monkeypatch.setattr(HistoryExpert, "query_api_people", failing("人物查询"))
+    monkeypatch.setattr(HistoryExpert, "query_api_books", failing("古籍查询"))
+    out, err, code = call(daemon, "history_query", ["李白"])
+    assert code == 0
+    assert "「唐代诗人」" in out and "✗ 查询出错: refused" in out
+    assert "⚠️  人物查询出错: refused" in err and "⚠️  古籍查询出错: refused" in err
+    assert "出错" not in capsys.readouterr().err
+
+
+def test_context_stream_targets_follow_context():
+    log, target = io.StringIO(), io.StringIO()
+    stream = history_daemon._ContextStream("test_stream", log)
+    token = stream.redirect(target)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(contextvars.copy_context().run, stream.write, "请求\n").result()
+            # 不沿用上下文的线程写入原输出
+            executor.submit(stream.write, "日志\n").result()
+    finally:
+        stream.restore(token)
+    stream.write("之后\n")
+    assert target.getvalue() == "请求\n"
+    assert log.getvalue() == "日志\n之后\n"
@@ -0,0 +1,91 @@
+"""端点请求方式：405 后改用下一个候选、学到的方式直接使用、失效重探、按主机区分与持久化"""
+
+import json
+
+import pytest
+import requests
+
+from cnkgraph_client import CnkgraphClient
+from endpoint_methods import EndpointMethods, endpoint_key, load_swagger, swagger_url
+from standin_server import serve_in_thread
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@pytest.fixture
+def standin():
+    server, base_url = serve_in_thread()
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+def event_forms(keyword):
+    return [("GET", {"params": {"keyword": keyword}}),
+            ("POST", {"json": keyword, "headers": dict(JSON_HEADERS)})]
+
+
+def test_endpoint_key_includes_scheme_and_host():
+    assert endpoint_key("https://open.cnkgraph.com/api/Book/Find") == "https://open.cnkgraph.com/Book/Find"
+    assert endpoint_key("http://127.0.0.1:8765/api/People/%E6%9D%8E%E7%99%BD") == "http://127.0.0.1:8765/People"
+    assert swagger_url("https://open.cnkgraph.com/api") == "https://open.cnkgraph.com/swagger/v1/swagger.json"
+
+
+def test_405_falls_back_then_learned_method_is_used_directly(standin, tmp_path):
+    path = str(tmp_path / "endpoints.json")
+    client = CnkgraphClient(endpoints=EndpointMethods(path))
+    url = f"{standin}/Event/Search"
+    assert client.request_negotiated(url, event_forms("安史之乱")) == {"Result": [{"Name": "安史之乱"}]}
+    assert client.endpoints.get(url) == "POST"
+    client.request_negotiated(url, event_forms("玄武门之变"))
+    metrics = client.metrics()
+    # 第二次不再先 GET：只有第一次得到 405
+    assert metrics["http"]["statuses"] == {"405": 1, "200": 2}
+    assert metrics["endpoints"]["learned"] == 1 and metrics["endpoints"]["saved_round_trips"] == 1
+
+    # 新进程读取持久化的记录
+    assert EndpointMethods(path).get(url) == "POST"
+    # 按主机区分：替身上学到的方式不影响线上 API
+    assert EndpointMethods(path).get("https://open.cnkgraph.com/api/Event/Search") is None
+
+
+def test_stale_method_is_forgotten_and_renegotiated(standin):
+    endpoints = EndpointMethods(None)
+    url = f"{standin}/Event/Search"
+    endpoints.learn(url, "GET")
+    client = CnkgraphClient(endpoints=endpoints)
+    assert client.request_negotiated(url, list(reversed(event_forms("安史之乱"))))["Result"]
+    assert endpoints.get(url) == "POST"
+    assert client.metrics()["http"]["statuses"] == {"405": 1, "200": 1}
+
+
+def test_other_errors_are_raised_without_learning(standin):
+    client = CnkgraphClient(endpoints=EndpointMethods(None))
+    url = f"{standin}/Missing/Search"
+    with pytest.raises(requests.exceptions.HTTPError) as exc:
+        client.request_negotiated(url, event_forms("安史之乱"))
+    assert exc.value.response.status_code == 404
+    assert client.endpoints.snapshot() == {}
+
+
+def test_swagger_registers_single_method_endpoints(standin):
+    client = CnkgraphClient(endpoints=EndpointMethods(None))
+    assert load_swagger(client, standin) == 4
+    assert client.endpoints.get(f"{standin}/Book/Find") == "POST"
+    assert client.endpoints.get(f"{standin}/People/李白") == "GET"
+    # Event/Search 不在 Swagger 中
+    assert client.endpoints.get(f"{standin}/Event/Search") is None
+
+
+def test_load_skips_legacy_and_invalid_records(tmp_path, capsys):
+    path = tmp_path / "endpoints.json"
+    path.write_text(json.dumps({"Event/Search": "POST", "https://h/Book/Find": "FETCH",
+                                "https://h/Event/Search": "POST"}), encoding="utf-8")
+    assert EndpointMethods(str(path)).snapshot() == {"https://h/Event/Search": "POST"}
+    path.write_text("{", encoding="utf-8")
+    assert EndpointMethods(str(path)).snapshot() == {}
+    assert "端点记录不可用" in capsys.readouterr().err
+    endpoints = EndpointMethods(str(path))
+    endpoints.learn("https://h/api/Event/Search", "post")
+    endpoints.clear()
+    assert not path.exists() and endpoints.snapshot() == {}
@@ -0,0 +1,78 @@
+"""释文全文索引：构建、布尔检索、短语与过期检测"""
+
+import os
+
+import pytest
+
+from fulltext_index import build_fulltext, fulltext_path_for, parse_query, plain_text
+from mdx_reader import MDXReader
+
+ENTRIES = {
+    "安禄山": "<p>唐玄宗时任<b>河北节度使</b>，后起兵叛乱。</p>",
+    "史思明": "<p>安禄山部将，亦任河北节度使。</p>",
+    "田承嗣": "<p>魏博节度使，据河北三镇之一。</p>",
+    "韩愈": "<p>唐代文学家，曾任观察使幕僚。</p>",
+    "李白": "<p>唐代诗人。</p>",
+}
+
+
+@pytest.fixture
+def reader(make_mdx):
+    reader = MDXReader(make_mdx(ENTRIES))
+    build_fulltext(reader)
+    return reader
+
+
+def words(hits):
+    return sorted(hit.word for hit in hits)
+
+
+def test_parse_query():
+    assert parse_query("节度使 河北") == [["节度使", "河北"]]
+    assert parse_query("节度使 OR 观察使 | 刺史") == [["节度使"], ["观察使"], ["刺史"]]
+    assert parse_query('"河北 节度使" AND 叛乱') == [["河北节度使", "叛乱"]]
+    assert parse_query('"李白 OR 杜甫"') == [["李白OR杜甫"]]
+
+
+def test_plain_text_strips_markup():
+    assert plain_text("<p>任<b>河北</b>&amp;节度使</p>") == "任 河北 &节度使"
+
+
+def test_build_writes_sidecar(reader):
+    assert os.path.exists(fulltext_path_for(reader.path))
+
+
+def test_and_or(reader):
+    hits, total = reader.fulltext_search("节度使 河北")
+    assert words(hits) == ["史思明", "安禄山", "田承嗣"]
+    assert total >= len(hits)
+    hits, _ = reader.fulltext_search("观察使 OR 诗人")
+    assert words(hits) == ["李白", "韩愈"]
+    hits, _ = reader.fulltext_search("不存在的词")
+    assert hits == []
+
+
+def test_phrase_ignores_whitespace_and_requires_adjacency(reader):
+    phrase, _ = reader.fulltext_search('"河北 节度使"')
+    assert words(phrase) == ["史思明", "安禄山"]
+    bare, _ = reader.fulltext_search("河北节度使")
+    assert words(bare) == words(phrase)
+    # 不加引号时是 AND，田承嗣（两词不相邻）也命中
+    assert "田承嗣" in words(reader.fulltext_search("河北 节度使")[0])
+
+
+def test_hits_are_ranked_and_limited(reader):
+    hits, _ = reader.fulltext_search("节度使", limit=2)
+    assert len(hits) == 2
+    assert hits[0].score >= hits[1].score
+    assert "节度使" in hits[0].snippet
+
+
+def test_missing_and_stale_index(make_mdx):
+    path = make_mdx({"李白": "唐代诗人"}, name="other.mdx")
+    with pytest.raises(FileNotFoundError):
+        MDXReader(path).fulltext_search("诗人")
+    build_fulltext(MDXReader(path))
+    make_mdx({"李白": "唐代诗人", "杜甫": "唐代诗人"}, name="other.mdx")
+    with pytest.raises(FileNotFoundError, match="过期"):
+        MDXReader(path).fulltext_search("诗人")
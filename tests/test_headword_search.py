@@ -0,0 +1,73 @@
+"""辞典词头检索：前缀、子串、被包含、模糊与 auto 合并"""
+
+import pytest
+
+from headword_search import edit_distance
+from mdx_reader import MDXReader
+
+ENTRIES = {
+    "李世民": "唐太宗",
+    "李世民传": "传记",
+    "李世勣": "唐初名将",
+    "唐太宗": "李世民",
+    "太宗": "庙号",
+    "贞观李世民遗事": "笔记",
+    "安史之乱": "唐中期叛乱",
+    "李白": "唐代诗人",
+}
+
+
+@pytest.fixture
+def reader(make_mdx):
+    return MDXReader(make_mdx(ENTRIES))
+
+
+def words(matches):
+    return [m.word for m in matches]
+
+
+def test_edit_distance():
+    assert edit_distance("李世民", "李世民") == 0
+    assert edit_distance("李世民", "李世明") == 1
+    assert edit_distance("李世民", "李世") == 1
+    assert edit_distance("安史之乱", "李白", max_distance=1) == 2
+
+
+def test_prefix_excludes_exact_and_puts_short_words_first(reader):
+    matches = reader.search("李世", mode="prefix")
+    # 同长度按词头排序
+    assert words(matches) == ["李世勣", "李世民", "李世民传"]
+    assert {m.kind for m in matches} == {"prefix"}
+    assert "李世民" not in words(reader.search("李世民", mode="prefix"))
+
+
+def test_substring(reader):
+    assert words(reader.search("世民", mode="substring")) == ["李世民", "李世民传", "贞观李世民遗事"]
+    assert reader.search("不存在", mode="substring") == []
+
+
+def test_contained_prefers_longer_headwords(reader):
+    matches = reader.search("唐太宗李世民", mode="contained")
+    assert words(matches) == ["唐太宗", "李世民", "太宗"]
+    assert [m.distance for m in matches] == [3, 3, 4]
+
+
+def test_fuzzy(reader):
+    matches = reader.search("李世明", mode="fuzzy")
+    assert words(matches)[:2] == ["李世勣", "李世民"]
+    assert [m.distance for m in matches[:2]] == [1, 1]
+    assert "安史之乱" not in words(matches)
+    assert reader.search("李", mode="fuzzy") == []
+
+
+def test_auto_puts_exact_first_and_interleaves(reader):
+    matches = reader.search("李世民", limit=4)
+    assert matches[0].word == "李世民" and matches[0].kind == "exact"
+    assert len(matches) == 4
+    assert len(set(words(matches))) == 4
+    assert {m.kind for m in matches[1:]} >= {"prefix", "fuzzy"}
+
+
+def test_unknown_mode(reader):
+    with pytest.raises(ValueError):
+        reader.search("李白", mode="regex")
@@ -0,0 +1,74 @@
+"""综合查询：数据源并行、按完成顺序产出、总截止时间与出错/未命中的区分"""
+
+import time
+
+import requests
+
+from history_query import HistoryExpert, api_failure, has_result, is_error
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f"{status}", response=response)
+
+
+def test_api_failure_distinguishes_miss_from_error():
+    assert api_failure("测试", http_error(404)) is None
+    assert api_failure("测试", http_error(503)) == {"error": "503"}
+    assert "error" in api_failure("测试", requests.exceptions.ConnectionError("refused"))
+
+
+def test_result_predicates():
+    assert has_result({"Name": "李白"}) and not is_error({"Name": "李白"})
+    assert not has_result({"error": "503"}) and is_error({"error": "503"})
+    assert not has_result(None) and not is_error(None)
+    assert not has_result([])
+
+
+def _expert(delays, results=None):
+    """数据源按 delays 中的秒数完成的 HistoryExpert"""
+    results = results or {}
+    expert = HistoryExpert()
+
+    def fake(source):
+        def run(*args, **kwargs):
+            time.sleep(delays.get(source, 0))
+            return results.get(source, f"{source}-结果")
+        return run
+
+    expert.query_dictionary = fake("dict")
+    expert.query_api_people = fake("people")
+    expert.query_api_books = fake("books")
+    expert.query_api_poetry = fake("poetry")
+    expert.query_expansion = fake("expansion")
+    return expert
+
+
+def test_sources_run_concurrently_in_completion_order():
+    expert = _expert({"dict": 0.3, "people": 0.1, "books": 0.2, "poetry": 0.1})
+    start = time.monotonic()
+    items = list(expert.stream_sources("李白", deadline=5.0))
+    elapsed = time.monotonic() - start
+    # 诗词在人物命中后追加，依次完成：people → books/poetry → dict
+    assert [item.source for item in items][0] == "people"
+    assert {item.source for item in items} == {"dict", "people", "books", "poetry"}
+    assert items[-1].source == "dict"
+    assert elapsed < 0.5
+    assert not any(item.timed_out for item in items)
+
+
+def test_poetry_and_expansion_depend_on_earlier_results():
+    expert = _expert({}, results={"dict": None, "people": None})
+    sources = {item.source for item in expert.stream_sources("某某", deadline=5.0)}
+    # 人物未命中不查诗词；辞典未命中时启动自动扩展
+    assert sources == {"dict", "people", "books", "expansion"}
+
+
+def test_deadline_yields_timed_out_sources():
+    expert = _expert({"books": 1.0})
+    start = time.monotonic()
+    items = {item.source: item for item in expert.stream_sources("李白", deadline=0.3)}
+    assert time.monotonic() - start < 0.8
+    assert items["books"].timed_out and items["books"].result is None
+    assert not items["dict"].timed_out
@@ -0,0 +1,113 @@
+"""本地知识库：人物与关系边、作品去重与查询、作者同步状态，以及查询经本地库的读写"""
+
+import pytest
+
+import knowledge_store
+import query_api
+from knowledge_store import KnowledgeStore, person_through_store, poetry_through_store, sync_author
+
+SU_SHI = {"Name": "蘇軾", "Dynasty": "宋", "Relatives": [{"Name": "蘇轍"}, {"Name": "苏洵"}],
+          "Teacher": {"name": "欧阳修"}, "Works": ["赤壁赋"]}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """独立的本地库，同时作为进程内共享的本地库"""
+    store = KnowledgeStore(str(tmp_path / "graph.sqlite3"))
+    monkeypatch.setattr(knowledge_store, "_store", store)
+    monkeypatch.setattr(knowledge_store, "_store_disabled", False)
+    yield store
+    store.close()
+
+
+def poems(author, count, start=0, dynasty="唐"):
+    return [{"Title": f"诗{i}", "Author": author, "Dynasty": dynasty, "Content": f"{author}正文{i}"}
+            for i in range(start, start + count)]
+
+
+def test_person_lookup_folds_variants_and_records_relations(store):
+    store.put_person(SU_SHI)
+    assert store.get_person("苏轼") == SU_SHI and store.get_person("蘇軾") == SU_SHI
+    assert store.get_person("王安石") is None
+    assert sorted((r["source"], r["relation"], r["target"]) for r in store.relations("苏辙")) == [
+        ("苏轼", "Relatives", "苏辙")]
+    assert {r["target"] for r in store.relations("蘇軾")} == {"苏辙", "苏洵", "欧阳修"}
+    # 重新写入时关系边整体替换
+    store.put_person({"Name": "苏轼", "Dynasty": "宋", "Relatives": [{"Name": "苏辙"}]})
+    assert [r["target"] for r in store.relations("苏轼")] == ["苏辙"]
+    assert store.stats()["people"] == 2 and store.stats()["hits"] == 2
+
+
+def test_people_by_dynasty_and_prefix(store):
+    for name, dynasty in [("苏轼", "宋"), ("苏辙", "宋"), ("李白", "唐")]:
+        store.put_person({"Name": name, "Dynasty": dynasty})
+    store.put_person({"Dynasty": "唐"}, name="杜甫")
+    assert [p.get("Name") for p in store.people(dynasty="唐")] == ["李白", None]
+    assert [p["Name"] for p in store.people(name="蘇")] == ["苏轼", "苏辙"]
+    assert len(store.people(limit=1)) == 1
+
+
+def test_expired_person_is_a_miss(tmp_path):
+    store = KnowledgeStore(str(tmp_path / "graph.sqlite3"), person_max_age=-1)
+    store.put_person(SU_SHI)
+    assert store.get_person("苏轼") is None
+    store.close()
+
+
+def test_works_deduplicate_and_query(store):
+    assert store.add_works(poems("李白", 3) + ["oops"]) == 3
+    # 同一作品再次写入时只更新资料
+    updated = dict(poems("李白", 1)[0], Note="新")
+    store.add_works([updated] + poems("杜甫", 2))
+    assert store.stats()["works"] == 5
+    assert store.works(author="李白")[0] == updated
+    assert [w["Title"] for w in store.works(author="李白", limit=2, offset=1)] == ["诗1", "诗2"]
+    assert len(store.works(dynasty="唐", title="诗0")) == 2
+    assert store.works(author="李白", dynasty="宋") == []
+
+
+def test_author_sync_state(store, tmp_path):
+    assert store.author_page_size("李白") is None
+    store.mark_author_synced("李白", 10)
+    assert store.author_page_size("李白") == 10
+    expired = KnowledgeStore(store.path, author_max_age=-1)
+    assert expired.author_page_size("李白") is None
+    expired.close()
+
+
+def test_person_through_store_fetches_once(store):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return SU_SHI
+
+    assert person_through_store("苏轼", fetch) == SU_SHI
+    assert person_through_store("蘇軾", fetch) == SU_SHI
+    assert len(calls) == 1
+    # 出错的结果不写入
+    assert person_through_store("王安石", lambda: {"error": "503"}) == {"error": "503"}
+    assert store.get_person("王安石") is None
+
+
+def test_sync_author_then_poetry_answered_locally(store, monkeypatch):
+    pages = {0: poems("李白", 10), 1: poems("李白", 10, start=10), 2: poems("李白", 3, start=20)}
+    monkeypatch.setattr(query_api, "fetch_poetry_page", lambda body: {"Result": pages.get(body["PageNo"], [])})
+    assert sync_author(store, "李白") == {"author": "李白", "works": 23, "pages": 4, "complete": True, "error": None}
+
+    def fetch():
+        raise AssertionError("已完整同步的作者不应请求 API")
+
+    page = poetry_through_store({"Author": "李白", "PageNo": 2}, fetch)
+    assert [w["Title"] for w in page["Result"]] == ["诗20", "诗21", "诗22"]
+    # 带关键词的查询仍请求 API，结果写入本地库
+    fetched = poetry_through_store({"Author": "杜甫", "Key": "月"}, lambda: {"Result": poems("杜甫", 2)})
+    assert len(fetched["Result"]) == 2 and len(store.works(author="杜甫")) == 2
+
+
+def test_sync_author_incomplete_on_error(store, monkeypatch):
+    monkeypatch.setattr(query_api, "fetch_poetry_page",
+                        lambda body: {"Result": poems("杜甫", 10)} if body["PageNo"] == 0 else {"error": "503"})
+    result = sync_author(store, "杜甫")
+    assert result["complete"] is False and result["error"] == "503" and result["works"] == 10
+    assert store.author_page_size("杜甫") is None
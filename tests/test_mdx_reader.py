@@ -0,0 +1,65 @@
+"""MDXReader 与 mdx_index 词头索引：与 mdict-utils 的解析结果逐条一致"""
+
+import os
+import random
+
+import pytest
+
+from mdx_index import index_path_for
+from mdx_reader import MDXReader, open_dictionary
+
+
+def _entries(count=3000, seed=7):
+    rng = random.Random(seed)
+    chars = "李白杜甫安史之乱科举制度唐太宗世民节度使河北崔浩國史蘇軾玄武门变隋朝宋元明清"
+    entries = {"李白": "<p>李白：唐代诗人</p>", "蘇軾": "<p>蘇軾：北宋文学家</p>", "诗仙": "@@@LINK=李白"}
+    while len(entries) < count:
+        word = "".join(rng.choice(chars) for _ in range(rng.randint(2, 5)))
+        entries.setdefault(word, f"<b>{word}</b> " + "".join(rng.choice(chars) for _ in range(rng.randint(20, 300))))
+    return entries
+
+
+def test_round_trip_matches_mdict_utils(make_mdx):
+    from mdict_utils.base.readmdict import MDX
+
+    entries = _entries()
+    path = make_mdx(entries)
+    expected = {key.decode("utf-8"): value.decode("utf-8").strip("\x00").strip()
+                for key, value in MDX(path).items()}
+    assert expected == entries
+
+    reader = MDXReader(path)
+    assert os.path.exists(index_path_for(path))
+    assert len(reader) == len(expected)
+    assert sorted(reader.keys()) == sorted(expected)
+    for word, definition in expected.items():
+        assert reader.lookup(word) == definition
+    assert reader.lookup("不存在的词条") is None
+    assert "李白" in reader and "不存在的词条" not in reader
+
+    # 第二次打开复用已写入的索引文件，结果不变
+    reopened = MDXReader(path)
+    sample = random.Random(1).sample(sorted(expected), 200)
+    assert [reopened.lookup(word) for word in sample] == [expected[word] for word in sample]
+
+
+def test_lookup_many_and_shared_reader(make_mdx):
+    entries = _entries(200)
+    path = make_mdx(entries)
+    reader = open_dictionary(path)
+    assert open_dictionary(path) is reader
+    words = sorted(entries)[:50] + ["不存在的词条"]
+    results = dict(reader.lookup_many(words))
+    assert set(results) == set(words)
+    assert results["不存在的词条"] is None
+    assert all(results[word] == entries[word] for word in words[:50])
+
+
+def test_stale_index_is_rebuilt(make_mdx):
+    path = make_mdx({"李白": "唐代诗人"})
+    assert MDXReader(path).lookup("李白") == "唐代诗人"
+    # 覆盖同名 MDX：旧索引与文件大小/修改时间不符，应自动重建
+    make_mdx({"李白": "唐代诗人，字太白", "杜甫": "唐代诗人，字子美"})
+    reader = MDXReader(path)
+    assert reader.lookup("杜甫") == "唐代诗人，字子美"
+    assert len(reader) == 2
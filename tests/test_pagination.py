@@ -0,0 +1,101 @@
+"""Paginator：按需翻页、后台预取、条数上限与出错/重复页的终止条件"""
+
+import contextvars
+import threading
+
+from pagination import Paginator, extract_items
+
+
+class Pages:
+    """按页号返回 size 条的假分页接口，记录被请求的页号"""
+
+    def __init__(self, pages=3, size=10, error_at=None):
+        self.pages, self.size, self.error_at = pages, size, error_at
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def __call__(self, page_no):
+        with self.lock:
+            self.requested.append(page_no)
+        if page_no == self.error_at:
+            return {"error": "503 Server Error"}
+        if page_no >= self.pages:
+            return {"Result": []}
+        return {"Result": [f"{page_no}-{i}" for i in range(self.size)]}
+
+
+def test_extract_items():
+    assert extract_items([1, 2]) == [1, 2]
+    assert extract_items({"Writings": [1]}) == [1]
+    assert extract_items({"Result": None, "Items": [2]}) == [2]
+    assert extract_items("oops") == []
+
+
+def test_iterates_all_pages_until_empty():
+    pages = Pages(pages=3)
+    paginator = Paginator(pages, extract_items, prefetch=False)
+    items = list(paginator)
+    assert len(items) == 30 and items[0] == "0-0" and items[-1] == "2-9"
+    assert pages.requested == [0, 1, 2, 3]
+    assert paginator.pages_fetched == 4 and paginator.error is None
+
+
+def test_limit_only_requests_needed_pages():
+    pages = Pages(pages=10)
+    assert list(Paginator(pages, extract_items, limit=15)) == [f"0-{i}" for i in range(10)] + \
+        [f"1-{i}" for i in range(5)]
+    # 第二页已够 limit，不再预取第三页
+    assert sorted(pages.requested) == [0, 1]
+
+    pages = Pages(pages=10)
+    assert list(Paginator(pages, extract_items, limit=10)) == [f"0-{i}" for i in range(10)]
+    assert pages.requested == [0]
+    assert list(Paginator(Pages(), extract_items, limit=0)) == []
+
+
+def test_prefetches_next_page_while_consuming():
+    pages = Pages(pages=3)
+    iterator = iter(Paginator(pages, extract_items))
+    next(iterator)
+    # 消费第一页时第二页已在后台请求
+    for _ in range(100):
+        with pages.lock:
+            if 1 in pages.requested:
+                break
+        threading.Event().wait(0.01)
+    assert pages.requested == [0, 1]
+
+
+def test_error_stops_iteration():
+    paginator = Paginator(Pages(pages=5, error_at=1), extract_items)
+    assert len(list(paginator)) == 10
+    assert paginator.error == "503 Server Error"
+    assert paginator.last_page == {"error": "503 Server Error"}
+
+
+def test_repeated_page_and_max_pages_stop_iteration():
+    same = Paginator(lambda page_no: {"Result": ["同一页"]}, extract_items, prefetch=False)
+    assert list(same) == ["同一页"] and same.pages_fetched == 2
+
+    counter = iter(range(1000))
+    endless = Paginator(lambda page_no: {"Result": [next(counter)]}, extract_items,
+                        prefetch=False, max_pages=5)
+    assert list(endless) == [0, 1, 2, 3, 4]
+
+
+def test_start_page():
+    pages = Pages(pages=3)
+    assert list(Paginator(pages, extract_items, start_page=2, prefetch=False))[0] == "2-0"
+
+
+def test_prefetch_runs_in_callers_context():
+    request_id = contextvars.ContextVar("request_id", default=None)
+    seen = []
+
+    def fetch(page_no):
+        seen.append(request_id.get())
+        return Pages(pages=3)(page_no)
+
+    request_id.set("请求1")
+    assert len(list(Paginator(fetch, extract_items, prefetch=True))) == 30
+    assert seen == ["请求1"] * 4
@@ -0,0 +1,75 @@
+"""PassageMerger：重叠片段拼接、命中位置、桥接合并与不同出处/不一致文本的区分"""
+
+from passage_merge import PassageMerger, merge_passages, normalize
+
+SOURCE = "太武帝时浩与高允等共撰国史书魏之先世详备而不典浩又立石铭刊载国书并勒所注五经于郊坛东方"
+
+
+def cut(keyword, before, after, book="魏书", volume="崔浩传"):
+    """从 SOURCE 中截取命中 keyword 的片段，前后各带 before/after 个字"""
+    at = SOURCE.index(keyword)
+    return {"Book": book, "Volume": volume, "PreviousText": SOURCE[at - before:at],
+            "MatchedText": keyword, "LaterText": SOURCE[at + len(keyword):at + len(keyword) + after]}
+
+
+def hit(keyword):
+    at = SOURCE.index(keyword)
+    return keyword, at, at + len(keyword)
+
+
+def test_normalize_removes_all_whitespace():
+    assert normalize(" 国史　刊石\n") == "国史刊石" and normalize(None) == ""
+
+
+def test_overlapping_passages_merge_into_one_span():
+    merger = PassageMerger()
+    merger.add("国史", cut("国史", 11, 15))
+    merger.add("刊载", cut("刊载", 14, 13))
+    [span] = merger.spans()
+    assert span.text == SOURCE
+    assert span.keywords == ["国史", "刊载"]
+    assert span.hit_spans() == [hit("国史"), hit("刊载")]
+    assert merger.stats() == {"passages": 2, "spans": 1, "chars_in": 28 + 29, "chars_out": len(SOURCE)}
+
+
+def test_passage_extending_backwards_keeps_hit_positions():
+    merger = PassageMerger()
+    merger.add("刊载", cut("刊载", 14, 13))
+    merger.add("国史", cut("国史", 11, 15))
+    [span] = merger.spans()
+    assert span.text == SOURCE
+    assert span.hit_spans() == [hit("刊载"), hit("国史")]
+
+
+def test_bridging_passage_joins_two_spans():
+    merger = PassageMerger()
+    merger.add("高允", cut("高允", 6, 8))
+    merger.add("五经", cut("五经", 9, 5))
+    assert len(merger.spans()) == 2
+    merger.add("不典", cut("不典", 18, 17))
+    [span] = merger.spans()
+    assert span.text == SOURCE and span.passages == 3
+    assert sorted(span.hit_spans()) == sorted([hit("高允"), hit("五经"), hit("不典")])
+
+
+def test_different_volume_or_conflicting_text_stay_separate():
+    spans = merge_passages([
+        ("国史", cut("国史", 11, 25)),
+        ("国史", cut("国史", 11, 25, volume="卷四十八")),
+        # 与已有片段共享 shingle，但重叠部分有异文，不拼接
+        ("刊载", dict(cut("刊载", 14, 13), LaterText="他书")),
+    ])
+    assert [(span.volume, span.keywords) for span in spans] == [
+        ("崔浩传", ["国史"]), ("卷四十八", ["国史"]), ("崔浩传", ["刊载"])]
+
+
+def test_duplicates_and_short_passages_deduplicate():
+    merger = PassageMerger()
+    merger.add_all("国史", [cut("国史", 11, 15), cut("国史", 11, 15)])
+    merger.add("崔浩", {"Book": "北史", "MatchedText": "崔浩"})
+    merger.add("崔浩", {"Book": "北史", "MatchedText": " 崔浩 "})
+    merger.add("空", {"Book": "北史", "MatchedText": ""})
+    spans = merger.spans()
+    assert [(span.book, span.passages) for span in spans] == [("魏书", 2), ("北史", 2)]
+    assert spans[0].to_dict()["Hits"] == [{"Keyword": "国史", "Start": 11, "End": 13}]
+    assert merger.stats()["passages"] == 4
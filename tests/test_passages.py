@@ -0,0 +1,58 @@
+"""Passage：Book/Find 嵌套结果的展开、字段兼容、去重与字符串驻留"""
+
+from passages import Passage, iter_passages, parse_passages
+
+
+def find_result():
+    return {"Result": [{
+        "Books": [{
+            "Book": {"Title": "魏书"},
+            "Volumes": [{
+                "Volume": "崔浩传",
+                "Pages": [
+                    {"PreviousText": "浩书", "MatchedText": "国史", "LaterText": "刊石"},
+                    {"PreviousText": "尽述", "MatchedText": "国史", "LaterText": "备而不典", "Page": 12},
+                ],
+            }],
+        }],
+    }]}
+
+
+def test_parses_nested_result_with_book_and_volume():
+    passages = parse_passages(find_result())
+    assert [(p.book, p.volume, p.text) for p in passages] == [
+        ("魏书", "崔浩传", "浩书国史刊石"),
+        ("魏书", "崔浩传", "尽述国史备而不典"),
+    ]
+    # 只有正文字段的片段不保存 extra，其余字段保留
+    assert passages[0].extra is None and passages[1].extra == {"Page": 12}
+
+
+def test_flat_entries_and_malformed_items():
+    data = {"Result": [{"Book": "北史", "Volume": "卷二十一", "MatchedText": "崔浩"}, "oops", None]}
+    passages = list(iter_passages(data))
+    assert len(passages) == 1
+    assert (passages[0].book, passages[0].previous, passages[0].later) == ("北史", "", "")
+    assert parse_passages(None) == [] and parse_passages({"Result": None}) == []
+
+
+def test_field_access_and_to_dict():
+    passage = parse_passages(find_result())[1]
+    assert passage["MatchedText"] == "国史" and passage.get("Page") == 12
+    assert passage.get("Missing", "无") == "无"
+    assert passage.to_dict() == {"PreviousText": "尽述", "MatchedText": "国史", "LaterText": "备而不典",
+                                 "Page": 12, "Book": "魏书", "Volume": "崔浩传"}
+
+
+def test_equal_passages_deduplicate_and_share_strings():
+    first = parse_passages(find_result())
+    second = parse_passages(find_result())
+    assert len(set(first + second)) == 2
+    assert first[0] == second[0] and first[0] != first[1]
+    # 书名与命中词驻留，不同页的片段共用同一对象
+    assert first[0].book is second[0].book and first[0].matched is first[1].matched
+
+
+def test_from_page_prefers_page_labels():
+    passage = Passage.from_page({"Book": "资治通鉴", "MatchedText": 3}, book="魏书", volume="卷三十五")
+    assert (passage.book, passage.volume, passage.matched) == ("资治通鉴", "卷三十五", "3")
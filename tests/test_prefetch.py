@@ -0,0 +1,73 @@
+"""批量预热：主题完成判定、检查点续跑与重复主题"""
+
+import json
+
+from history_query import SourceResult
+from prefetch import Prefetcher, checkpoint_path_for, load_checkpoint, prefetch_topic
+
+
+class _FakeExpert:
+    def __init__(self, items):
+        self.items = items
+
+    def stream_sources(self, keyword, deadline):
+        yield from self.items
+
+
+class _KeywordExpert:
+    """按关键词返回结果的假 HistoryExpert：failing 中的主题人物查询出错"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.queried = []
+
+    def stream_sources(self, keyword, deadline):
+        self.queried.append(keyword)
+        yield SourceResult("dict", f"{keyword}释文", 0.01)
+        yield SourceResult("people", {"error": "503"} if keyword in self.failing else None, 0.01)
+
+
+def test_prefetch_topic_completeness():
+    """只有每个数据源都正常响应（命中或未命中）的主题才算完成"""
+    record = prefetch_topic(_FakeExpert([SourceResult("dict", "释文", 0.01), SourceResult("people", None, 0.1),
+                                         SourceResult("books", [{"Title": "旧唐书"}], 0.1)]), "李白", 5.0)
+    assert record["complete"]
+    assert record["found"] == {"dict": True, "people": False, "books": True}
+
+    record = prefetch_topic(_FakeExpert([SourceResult("dict", "释文", 0.01),
+                                         SourceResult("people", {"error": "503 Server Error"}, 0.1)]), "李白", 5.0)
+    assert not record["complete"]
+    assert record["errors"] == ["people"]
+
+    record = prefetch_topic(_FakeExpert([SourceResult("dict", None, 0.01),
+                                         SourceResult("books", None, 5.0, timed_out=True)]), "李白", 5.0)
+    assert not record["complete"]
+    assert record["timed_out"] == ["books"]
+
+
+def test_checkpoint_resumes_only_incomplete_topics(tmp_path):
+    checkpoint = str(tmp_path / "topics.txt.prefetch.jsonl")
+    expert = _KeywordExpert(failing={"杜甫"})
+    prefetcher = Prefetcher(workers=2, checkpoint=checkpoint, expert=expert)
+    records = list(prefetcher.run(["李白", "杜甫", "李白", "苏轼"]))
+    assert sorted(r["keyword"] for r in records) == ["李白", "杜甫", "苏轼"]
+    assert (prefetcher.completed, prefetcher.incomplete, prefetcher.skipped) == (2, 1, 0)
+    assert load_checkpoint(checkpoint) == {"李白", "苏轼"}
+
+    # 续跑：已完成的主题跳过，出错的主题重试
+    with open(checkpoint, "a", encoding="utf-8") as f:
+        f.write('{"type":"prefetch","keyword":"半行')
+    expert = _KeywordExpert()
+    prefetcher = Prefetcher(workers=2, checkpoint=checkpoint, expert=expert)
+    records = list(prefetcher.run(["李白", "杜甫", "苏轼"]))
+    assert expert.queried == ["杜甫"] and prefetcher.skipped == 2
+    assert records[0]["complete"]
+    with open(checkpoint, encoding="utf-8") as f:
+        assert json.loads(f.readlines()[-1])["keyword"] == "杜甫"
+    assert load_checkpoint(checkpoint) == {"李白", "杜甫", "苏轼"}
+
+
+def test_checkpoint_path():
+    assert checkpoint_path_for("topics.txt") == "topics.txt.prefetch.jsonl"
+    assert checkpoint_path_for("-") is None
+    assert load_checkpoint(None) == set()
@@ -0,0 +1,109 @@
+"""未命中时的查询扩展：候选改写、辞典试探与按排位并行的 API 试探"""
+
+import time
+
+from mdx_reader import MDXReader
+from query_expansion import (Candidate, expand_query, generate_candidates, is_confident, probe_api,
+                             probe_dictionary, probe_plan, strip_titles, substrings)
+
+
+def test_strip_titles():
+    assert strip_titles("唐代诗人李白") == [Candidate("李白", "title")]
+    assert strip_titles("李白先生") == [Candidate("李白", "title")]
+    # 庙号本身也是候选
+    assert strip_titles("唐太宗李世民") == [Candidate("李世民", "title"), Candidate("唐太宗", "title")]
+    assert strip_titles("唐太宗") == [Candidate("太宗", "title")]
+    # 去掉后不足两字时保留原词
+    assert strip_titles("唐王") == [] and strip_titles("李白") == []
+
+
+def test_substrings_longest_first():
+    assert substrings("唐代诗人李白", limit=3) == ["唐代诗人李", "代诗人李白", "唐代诗人"]
+    assert substrings("李白") == []
+
+
+def test_generate_candidates_order_and_reasons():
+    assert generate_candidates("蘇軾的詩") == [Candidate("苏轼的诗", "variant"), Candidate("苏轼", "phrase")]
+    assert generate_candidates("李白是谁") == [Candidate("李白", "phrase")]
+    candidates = generate_candidates(" 唐代诗人李白 ")
+    assert candidates[0] == Candidate("李白", "title")
+    assert {c.reason for c in candidates[1:]} == {"substring"}
+    assert "唐代诗人李白" not in [c.word for c in candidates]
+
+
+def test_dictionary_candidates_and_link_following(make_mdx):
+    reader = MDXReader(make_mdx({"李白": "唐代诗人", "诗仙": "@@@LINK=李白", "李白诗选": "选本"}))
+    candidates = generate_candidates("诗仙李白", reader)
+    # 查询中包含的辞典词头排在子串之前
+    assert candidates[:2] == [Candidate("诗仙", "contained"), Candidate("李白", "contained")]
+    hit = probe_dictionary(reader, "诗仙其人", [Candidate("仙其", "substring"), Candidate("诗仙", "title")])
+    assert (hit.candidate, hit.reason, hit.source, hit.data) == ("李白", "title", "dict", "唐代诗人")
+    assert probe_dictionary(reader, "杜甫", [Candidate("杜", "substring")]) is None
+
+
+def test_is_confident():
+    assert is_confident("people", "苏轼", {"Name": "蘇軾"})
+    assert not is_confident("people", "苏轼", {"Name": "苏辙"})
+    assert not is_confident("people", "苏轼", {"error": "503"})
+    assert is_confident("find", "国史", {"Result": [{"Book": "魏书", "MatchedText": "国史"}]})
+    assert not is_confident("find", "国史", {"Result": []})
+
+
+def test_probe_api_returns_best_ranked_hit():
+    """较快完成的低排位可信结果不能抢在高排位候选之前返回"""
+    candidates = [Candidate("李白", "title"), Candidate("唐代诗人李", "substring")]
+
+    def people(word):
+        if word == "李白":
+            time.sleep(0.2)
+        return {"Name": word}
+
+    def find(word):
+        return {"Result": [{"Book": "全唐诗", "MatchedText": word}]}
+
+    hit = probe_api("唐代诗人李白", candidates, {"people": people, "find": find}, deadline=5.0)
+    assert (hit.candidate, hit.source) == ("李白", "people")
+
+    # 子串候选只试人物端点
+    plan = probe_plan(candidates, {"people": people, "find": find})
+    assert [(c.word, source) for c, source in plan] == [
+        ("李白", "people"), ("李白", "find"), ("唐代诗人李", "people")]
+
+
+def test_probe_api_skips_unconfident_and_honours_deadline():
+    candidates = [Candidate("李世民", "title"), Candidate("唐太宗", "title")]
+
+    # 排位靠前的结果不可信（不同名）时取下一个
+    hit = probe_api("唐太宗李世民", candidates, {"people": lambda word: {"Name": "唐太宗"}})
+    assert hit.candidate == "唐太宗"
+
+    # 超时时返回已完成试探中排位最靠前的可信命中
+    def slow_first(word):
+        if word == "李世民":
+            time.sleep(1.0)
+        return {"Name": word}
+
+    start = time.monotonic()
+    hit = probe_api("唐太宗李世民", candidates, {"people": slow_first}, deadline=0.3)
+    assert time.monotonic() - start < 0.9
+    assert hit.candidate == "唐太宗"
+
+    assert probe_api("唐太宗李世民", candidates, {"people": lambda word: None}) is None
+
+
+def test_expand_query_prefers_dictionary_and_skips_variants_for_api(make_mdx):
+    reader = MDXReader(make_mdx({"李白": "唐代诗人"}))
+    hit = expand_query("唐代诗人李白", reader, probes={"people": lambda word: {"Name": word}})
+    assert (hit.source, hit.candidate, hit.probes) == ("dict", "李白", 0)
+
+    probed = []
+
+    def people(word):
+        probed.append(word)
+        return {"Name": word} if word == "苏轼" else None
+
+    hit = expand_query("蘇軾的詩", probes={"people": people})
+    assert (hit.source, hit.candidate, hit.reason) == ("people", "苏轼", "phrase")
+    # 简繁变体与原词的 API 请求相同，不再试探
+    assert probed == ["苏轼"]
+    assert expand_query("李白", probes={"people": people}) is None
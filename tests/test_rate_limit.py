@@ -0,0 +1,177 @@
+"""限速与重试：令牌桶边界、Retry-After 解析、退避策略与调用方时间预算"""
+
+import time
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from cnkgraph_client import CnkgraphClient
+from rate_limit import (DEFAULT_BURST, DEFAULT_RATE, MIN_RATE_FRACTION, RetryPolicy, TokenBucket,
+                        default_bucket, parse_retry_after)
+from standin_server import StandinConfig, serve_in_thread
+
+
+class ScriptedAdapter(BaseAdapter):
+    """按顺序返回给定状态码（或抛出给定异常）的传输层"""
+
+    def __init__(self, *outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        outcome = self.outcomes[min(self.sent, len(self.outcomes) - 1)]
+        self.sent += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code, headers = outcome if isinstance(outcome, tuple) else (outcome, {})
+        response.headers.update(headers)
+        response._content = b'{"ok": true}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def scripted_client(*outcomes, **kwargs):
+    client = CnkgraphClient(retry=RetryPolicy(max_retries=3, base_delay=0.01), **kwargs)
+    adapter = ScriptedAdapter(*outcomes)
+    client.session.mount("http://", adapter)
+    return client, adapter
+
+
+def test_token_bucket_disabled_for_non_positive_rate():
+    for rate in (0, -1):
+        bucket = TokenBucket(rate, 1)
+        bucket.penalize()
+        assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+
+
+def test_token_bucket_burst_and_timeout():
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.acquire() == 0.0 and bucket.acquire() == 0.0
+    # 突发容量用完后，需要等待超过 timeout 时不等待
+    assert bucket.acquire(timeout=0.01) is None
+    assert TokenBucket(rate=1, burst=0).capacity == 1.0
+
+    bucket = TokenBucket(rate=50, burst=1)
+    bucket.acquire()
+    waited = bucket.acquire()
+    assert 0.0 < waited < 0.1
+
+
+def test_penalize_and_reward():
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.penalize()
+    assert bucket.rate == 5
+    for _ in range(10):
+        bucket.penalize()
+    assert bucket.rate == pytest.approx(10 * MIN_RATE_FRACTION)
+    for _ in range(200):
+        bucket.reward()
+    assert bucket.rate == 10
+
+
+def test_pause_blocks_all_acquires():
+    bucket = TokenBucket(rate=100, burst=10)
+    bucket.pause(0.2)
+    assert bucket.acquire(timeout=0.05) is None
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.1
+
+
+def test_default_bucket_reads_and_validates_environment(monkeypatch, capsys):
+    monkeypatch.setenv("CNKGRAPH_RATE", "0")
+    monkeypatch.setenv("CNKGRAPH_BURST", "3")
+    bucket = default_bucket()
+    assert bucket.acquire() == 0.0 and bucket.acquire() == 0.0 and bucket.capacity == 3
+
+    for rate, burst in (("abc", "x"), ("-1", "0"), ("nan", "2.5"), ("inf", "-3")):
+        monkeypatch.setenv("CNKGRAPH_RATE", rate)
+        monkeypatch.setenv("CNKGRAPH_BURST", burst)
+        bucket = default_bucket()
+        assert (bucket.max_rate, bucket.capacity) == (DEFAULT_RATE, DEFAULT_BURST)
+    captured = capsys.readouterr()
+    assert captured.out == "" and "CNKGRAPH_RATE" in captured.err
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(" -1 ") == 0.0
+    assert parse_retry_after("Thu, 01 Jan 1970 00:01:40 GMT", now=40) == 60.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_policy_delay_bounds():
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    assert all(0 <= policy.delay(0) <= 0.5 for _ in range(50))
+    assert all(0 <= policy.delay(10) <= 2.0 for _ in range(50))
+    assert 5.0 <= policy.delay(0, retry_after=5.0) <= 5.5
+
+
+def test_client_retries_5xx_and_connection_errors():
+    client, adapter = scripted_client(503, requests.exceptions.ConnectionError("reset"), 200)
+    assert client.get("http://example.test/api/People/李白") == {"ok": True}
+    assert adapter.sent == 3
+    http = client.metrics()["http"]
+    assert http["retries"] == 2 and http["statuses"] == {"200": 1, "503": 1}
+
+
+def test_client_gives_up_after_max_retries():
+    client, adapter = scripted_client(503)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("http://example.test/api/People/李白")
+    assert adapter.sent == 4
+    assert client.metrics()["http"]["failures"] == 1
+
+    client, adapter = scripted_client(404)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("http://example.test/api/People/某某")
+    assert adapter.sent == 1
+
+
+def test_429_slows_the_shared_bucket():
+    bucket = TokenBucket(rate=1000, burst=10)
+    client, adapter = scripted_client((429, {"Retry-After": "0"}), 200, limiter=bucket)
+    assert client.get("http://example.test/api/People/李白") == {"ok": True}
+    assert bucket.rate < 1000
+
+
+def test_request_deadline_bounds_retries():
+    """对持续 503 的服务重试时不超出调用方的时间预算"""
+    server, base_url = serve_in_thread(StandinConfig(error_rate=1.0))
+    client = CnkgraphClient(retry=RetryPolicy(max_retries=10, base_delay=0.2))
+    try:
+        start = time.monotonic()
+        response = client.request("GET", f"{base_url}/People/李白", deadline=0.5)
+        assert time.monotonic() - start < 0.8
+        assert response.status_code == 503
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_request_deadline_caps_attempt_timeout_and_throttle():
+    server, base_url = serve_in_thread(StandinConfig(latency=2.0))
+    client = CnkgraphClient(limiter=TokenBucket(rate=0.1, burst=1))
+    try:
+        start = time.monotonic()
+        with pytest.raises(requests.exceptions.Timeout):
+            client.request("GET", f"{base_url}/People/李白", deadline=0.3)
+        assert time.monotonic() - start < 1.0
+        # 令牌已用完，下一个令牌需 10 秒：超出预算时不等待
+        start = time.monotonic()
+        with pytest.raises(requests.exceptions.Timeout):
+            client.request("GET", f"{base_url}/People/杜甫", deadline=0.3)
+        assert time.monotonic() - start < 0.1
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,71 @@
+"""录制/回放：按录制顺序回放（含错误响应与重试）、未录制请求与录制模式"""
+
+import json
+
+import pytest
+import requests
+
+from cnkgraph_client import CnkgraphClient
+from rate_limit import RetryPolicy
+from replay import RECORD, REPLAY, Cassette, ReplayMiss, build_response, record_key
+from standin_server import serve_in_thread
+
+URL = "https://open.cnkgraph.com/api/People/%E6%9D%8E%E7%99%BD"
+
+
+def write_cassette(path, *records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return str(path)
+
+
+def record(status, content, url=URL, method="GET", body=""):
+    return {"method": method, "url": url, "body": body, "status": status,
+            "headers": {"Content-Type": "application/json"}, "content": content, "elapsed": 0.01}
+
+
+def test_replayed_response_is_closable():
+    request = requests.Request("GET", URL).prepare()
+    response = build_response(record(503, "Service Unavailable"), request)
+    response.close()
+    assert response.status_code == 503 and response.text == "Service Unavailable"
+
+
+def test_replays_503_then_200_through_retries(tmp_path):
+    path = write_cassette(tmp_path / "c.jsonl", record(503, "Service Unavailable"),
+                          record(200, '{"Name": "李白"}'))
+    client = CnkgraphClient(cassette=Cassette(path, REPLAY), retry=RetryPolicy(max_retries=2, base_delay=0.01))
+    assert client.get(URL) == {"Name": "李白"}
+    assert client.metrics()["http"]["statuses"] == {"200": 1, "503": 1}
+
+
+def test_sequence_repeats_last_record_and_records_lists_last(tmp_path):
+    path = write_cassette(tmp_path / "c.jsonl", record(503, "busy"), record(200, "{}"))
+    cassette = Cassette(path, REPLAY)
+    assert [cassette.find("GET", URL, None)["status"] for _ in range(4)] == [503, 200, 200, 200]
+    assert [r["status"] for r in cassette.records()] == [200]
+    # 回放与主机无关，JSON 请求体按键排序比较
+    assert record_key("post", "http://127.0.0.1:8765/api/Book/Find", '{"b":1,"a":2}') == \
+        record_key("POST", "https://open.cnkgraph.com/api/Book/Find", b'{"a":2,"b":1}')
+
+
+def test_unrecorded_request_raises_replay_miss(tmp_path):
+    client = CnkgraphClient(cassette=Cassette(write_cassette(tmp_path / "c.jsonl"), REPLAY))
+    with pytest.raises(ReplayMiss):
+        client.get(URL)
+    with pytest.raises(FileNotFoundError):
+        Cassette(str(tmp_path / "missing.jsonl"), REPLAY)
+
+
+def test_record_then_replay_offline(tmp_path):
+    path = str(tmp_path / "c.jsonl")
+    server, base_url = serve_in_thread()
+    try:
+        recorder = CnkgraphClient(cassette=Cassette(path, RECORD))
+        live = recorder.post_json(f"{base_url}/Book/Find", {"Key": "崔浩", "PageNo": 0})
+    finally:
+        server.shutdown()
+        server.server_close()
+    replayer = CnkgraphClient(cassette=Cassette(path, REPLAY))
+    assert replayer.post_json(f"{base_url}/Book/Find", {"PageNo": 0, "Key": "崔浩"}) == live
@@ -0,0 +1,112 @@
+"""响应缓存：TTL、LRU 淘汰、简繁归一化的缓存键与持久化"""
+
+import pytest
+
+import response_cache
+from response_cache import DAY, ResponseCache, endpoint_of, make_key
+
+API = "https://open.cnkgraph.com/api"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_endpoint_of():
+    assert endpoint_of(f"{API}/Book/Find") == "Book/Find"
+    assert endpoint_of(f"{API}/People/%E8%8B%8F%E8%BD%BC") == "People"
+    assert endpoint_of(f"{API}/Book/Search?pageNo=0") == "Book/Search"
+
+
+def test_key_folds_variants_but_not_accept_language():
+    assert make_key("GET", f"{API}/People/蘇軾") == make_key("get", f"{API}/People/苏轼")
+    assert make_key("POST", f"{API}/Book/Find", body={"Key": "崔浩", "PageNo": 0}) == \
+        make_key("POST", f"{API}/Book/Find", body={"PageNo": 0, "Key": "崔浩"})
+    assert make_key("POST", f"{API}/Book/Search", params={"pageNo": 0, "q": "國史"}) == \
+        make_key("POST", f"{API}/Book/Search", params={"q": "国史", "pageNo": 0})
+    assert make_key("GET", f"{API}/People/李白", accept_language="zh-Hant") != \
+        make_key("GET", f"{API}/People/李白")
+
+
+def test_ttl_expiry_and_uncached_endpoints(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "c.db"))
+    cache.put("k", f"{API}/Event/Search", {"v": 1})
+    cache.put("nope", f"{API}/Unknown/Thing", {"v": 2})
+    assert cache.get("k") == (True, {"v": 1})
+    assert cache.get("nope") == (False, None)
+    clock.now += 1 * DAY + 1
+    assert cache.get("k") == (False, None)
+    # 磁盘层同样按过期时间判断
+    reopened = ResponseCache(str(tmp_path / "c.db"))
+    assert reopened.get("k") == (False, None)
+
+
+def test_persists_across_instances(tmp_path, clock):
+    ResponseCache(str(tmp_path / "c.db")).put("k", f"{API}/People/李白", {"Name": "李白"})
+    cache = ResponseCache(str(tmp_path / "c.db"))
+    assert cache.get("k") == (True, {"Name": "李白"})
+    assert cache.stats()["entries"] == 1
+
+
+def test_memory_layer_is_bounded_lru(clock):
+    cache = ResponseCache(None, memory_entries=2)
+    for key in "abc":
+        cache.put(key, f"{API}/Book/Find", key)
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, "b")
+    cache.put("d", f"{API}/Book/Find", "d")
+    # b 刚被访问过，淘汰的是 c
+    assert cache.get("c") == (False, None)
+    assert cache.get("b") == (True, "b")
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_disk_eviction_drops_least_recently_accessed(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "c.db"), memory_entries=0)
+    value = "x" * 100
+    for i in range(4):
+        cache.put(f"k{i}", f"{API}/Book/Find", value)
+        clock.now += 1
+    # k0 最早写入，但在刷新间隔之后又被访问
+    clock.now += response_cache.TOUCH_INTERVAL + 1
+    assert cache.get("k0")[0]
+    cache.max_bytes = 2 * 102
+    cache.evict()
+    assert [cache.get(f"k{i}")[0] for i in range(4)] == [True, False, False, True]
+
+
+def test_expired_rows_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "c.db"))
+    cache.put("old", f"{API}/Book/Find", 1, ttl=10)
+    cache.put("new", f"{API}/Book/Find", 2, ttl=100)
+    clock.now += 50
+    cache.evict()
+    assert cache.stats()["entries"] == 1
+
+
+def test_client_serves_repeated_requests_from_cache(tmp_path):
+    from cnkgraph_client import CnkgraphClient
+    from standin_server import serve_in_thread
+
+    server, base_url = serve_in_thread()
+    client = CnkgraphClient(cache=ResponseCache(str(tmp_path / "c.db")))
+    try:
+        first = client.get(f"{base_url}/People/蘇軾")
+        assert client.get(f"{base_url}/People/苏轼") == first
+        assert client.metrics()["http"]["requests"] == 1
+        assert client.metrics()["cache"]["hits"] == 1
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,80 @@
+"""SingleFlight：同时进行的相同调用只执行一次，结果与异常共享"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers=8):
+    """让 callers 个线程同时调用 flight.do，首个调用开始执行后其余才加入"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def leader_fn():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        first = pool.submit(flight.do, key, leader_fn)
+        started.wait(5)
+        others = [pool.submit(flight.do, key, leader_fn) for _ in range(callers - 1)]
+        # 等其余调用都已登记为等待者再放行
+        while flight.stats()["shared"] < callers - 1:
+            threading.Event().wait(0.001)
+        release.set()
+        return [first] + others
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    futures = _run_concurrently(flight, "李白", lambda: calls.append(1) or {"Name": "李白"})
+    results = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.stats() == {"executed": 1, "shared": 7, "in_flight": 0}
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("503")
+
+    futures = _run_concurrently(flight, "k", fail, callers=3)
+    for future in futures:
+        with pytest.raises(RuntimeError, match="503"):
+            future.result()
+    # 完成后即移除：下一次调用重新执行
+    assert flight.do("k", lambda: "ok") == "ok"
+    assert flight.stats()["executed"] == 2
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.do("a", lambda: 3) == 3
+    assert flight.stats() == {"executed": 3, "shared": 0, "in_flight": 0}
+
+
+def test_client_coalesces_identical_requests():
+    from cnkgraph_client import CnkgraphClient
+    from standin_server import StandinConfig, serve_in_thread
+
+    server, base_url = serve_in_thread(StandinConfig(latency=0.2))
+    client = CnkgraphClient()
+    try:
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(lambda _: client.get(f"{base_url}/People/李白"), range(5)))
+        assert all(r == results[0] for r in results)
+        assert client.metrics()["http"]["requests"] == 1
+        assert client.metrics()["singleflight"]["shared"] == 4
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
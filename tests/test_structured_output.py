@@ -0,0 +1,66 @@
+"""结构化输出：JSON Lines / msgpack 记录流与各类记录的字段"""
+
+import io
+import json
+import sys
+
+import pytest
+
+import query_dict
+from structured_output import (JSONL, MSGPACK, RecordWriter, book_record, entry_record, error_record,
+                               open_writer, passage_record, person_record, poem_record)
+
+
+def test_jsonl_writes_one_compact_record_per_line():
+    stream = io.StringIO()
+    writer = RecordWriter(JSONL, stream)
+    writer.write_all([entry_record("李白", "唐代诗人"), error_record("books", ValueError("503"))])
+    writer.flush()
+    lines = stream.getvalue().splitlines()
+    assert writer.count == 2 and len(lines) == 2
+    # 中文不转义，分隔符不带空格
+    assert lines[0] == '{"type":"entry","keyword":"李白","found":true,"definition":"唐代诗人"}'
+    assert json.loads(lines[1]) == {"type": "error", "source": "books", "message": "503"}
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    raw = io.BytesIO()
+    # msgpack 写入文本流的 buffer，与 sys.stdout 相同
+    stream = io.TextIOWrapper(raw, encoding="utf-8")
+    writer = RecordWriter(MSGPACK, stream)
+    records = [entry_record("李白", None, suggestions=["李白诗"]), person_record({"Name": "李白"})]
+    writer.write_all(records)
+    writer.flush()
+    assert list(msgpack.Unpacker(io.BytesIO(raw.getvalue()), raw=False)) == records
+
+
+def test_unknown_format_and_missing_msgpack(monkeypatch, capsys):
+    with pytest.raises(ValueError):
+        RecordWriter("text")
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    with pytest.raises(SystemExit) as exc:
+        open_writer(MSGPACK, io.StringIO())
+    assert exc.value.code == 1
+    assert "pip install msgpack" in capsys.readouterr().err
+
+
+def test_record_fields_accept_both_casings():
+    assert book_record({"title": "资治通鉴", "Total": 3}, "崔浩")["title"] == "资治通鉴"
+    assert book_record("魏书", "崔浩") == {"type": "book", "keyword": "崔浩", "title": "魏书",
+                                          "count": None, "data": None}
+    poem = poem_record({"Title": "静夜思", "author": "李白", "Dynasty": "唐", "Content": "床前明月光"})
+    assert (poem["title"], poem["author"], poem["dynasty"]) == ("静夜思", "李白", "唐")
+    assert person_record({"Dynasty": "唐"}, name="李白")["name"] == "李白"
+    passage = passage_record({"Book": "魏书", "Volume": "崔浩传", "MatchedText": "暴扬国恶"}, "崔浩")
+    assert passage["book"] == "魏书" and passage["matched"] == "暴扬国恶" and passage["previous"] is None
+
+
+def test_batch_lookup_streams_entry_records(make_mdx, monkeypatch):
+    monkeypatch.setattr(query_dict, "DICT_PATH", make_mdx({"李白": "唐代诗人", "杜甫": "唐代诗人"}))
+    stream = io.StringIO()
+    total, found = query_dict.batch_lookup(["李白", "无此词", "杜甫"], RecordWriter(JSONL, stream))
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert (total, found) == (3, 2)
+    # lookup_many 按词条在辞典中的位置读取，记录顺序不保证与输入一致
+    assert {r["keyword"]: r["found"] for r in records} == {"李白": True, "无此词": False, "杜甫": True}
@@ -0,0 +1,123 @@
+"""分阶段追踪：span 嵌套与跨线程传递、阶段统计、Prometheus/OTLP 导出，以及出错时仍输出追踪"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import history_query
+import tracing
+from tracing import BUCKETS, Tracer, report_trace, traced
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """替换进程内共享的 Tracer，测试之间互不影响"""
+    tracer = Tracer()
+    monkeypatch.setattr(tracing, "_tracer", tracer)
+    return tracer
+
+
+def test_spans_nest_and_record_errors(tracer):
+    with tracer.span("query", keyword="李白") as outer:
+        with tracer.span("dict.lookup") as inner:
+            pass
+        tracer.record("http.ttfb", 0.02, status=200)
+        with pytest.raises(ValueError):
+            with tracer.span("source.books"):
+                raise ValueError("boom")
+    spans = {s.name: s for s in tracer.spans()}
+    assert inner.parent_id == outer.span_id and inner.trace_id == outer.trace_id
+    assert spans["http.ttfb"].parent_id == outer.span_id and spans["http.ttfb"].duration == 0.02
+    assert spans["source.books"].error == "ValueError"
+    assert outer.parent_id is None and outer.duration >= inner.duration
+    assert set(tracer.stages()) == {"query", "dict.lookup", "http.ttfb", "source.books"}
+
+
+def test_traced_runs_in_submitting_context(tracer, monkeypatch):
+    with tracer.span("query") as parent:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            children = list(executor.map(traced("source.dict", lambda _: tracing._current.get()), range(2)))
+    assert all(child.name == "source.dict" and child.parent_id == parent.span_id for child in children)
+    assert tracer.stages()["source.dict"]["count"] == 2
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    with tracer.span("query") as current:
+        assert current is None
+    tracer.record("http.ttfb", 0.1)
+    tracer.count("cache", result="hit")
+    assert tracer.snapshot() == {"stages": {}, "counters": []}
+    assert "HISTORY_TRACE=0" in tracer.profile_table()
+
+
+def test_profile_table_and_counters(tracer):
+    tracer.record("dict.lookup", 0.002)
+    tracer.record("http.request", 0.3)
+    tracer.count("cache", cache="cnkgraph", result="hit")
+    tracer.count("cache", 2, cache="cnkgraph", result="hit")
+    assert tracer.counters() == [{"name": "cache", "labels": {"cache": "cnkgraph", "result": "hit"}, "value": 3}]
+    table = tracer.profile_table(wall=0.5).splitlines()
+    assert "墙钟 0.500 秒" in table[0]
+    # 按总耗时降序
+    assert table[2].split()[0] == "http.request" and table[3].split()[0] == "dict.lookup"
+    assert table[-1].strip() == "cache{cache=cnkgraph, result=hit} 3"
+
+
+def test_prometheus_export(tracer, tmp_path):
+    for seconds in (0.004, 0.2, 60.0):
+        tracer.record("http.request", seconds)
+    tracer.count("cache", cache='a"b', result="miss")
+    path = tmp_path / "metrics" / "history.prom"
+    tracer.export(str(path))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert 'history_stage_seconds_bucket{stage="http.request",le="0.005"} 1' in lines
+    assert 'history_stage_seconds_bucket{stage="http.request",le="0.25"} 2' in lines
+    assert f'history_stage_seconds_bucket{{stage="http.request",le="{BUCKETS[-1]}"}} 2' in lines
+    assert 'history_stage_seconds_bucket{stage="http.request",le="+Inf"} 3' in lines
+    assert 'history_stage_seconds_count{stage="http.request"} 3' in lines
+    assert "# TYPE history_cache_total counter" in lines
+    assert 'history_cache_total{cache="a\\"b",result="miss"} 1' in lines
+
+
+def test_otel_export(tracer, tmp_path):
+    with tracer.span("query", keyword="李白", limit=3, cached=True):
+        with tracer.span("http.request", latency=0.5):
+            pass
+    tracer.count("cache", result="hit")
+    path = tmp_path / "trace.json"
+    tracer.export(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    spans = {s["name"]: s for s in data["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert spans["http.request"]["parentSpanId"] == spans["query"]["spanId"]
+    assert spans["http.request"]["kind"] == 3 and spans["query"]["kind"] == 1
+    assert "parentSpanId" not in spans["query"]
+    assert {a["key"]: a["value"] for a in spans["query"]["attributes"]} == {
+        "keyword": {"stringValue": "李白"}, "limit": {"intValue": "3"}, "cached": {"boolValue": True}}
+    metrics = {m["name"]: m for m in data["resourceMetrics"][0]["scopeMetrics"][0]["metrics"]}
+    points = metrics["history.stage.duration"]["histogram"]["dataPoints"]
+    assert [p["attributes"][0]["value"]["stringValue"] for p in points] == ["http.request", "query"]
+    assert len(points[0]["bucketCounts"]) == len(BUCKETS) + 1
+    assert metrics["history.cache"]["sum"]["dataPoints"][0]["asInt"] == "1"
+
+
+def test_report_trace_warns_on_export_error(tracer, tmp_path, capsys):
+    blocker = tmp_path / "file"
+    blocker.write_text("", encoding="utf-8")
+    report_trace(SimpleNamespace(profile=True, trace_export=str(blocker / "trace.prom")), wall=0.1)
+    err = capsys.readouterr().err
+    assert "分阶段耗时" in err and "导出追踪数据出错" in err
+
+
+def test_history_query_reports_trace_when_query_fails(tracer, tmp_path, monkeypatch):
+    def fail(self, keyword, deadline=None):
+        with tracing.span("query"):
+            raise RuntimeError("辞典损坏")
+
+    monkeypatch.setattr(history_query.HistoryExpert, "comprehensive_query", fail)
+    path = tmp_path / "trace.prom"
+    with pytest.raises(RuntimeError):
+        history_query.main(["李白", "--trace-export", str(path)])
+    assert 'history_stage_seconds_count{stage="query"} 1' in path.read_text(encoding="utf-8")
@@ -0,0 +1,51 @@
+"""简繁归一化：fold 对照表，以及辞典词头索引按归一化形式定位词条"""
+
+import mdx_index
+from mdx_reader import MDXReader
+from zh_variants import TABLE_PATH, fold, load_table, table_version
+
+
+def test_fold_traditional_to_simplified():
+    assert fold("蘇軾") == "苏轼"
+    assert fold("苏轼") == "苏轼"
+    assert fold("司馬光《資治通鑑》") == "司马光《资治通鉴》"
+    assert fold("Li Bai 123") == "Li Bai 123"
+    # 一繁对多简且包含自身的字保持原字
+    assert fold("乾隆") == "乾隆"
+
+
+def test_table_is_already_fully_folded():
+    table = load_table()
+    assert len(table) > 2000
+    # 链式映射已展开：折叠结果不再包含表中的繁体字
+    assert all(ord(simplified) not in table for simplified in table.values())
+
+
+def test_table_version_tracks_content(tmp_path):
+    assert table_version() == table_version(TABLE_PATH)
+    other = tmp_path / "table.txt"
+    other.write_text("# 测试\n蘇\t苏\n", encoding="utf-8")
+    assert load_table(str(other)) == {ord("蘇"): "苏"}
+    assert table_version(str(other)) != table_version()
+
+
+def test_lookup_resolves_either_script(make_mdx):
+    path = make_mdx({"蘇軾": "北宋文学家", "苏辙": "苏轼之弟", "李白": "唐代诗人"})
+    reader = MDXReader(path)
+    assert reader.lookup("蘇軾") == "北宋文学家"
+    # 简体查询经归一化词头表定位到繁体词头；繁体或混写查询折叠后命中简体词头
+    assert reader.lookup("苏轼") == "北宋文学家"
+    assert reader.lookup("苏軾") == "北宋文学家"
+    assert reader.lookup("蘇轍") == "苏轼之弟"
+    assert reader.lookup("苏洵") is None
+    assert dict(reader.lookup_many(["苏轼", "蘇轍", "李白"])) == {
+        "苏轼": "北宋文学家", "蘇轍": "苏轼之弟", "李白": "唐代诗人"}
+
+
+def test_index_rebuilt_when_table_changes(make_mdx, monkeypatch):
+    path = make_mdx({"蘇軾": "北宋文学家"})
+    assert MDXReader(path).index.meta["fold_table"] == table_version()
+    monkeypatch.setattr(mdx_index, "table_version", lambda: "changed")
+    reader = MDXReader(path)
+    assert reader.index.meta["fold_table"] == "changed"
+    assert reader.lookup("苏轼") == "北宋文学家"